@@ -21,6 +21,21 @@ class Config(BaseSettings):
     cache_dir: DirectoryPath = Field(
         default_factory= lambda: Path(tempfile.gettempdir()) / 'nwb_linkml__cache',
         description="Location to cache generated schema and models")
+    remote_block_size: int = Field(
+        2 * 1024 ** 2,
+        description="Number of bytes fetched at a time when reading remote files (see :mod:`nwb_linkml.io.remote` )")
+    remote_cache_size: int = Field(
+        256 * 1024 ** 2,
+        description="Number of bytes of each remote file to keep in memory")
+    remote_disk_cache: bool = Field(
+        False,
+        description="Also cache blocks of remote files on disk, in :attr:`.remote_dir`")
+    chunk_cache_size: int = Field(
+        64 * 1024 ** 2,
+        description="Number of bytes of decompressed chunks for :class:`~nwb_linkml.types.ndarray.NDArrayProxy` s to keep in memory, 0 to disable")
+    array_block_size: int = Field(
+        64 * 1024 ** 2,
+        description="Approximate number of bytes in each block when numpy operations on :class:`~nwb_linkml.types.ndarray.NDArrayProxy` s are computed block by block")
 
     @computed_field
     @property
@@ -40,6 +55,24 @@ class Config(BaseSettings):
         """Directory for :class:`nwb_linkml.providers.git.GitRepo` to clone to"""
         return self.cache_dir / 'git'
 
+    @computed_field
+    @property
+    def specs_dir(self) -> Path:
+        """Directory to record which specifications embedded in NWB files have already been built"""
+        return self.cache_dir / 'specs'
+
+    @computed_field
+    @property
+    def index_dir(self) -> Path:
+        """Directory for :class:`nwb_linkml.io.index.FileIndex` to store indexes of hdf5 files"""
+        return self.cache_dir / 'index'
+
+    @computed_field
+    @property
+    def remote_dir(self) -> Path:
+        """Directory for :class:`nwb_linkml.io.remote.BlockCache` to cache blocks of remote files"""
+        return self.cache_dir / 'remote'
+
 
     @field_validator('cache_dir', mode='before')
     @classmethod
@@ -63,5 +96,8 @@ class Config(BaseSettings):
         self.linkml_dir.mkdir(exist_ok=True)
         self.pydantic_dir.mkdir(exist_ok=True)
         self.git_dir.mkdir(exist_ok=True)
+        self.specs_dir.mkdir(exist_ok=True)
+        self.index_dir.mkdir(exist_ok=True)
+        self.remote_dir.mkdir(exist_ok=True)
 
 
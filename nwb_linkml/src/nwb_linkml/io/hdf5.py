@@ -12,15 +12,12 @@ Mapping operations (mostly TODO atm)
 * Create new models from DynamicTables
 * Handle softlinks as object references and vice versa by adding a ``path`` attr
 
-Other TODO:
-
-* Read metadata only, don't read all arrays
-* Write, obvi lol.
-
 """
 import pdb
 import warnings
-from typing import Optional, Dict, overload, Type, Union, List
+from typing import Optional, Dict, overload, Type, Union, List, Literal, ContextManager, Tuple, Iterator, Any, BinaryIO, get_args
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import nullcontext, contextmanager
 from pathlib import Path
 from types import ModuleType
 from typing import TYPE_CHECKING, NamedTuple
@@ -28,34 +25,64 @@ import json
 import subprocess
 import shutil
 import os
+import hashlib
+import threading
 
 import h5py
 from pydantic import BaseModel
-from tqdm import tqdm
 import numpy as np
 
-from nwb_linkml.maps.hdf5 import H5SourceItem, flatten_hdf, ReadPhases, ReadQueue
+from nwb_linkml.maps.hdf5 import H5SourceItem, flatten_hdf, ReadPhases, ReadQueue, ReadOptions, ArrayModes, Selectors, ValidateModes, process_executor
 #from nwb_linkml.models.core_nwb_file import NWBFile
 if TYPE_CHECKING:
     from nwb_linkml.models import NWBFile
-from nwb_linkml.providers.schema import SchemaProvider
-from nwb_linkml.types.hdf5 import HDF5_Path
+from nwb_linkml.config import Config
+from nwb_linkml.providers.schema import SchemaProvider, LinkMLProvider
+from nwb_linkml.types.hdf5 import HDF5_Path, get_pool, file_location, is_zarr
+from nwb_linkml.types.zarr import ZarrDataset, ZarrGroup
+from nwb_linkml.io.index import FileIndex, ReferenceIndex
+from nwb_linkml.io.write import ModelWriter, WriteOptions, TableAppender, SeriesAppender, SchemaLayout, model_source
+
 
 
+Executors = Literal['serial', 'thread', 'process']
+"""Ways of running the maps in each phase of :meth:`.HDF5IO.read`"""
+
 
 class HDF5IO():
+    """
+    Read and write NWB files.
 
-    def __init__(self, path:Path):
-        self.path = Path(path)
+    Files can be local paths, URLs to remote files (read through :mod:`fsspec` , see :mod:`nwb_linkml.io.remote` ),
+    or file-like objects (eg. from :func:`fsspec.open` ). Remote files and file-like objects can only be read.
+    NWB Zarr stores (local or remote, see :mod:`nwb_linkml.types.zarr` ) can also be read, but not written.
+    File-like objects can't be read with the ``'process'`` executor, since they can't be reopened in another process.
+    """
+
+    def __init__(self, path: Path | str | BinaryIO):
+        if hasattr(path, 'read'):
+            path = get_pool().register(path)
+        self.path = file_location(path)
         self._modules: Dict[str, ModuleType] = {}
 
     @overload
-    def read(self, path:None) -> 'NWBFile': ...
+    def read(self, path:None, executor: Executors = 'serial', workers: Optional[int] = None, arrays: ArrayModes = 'proxy', lazy: bool = False, include: Optional[Selectors] = None, exclude: Optional[Selectors] = None, index: bool = False, validate: ValidateModes = 'eager') -> 'NWBFile': ...
 
     @overload
-    def read(self, path:str) -> BaseModel | Dict[str, BaseModel]: ...
-
-    def read(self, path:Optional[str] = None) -> Union['NWBFile', BaseModel, Dict[str, BaseModel]]:
+    def read(self, path:str, executor: Executors = 'serial', workers: Optional[int] = None, arrays: ArrayModes = 'proxy', lazy: bool = False, include: Optional[Selectors] = None, exclude: Optional[Selectors] = None, index: bool = False, validate: ValidateModes = 'eager') -> BaseModel | Dict[str, BaseModel]: ...
+
+    def read(
+            self,
+            path:Optional[str] = None,
+            executor: Executors = 'serial',
+            workers: Optional[int] = None,
+            arrays: ArrayModes = 'proxy',
+            lazy: bool = False,
+            include: Optional[Selectors] = None,
+            exclude: Optional[Selectors] = None,
+            index: bool = False,
+            validate: ValidateModes = 'eager'
+        ) -> Union['NWBFile', BaseModel, Dict[str, BaseModel]]:
         """
         Read data into models from an NWB File.
 
@@ -72,81 +99,336 @@ class HDF5IO():
         Read is split into stages like this to handle references between objects, where the read result of one node
         might depend on another having already been completed. It also allows us to parallelize the operations
         since each mapping operation is independent of the results of all the others in that pass.
+        The ``plan`` and ``read`` phases are run concurrently by the chosen ``executor`` , and
+        in the ``construct`` phase each model is built as soon as the models it depends on are finished.
+        Since the ``construct`` phase shares its results between items, it uses a thread pool
+        when ``executor == 'process'`` .
+
+        Arrays are read lazily by default, but when only the metadata in a file is needed
+        (eg. when indexing many files), ``arrays='skip'`` replaces them with
+        :class:`~nwb_linkml.types.ndarray.NDArrayInfo` descriptions of their shape, dtype, and
+        storage without reading any data or creating dask arrays.
+
+        With ``lazy=True`` , only the requested group is read, and every group with a ``neurodata_type``
+        below it is left as a :class:`~nwb_linkml.types.hdf5.LazyModel` placeholder that
+        is read the first time one of its attributes is accessed, so opening even a large file
+        only reads its top level.
 
-        .. todo::
+        To read only part of a file, ``include`` and ``exclude`` select elements by glob patterns of their
+        paths or by predicates like :func:`~nwb_linkml.maps.hdf5.has_type` (see :class:`~nwb_linkml.maps.hdf5.Selection` ).
+        Only the selected elements, the groups that contain them, and anything they link to are read, and the
+        containing groups only have the children that were selected.
 
-            Implement reading, skipping arrays - they are fast to read with the ArrayProxy class
-            and dask, but there are times when we might want to leave them out of the read entirely.
-            This might be better implemented as a filter on ``model_dump`` , but to investigate further
-            how best to support reading just metadata, or even some specific field value, or if
-            we should leave that to other implementations like eg. after we do SQL export then
-            not rig up a whole query system ourselves.
+        Examples:
+
+            .. code-block:: python
+
+                io.read(include='/processing/*/Fluorescence/**', exclude=has_type('ImageSeries'))
 
         Args:
             path (Optional[str]): If ``None`` (default), read whole file. Otherwise, read from specific (hdf5) path and its children
+            executor (str): How to run the maps within each phase: ``'serial'`` (default), in a ``'thread'`` pool,
+                or in a ``'process'`` pool.
+            workers (Optional[int]): Number of workers for the ``'thread'`` or ``'process'`` pools. If ``None``, use
+                the number of CPUs.
+            arrays (str): How to read arrays, see :attr:`.ReadOptions.arrays` : ``'skip'`` them and just
+                describe them, ``'proxy'`` them to be loaded on access (default), read them as chunk-aligned
+                ``'dask'`` arrays, or ``'load'`` them into memory.
+            lazy (bool): If ``True`` , read groups with a ``neurodata_type`` when they are first used, see :attr:`.ReadOptions.lazy`
+            include (str, Callable, list): Only read elements (and their children) selected by these :data:`~nwb_linkml.maps.hdf5.Selectors`
+            exclude (str, Callable, list): Don't read elements (or their children) selected by these :data:`~nwb_linkml.maps.hdf5.Selectors`
+            index (bool): If ``True`` , get the flattened file from its :class:`~nwb_linkml.io.index.FileIndex` rather than walking it,
+                building the index if the file hasn't been indexed or has changed since. Only used when not reading ``lazy`` or
+                with ``include`` or ``exclude`` , which walk only part of the file.
+            validate (str): How to validate models, see :attr:`.ReadOptions.validation` : ``'eager'`` (default) as they're made,
+                ``'deferred'`` to make them without validating them, so they can be validated later
+                with :func:`~nwb_linkml.maps.hdf5.validate_model` , or ``'off'`` to trust the file and not validate them at all.
 
         Returns:
             ``NWBFile`` if ``path`` is ``None``, otherwise whatever Model or dictionary of models applies to the requested ``path``
         """
 
+        queue = self._prepare_queue(path, executor, workers, arrays, lazy, include, exclude, index, validate)
+
+        construct_executor = 'thread' if executor == 'process' else executor
+        with _make_executor(construct_executor, workers) as pool:
+            # Construction operations actually cast the models
+            # in dependency order, so models are cast after the models they contain
+            queue.apply_phase(ReadPhases.construct, executor=pool)
+
+        if path is None:
+            return queue.completed['/'].result
+        else:
+            return queue.completed[path].result
+
+    def iter_read(
+            self,
+            path: Optional[str] = None,
+            executor: Executors = 'serial',
+            workers: Optional[int] = None,
+            arrays: ArrayModes = 'proxy',
+            lazy: bool = False,
+            include: Optional[Selectors] = None,
+            exclude: Optional[Selectors] = None,
+            index: bool = False,
+            release: bool = True,
+            validate: ValidateModes = 'eager'
+        ) -> Iterator[Tuple[str, BaseModel]]:
+        """
+        Read models from an NWB file, yielding each one as soon as it is constructed,
+        rather than waiting for the whole file to be read like :meth:`.read` .
+
+        Models are yielded after the models they contain, so the model for ``path``
+        (the ``NWBFile`` , by default) is yielded last.
+
+        Examples:
+
+            .. code-block:: python
+
+                for path, model in io.iter_read(include=has_type('TimeSeries')):
+                    if isinstance(model, TimeSeries):
+                        process(model)
+
+        Args:
+            path, executor, workers, arrays, lazy, include, exclude, index, validate: See :meth:`.read`
+            release (bool): If ``True`` (default), models aren't kept after they've been yielded:
+                the models that contain them get a :class:`~nwb_linkml.types.hdf5.LazyModel` placeholder
+                that reads them again if used, so the memory used by the read depends on the width of the tree rather than
+                the size of the file (see :meth:`.ReadQueue.iter_construct` ). If ``False`` , the models that contain
+                yielded models contain the same objects, as in :meth:`.read` .
+
+        Yields:
+            tuple[str, :class:`pydantic.BaseModel`]: hdf5 path and model
+        """
+        queue = self._prepare_queue(path, executor, workers, arrays, lazy, include, exclude, index, validate)
+
+        construct_executor = 'thread' if executor == 'process' else executor
+        with _make_executor(construct_executor, workers) as pool:
+            for res in queue.iter_construct(executor=pool, release=release):
+                yield res.path, res.result
+
+    def _prepare_queue(
+            self,
+            path: Optional[str],
+            executor: Executors,
+            workers: Optional[int],
+            arrays: ArrayModes,
+            lazy: bool,
+            include: Optional[Selectors],
+            exclude: Optional[Selectors],
+            index: bool,
+            validate: ValidateModes = 'eager'
+        ) -> ReadQueue:
+        """
+        Make a :class:`.ReadQueue` for :meth:`.read` and :meth:`.iter_read` ,
+        and apply the ``plan`` and ``read`` phases to it, leaving it ready to be constructed
+        """
         provider = self.make_provider()
 
-        h5f = h5py.File(str(self.path))
+        h5f = get_pool().get(self.path)
         if path:
             src = h5f.get(path)
         else:
             src = h5f
 
         # get all children of selected item
-        if isinstance(src, (h5py.File, h5py.Group)):
-            children = flatten_hdf(src)
+        if isinstance(src, (h5py.File, h5py.Group, ZarrGroup)):
+            if index and not lazy and include is None and exclude is None:
+                children = FileIndex.load(self.path).subtree(src.name)
+            else:
+                children = flatten_hdf(src, lazy=lazy, include=include, exclude=exclude)
         else:
             raise NotImplementedError('directly read individual datasets')
 
         queue = ReadQueue(
             h5f=self.path,
             queue=children,
-            provider=provider
+            provider=provider,
+            options=ReadOptions(arrays=arrays, lazy=lazy, validation=validate)
         )
 
-        # Apply initial planning phase of reading
-        queue.apply_phase(ReadPhases.plan)
-        # Read operations gather the data before casting into models
-        queue.apply_phase(ReadPhases.read)
-        # Construction operations actually cast the models
-        # this often needs to run several times as models with dependencies wait for their
-        # dependents to be cast
-        queue.apply_phase(ReadPhases.construct)
+        if executor != 'serial':
+            # import models before the maps run in parallel, rather than racing to import them
+            provider.import_namespaces()
+
+        with _make_executor(executor, workers, provider) as pool:
+            # Apply initial planning phase of reading
+            queue.apply_phase(ReadPhases.plan, executor=pool)
+            # Read operations gather the data before casting into models
+            queue.apply_phase(ReadPhases.read, executor=pool)
+            if include is not None or exclude is not None:
+                # read anything selected items link to outside the selection
+                queue.read_depends()
+        return queue
+
+    def write(
+            self,
+            model: BaseModel,
+            path: Optional[str] = None,
+            mode: Literal['w', 'a'] = 'w',
+            specifications: Optional[Path] = None,
+            compression: Optional[str] = 'gzip',
+            compression_opts: Optional[Any] = 4,
+            chunks: Union[bool, Tuple[int, ...]] = True,
+            block_size: int = 64 * 1024 ** 2,
+            resizable: bool = False
+        ):
+        """
+        Write a model to this NWB file.
 
+        Models are mapped back to hdf5 groups, datasets, and attributes by a :class:`~nwb_linkml.io.write.ModelWriter` ,
+        which inverts the maps used by :meth:`.read` (see :mod:`nwb_linkml.io.write` ).
+        Arrays can be numpy arrays, dask arrays, :class:`~nwb_linkml.types.ndarray.NDArrayProxy` s
+        to other files, or generators that yield blocks along the first dimension, and are written
+        in chunk-aligned blocks of about ``block_size`` bytes so they are never loaded all at once.
+        Arrays from other hdf5 files are copied without recompressing them when they would be stored with the same
+        chunks and compression.
+
+        Any handle to the file in the :class:`~nwb_linkml.types.hdf5.H5FilePool` is closed before writing.
+
+        Args:
+            model (:class:`pydantic.BaseModel`): Model to write
+            path (str): Where to write the model. If ``None`` (default), use the ``hdf5_path`` the model
+                was read from, or ``/`` for an ``NWBFile`` .
+            mode (str): ``'w'`` (default) to make a new file, or ``'a'`` to add to an existing one
+            specifications (:class:`pathlib.Path`): An NWB file to copy the ``/specifications`` group from, which
+                is needed to read the file again, and which says whether each field is an attribute or dataset
+                (see :class:`~nwb_linkml.io.write.SchemaLayout` ). If ``None`` , use the specifications already
+                in the file when appending, or otherwise those in the file the model's arrays were read from.
+            compression (str): Compression filter for new datasets, or ``None`` for no compression
+            compression_opts: Options for the ``compression`` filter
+            chunks (bool, tuple): ``True`` (default) to use the chunks of arrays copied from other files or let h5py guess,
+                a chunk shape to use for every dataset, or ``False`` to store small arrays contiguously.
+            block_size (int): Approximate number of bytes to write at once
+            resizable (bool): Make datasets resizable, so they can be appended to later with :meth:`.appender`
+        """
         if path is None:
-            return queue.completed['/'].result
-        else:
-            return queue.completed[path].result
+            path = getattr(model, 'hdf5_path', None)
+            if path is None:
+                if type(model).__name__ == 'NWBFile':
+                    path = '/'
+                else:
+                    raise ValueError('Model has no hdf5_path, so path must be given')
+
+        options = WriteOptions(
+            compression=compression,
+            compression_opts=compression_opts if compression is not None else None,
+            chunks=chunks,
+            block_size=block_size,
+            resizable=resizable
+        )
 
-    def write(self, path: Path):
+        get_pool().close(self._local_path())
+        with h5py.File(self.path, mode) as h5f:
+            if specifications is None and 'specifications' not in h5f:
+                specifications = model_source(model)
+            schema = None
+            spec_group = h5f.get('specifications') if specifications is None else get_pool().get(specifications).get('specifications')
+            if spec_group is not None:
+                schema = SchemaLayout(read_specs_as_dicts(spec_group))
+
+            writer = ModelWriter(h5f, options, schema=schema)
+            writer.write(model, path)
+
+            if 'specifications' not in h5f:
+                if specifications is None:
+                    specifications = next(iter(sorted(writer.sources, key=str)), None)
+                if specifications is not None:
+                    spec_file = get_pool().get(specifications)
+                    if 'specifications' in spec_file:
+                        spec_file.copy(spec_file['specifications'], h5f, name='specifications')
+                        if '.specloc' in spec_file.attrs:
+                            h5f.attrs['.specloc'] = h5f['specifications'].ref
+                else:
+                    warnings.warn(
+                        'No specifications were written, so the file can\'t be read again. '
+                        'Pass an NWB file with the needed specifications as `specifications`')
+
+    @contextmanager
+    def appender(
+            self,
+            path: str,
+            compression: Optional[str] = 'gzip',
+            compression_opts: Optional[Any] = 4,
+            chunks: Union[bool, Tuple[int, ...]] = True,
+            block_size: int = 1024 ** 2
+        ) -> Iterator[TableAppender | SeriesAppender]:
         """
-        Write to NWB file
+        Append to a DynamicTable or TimeSeries in place, without rewriting the rest of the file.
 
-        .. todo::
+        Yields a :class:`~nwb_linkml.io.write.TableAppender` for groups with ``colnames`` or an ``id`` ,
+        and a :class:`~nwb_linkml.io.write.SeriesAppender` otherwise. Appends are buffered until they
+        fill whole chunks, and anything still buffered is written when the context exits, eg.::
 
-            Implement HDF5 writing.
+            with io.appender('/units') as units:
+                for spikes in acquire():
+                    units.append({'spike_times': [spikes]})
 
-            Need to create inverse mappings that can take pydantic models to
-            hdf5 groups and datasets. If more metadata about the generation process
-            needs to be preserved (eg. explicitly notating that something is an attribute,
-            dataset, group, then we can make use of the :class:`~nwb_linkml.generators.pydantic.LinkML_Meta`
-            model. If the model to edit has been loaded from an HDF5 file (rather than
-            freshly created), then the ``hdf5_path`` should be populated making
-            mapping straightforward, but we probably want to generalize that to deterministically
-            get hdf5_path from position in the NWBFile object -- I think that might
-            require us to explicitly annotate when something is supposed to be a reference
-            vs. the original in the model representation, or else it's ambiguous.
+        Datasets that already exist must be resizable (see ``resizable`` in :meth:`.write` ).
+        The other arguments are used to make datasets that don't exist yet.
 
-            Otherwise, it should be a matter of detecting changes from file if it exists already,
-            and then write them.
+        Args:
+            path (str): Path of the table or series to append to
+            compression (str): Compression filter for new datasets
+            compression_opts: Options for the ``compression`` filter
+            chunks (bool, tuple): Chunk shape for new datasets, or ``True`` (default) to let h5py guess
+            block_size (int): Approximate number of bytes to buffer before writing
+        """
+        options = WriteOptions(
+            compression=compression,
+            compression_opts=compression_opts if compression is not None else None,
+            chunks=chunks,
+            block_size=block_size,
+            resizable=True
+        )
+        get_pool().close(self._local_path())
+        with h5py.File(self.path, 'a') as h5f:
+            group = h5f[path]
+            if 'colnames' in group.attrs or 'id' in group:
+                appender = TableAppender(h5f, path, options)
+            else:
+                appender = SeriesAppender(h5f, path, options)
+            yield appender
+            appender.flush()
+
+    def append_rows(self, path: str, rows: Dict[str, Any], ids: Optional[Any] = None, **kwargs):
+        """
+        Append rows to a DynamicTable (see :meth:`.appender` and :meth:`.TableAppender.append` )
+        """
+        with self.appender(path, **kwargs) as appender:
+            if not isinstance(appender, TableAppender):
+                raise ValueError(f"{path} is not a DynamicTable")
+            appender.append(rows, ids=ids)
+
+    def append_samples(self, path: str, data: Any, timestamps: Optional[Any] = None, **kwargs):
+        """
+        Append samples to a TimeSeries (see :meth:`.appender` and :meth:`.SeriesAppender.append` )
+        """
+        with self.appender(path, **kwargs) as appender:
+            if not isinstance(appender, SeriesAppender):
+                raise ValueError(f"{path} is not a TimeSeries")
+            appender.append(data, timestamps=timestamps)
+
+    def _local_path(self) -> Path:
+        if not isinstance(self.path, Path) or is_zarr(self.path):
+            raise ValueError(f'Can only write to local hdf5 files, not {self.path}')
+        return self.path
 
+    def references(self, executor: Executors = 'serial', workers: Optional[int] = None, cache: bool = True) -> ReferenceIndex:
         """
-        raise NotImplementedError('Writing to HDF5 is not implemented yet!')
+        Get a :class:`~nwb_linkml.io.index.ReferenceIndex` of everything that references each object in the file
+
+        Args:
+            executor (str): How to dereference reference datasets (see :meth:`.read` )
+            workers (int): Number of workers for the ``'thread'`` and ``'process'`` executors
+            cache (bool): If ``True`` (default), use and store the index in :attr:`.Config.index_dir` ,
+                otherwise build it again.
+        """
+        with _make_executor(executor, workers) as pool:
+            if cache:
+                return ReferenceIndex.load(self.path, executor=pool)
+            else:
+                return ReferenceIndex.build(self.path, executor=pool)
 
     def make_provider(self) -> SchemaProvider:
         """
@@ -154,26 +436,122 @@ class HDF5IO():
         reading specifications from the NWBFile ``/specification`` group and translating
         them to LinkML and generating pydantic models
 
+        Files often embed identical specifications, so the specifications are hashed with :func:`.hash_specs`
+        and each set of specifications is only translated once:
+
+        * Within a process, files with the same specifications share the same provider (and its imported modules)
+        * Between processes, the namespace versions of specifications that have already been built are
+          stored in :attr:`.Config.specs_dir` , so the provider can use the cached models without
+          parsing or building the specifications again.
+
         Returns:
             :class:`~.providers.schema.SchemaProvider` : Schema Provider with correct versions
                 specified as defaults
         """
-        h5f = h5py.File(str(self.path))
-        schema = read_specs_as_dicts(h5f.get('specifications'))
+        h5f = get_pool().get(self.path)
+        config = Config()
+        specs_hash = hash_specs(h5f.get('specifications'))
+        key = (str(config.cache_dir), specs_hash)
+
+        with _PROVIDERS_LOCK:
+            if key in _PROVIDERS:
+                return _PROVIDERS[key]
+
+            versions_file = config.specs_dir / f'{specs_hash}.json'
+            versions = _load_built_versions(versions_file, config)
+            if versions is not None:
+                provider = SchemaProvider(versions=versions)
+            else:
+                schema = read_specs_as_dicts(h5f.get('specifications'))
+
+                # get versions for each namespace
+                versions = {}
+                for ns_schema in schema.values():
+                    # each "namespace" can actually contain multiple namespaces which actually contain the version info
+                    for inner_ns in ns_schema['namespace']['namespaces']:
+                        versions[inner_ns['name']] = inner_ns['version']
+
+                provider = SchemaProvider(versions=versions)
+
+                # build schema so we have them cached
+                provider.build_from_dicts(schema)
+                versions_file.write_text(json.dumps(versions))
+
+            _PROVIDERS[key] = provider
+        return provider
 
-        # get versions for each namespace
-        versions = {}
-        for ns_schema in schema.values():
-            # each "namespace" can actually contain multiple namespaces which actually contain the version info
-            for inner_ns in ns_schema['namespace']['namespaces']:
-                versions[inner_ns['name']] = inner_ns['version']
 
-        provider = SchemaProvider(versions=versions)
+_PROVIDERS: Dict[Tuple[str, str], SchemaProvider] = {}
+"""Providers made by :meth:`.HDF5IO.make_provider` , keyed by cache directory and :func:`.hash_specs`"""
+_PROVIDERS_LOCK = threading.Lock()
 
-        # build schema so we have them cached
-        provider.build_from_dicts(schema)
-        h5f.close()
-        return provider
+
+def hash_specs(group: h5py.Group) -> str:
+    """
+    Hash the raw contents of the ``/specifications`` group without parsing them
+
+    Args:
+        group ( :class:`h5py.Group` ): the ``/specifications`` group!
+
+    Returns:
+        str: hex digest
+    """
+    hasher = hashlib.blake2b()
+    def _hash(name, node):
+        if isinstance(node, (h5py.Dataset, ZarrDataset)):
+            data = node[()]
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            elif not isinstance(data, bytes):
+                data = np.asarray(data).tobytes()
+            hasher.update(name.encode('utf-8'))
+            hasher.update(data)
+    group.visititems(_hash)
+    return hasher.hexdigest()
+
+
+def _load_built_versions(versions_file: Path, config: Config) -> Optional[Dict[str, str]]:
+    """
+    Get the namespace versions for already-built specifications,
+    or ``None`` if they haven't been built or the built schema are gone.
+    """
+    if not versions_file.exists():
+        return None
+    try:
+        versions = json.loads(versions_file.read_text())
+    except json.JSONDecodeError:
+        return None
+    linkml_provider = LinkMLProvider(path=config.cache_dir, verbose=False)
+    for namespace, version in versions.items():
+        try:
+            ns_path = linkml_provider.namespace_path(namespace, version)
+        except FileNotFoundError:
+            return None
+        if not (ns_path / 'namespace.yaml').exists():
+            return None
+    return versions
+
+
+def _make_executor(
+        executor: Executors,
+        workers: Optional[int] = None,
+        provider: Optional[SchemaProvider] = None
+    ) -> ContextManager[Optional[Executor]]:
+    """
+    Make the executor used to apply maps in :meth:`.HDF5IO.read` , or a null context for serial reads.
+
+    Process pools are started with the ``provider`` if one is given (see :func:`.process_executor` ).
+    """
+    if executor == 'serial':
+        return nullcontext()
+    elif executor == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    elif executor == 'process':
+        if provider is not None:
+            return process_executor(provider, workers)
+        return ProcessPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"executor must be one of {get_args(Executors)}, got {executor}")
 
 
 def read_specs_as_dicts(group: h5py.Group) -> dict:
@@ -190,7 +568,7 @@ def read_specs_as_dicts(group: h5py.Group) -> dict:
     spec_dict = {}
     def _read_spec(name, node):
 
-        if isinstance(node, h5py.Dataset):
+        if isinstance(node, (h5py.Dataset, ZarrDataset)):
             # make containing dict if they dont exist
             pieces = node.name.split('/')
             if pieces[-3] not in spec_dict.keys():
@@ -212,12 +590,8 @@ def find_references(h5f: h5py.File, path: str) -> List[str]:
     * Compound datasets (a dataset with one "column" of references)
 
     Notes:
-        This is extremely slow because we collect all references first,
-        rather than checking them as we go and quitting early. PR if you want to make this faster!
-
-    .. todo::
-
-        Test :func:`.find_references` !
+        This builds a whole :class:`~nwb_linkml.io.index.ReferenceIndex` for the file,
+        so if you're looking up more than one path, use :meth:`.HDF5IO.references` instead
 
     Args:
         h5f (:class:`h5py.File`): Open hdf5 file
@@ -226,40 +600,8 @@ def find_references(h5f: h5py.File, path: str) -> List[str]:
     Returns:
         list[str]: List of paths that reference the given path
     """
-    references = []
-
-    def _find_references(name, obj: h5py.Group | h5py.Dataset):
-        pbar.update()
-        refs = []
-        for attr in obj.attrs.values():
-            if isinstance(attr, h5py.h5r.Reference):
-                refs.append(attr)
-
-
-        if isinstance(obj, h5py.Dataset):
-            # dataset is all references
-            if obj.dtype.metadata is not None and isinstance(obj.dtype.metadata.get('ref', None), h5py.h5r.Reference):
-                refs.extend(obj[:].tolist())
-            # compound dtype
-            elif isinstance(obj.dtype, np.dtypes.VoidDType):
-                for name in obj.dtype.names:
-                    if isinstance(obj[name][0], h5py.h5r.Reference):
-                        refs.extend(obj[name].tolist())
-
-
-        for ref in refs:
-            assert isinstance(ref, h5py.h5r.Reference)
-            refname = h5f[ref].name
-            if name == path:
-                references.append(name)
-                return
-
-    pbar = tqdm()
-    try:
-        h5f.visititems(_find_references)
-    finally:
-        pbar.close()
-    return references
+    index = ReferenceIndex.build(h5f.filename)
+    return list(dict.fromkeys([referrer.path for referrer in index.referrers(path)]))
 
 
 def truncate_file(source: Path, target: Optional[Path] = None, n:int=10) -> Path:
@@ -0,0 +1,360 @@
+"""
+Persistent indexes of hdf5 files, so that repeated reads of the same
+file don't need to walk the whole file again.
+
+* :class:`.FileIndex` - the structure of the file, as from :func:`~nwb_linkml.maps.hdf5.flatten_hdf`
+* :class:`.ReferenceIndex` - which objects reference each object
+
+Indexes are stored in :attr:`.Config.index_dir` , one per file and kind of index, and are keyed by the file's
+resolved path (or URL). Each index records the size, modification time, and a hash of the start of the file
+it was built from, and is rebuilt whenever any of them change. Remote files don't have a modification time,
+so the version the filesystem gives them (eg. an ETag) is hashed with the start of the file instead.
+
+Cache files are also keyed by :data:`.INDEX_VERSION` and the installed version of ``nwb_linkml`` ,
+so indexes pickled by an incompatible version are never loaded.
+"""
+import hashlib
+import importlib.metadata
+import pickle
+import warnings
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Dict, Optional, List, Literal, Tuple, ClassVar
+
+import h5py
+from pydantic import BaseModel, ConfigDict, Field
+
+from nwb_linkml.config import Config
+from nwb_linkml.maps.hdf5 import H5SourceItem, HardlinkMap, flatten_hdf, _visit_pruned
+from nwb_linkml.types.hdf5 import HDF5_Path, get_pool, file_location, is_zarr
+
+HEADER_BYTES = 64 * 1024
+"""Number of bytes at the start of a file to hash, which include the superblock and root group"""
+
+INDEX_VERSION = 2
+"""
+Version of the format of cached indexes, part of each cache file's name.
+Increment when the pickled classes (eg. the slots of :class:`~nwb_linkml.maps.hdf5.H5SourceItem` ) change.
+"""
+
+
+def _package_version() -> str:
+    try:
+        return importlib.metadata.version('nwb_linkml')
+    except importlib.metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+class FileSignature(BaseModel):
+    """
+    Identity of a file on disk, used to tell if an index is stale
+    """
+    path: Path | str
+    """Resolved path to the file, or its URL"""
+    size: int
+    """Size in bytes"""
+    mtime_ns: int
+    """Modification time in nanoseconds"""
+    header_hash: str
+    """blake2b hash of the first :data:`.HEADER_BYTES` of the file"""
+
+    @classmethod
+    def from_path(cls, path: Path | str) -> 'FileSignature':
+        path = file_location(path, resolve=True)
+        if is_zarr(path):
+            return cls._from_zarr(path)
+        if not isinstance(path, Path):
+            return cls._from_fileobj(path)
+        stat = path.stat()
+        with open(path, 'rb') as f:
+            header_hash = hashlib.blake2b(f.read(HEADER_BYTES)).hexdigest()
+        return cls(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns, header_hash=header_hash)
+
+    @classmethod
+    def _from_fileobj(cls, path: str) -> 'FileSignature':
+        """Signature of a remote file from the block cache it's read through, which will usually have the header cached"""
+        get_pool().get(path)
+        fileobj = get_pool().fileobj(path)
+        if not hasattr(fileobj, 'read_range'):
+            raise ValueError(f"Can't make a signature for {path}, only files read through a BlockCache can be indexed")
+        header_hash = hashlib.blake2b(fileobj.read_range(0, HEADER_BYTES) + fileobj.version.encode('utf-8')).hexdigest()
+        return cls(path=path, size=fileobj.size, mtime_ns=0, header_hash=header_hash)
+
+
+    @classmethod
+    def _from_zarr(cls, path: Path | str) -> 'FileSignature':
+        """Signature of a local zarr store from its root metadata, which changes whenever its consolidated metadata does"""
+        if not isinstance(path, Path):
+            raise ValueError(f"Can't make a signature for {path}, only local zarr stores can be indexed")
+        hasher = hashlib.blake2b()
+        mtime_ns = 0
+        for name in ('.zmetadata', '.zgroup', '.zattrs'):
+            meta = path / name
+            if meta.exists():
+                hasher.update(meta.read_bytes())
+                mtime_ns = max(mtime_ns, meta.stat().st_mtime_ns)
+        return cls(path=path, size=0, mtime_ns=mtime_ns, header_hash=hasher.hexdigest())
+
+
+class CachedIndex(BaseModel):
+    """
+    Base class for indexes that are cached in :attr:`.Config.index_dir` .
+
+    Subclasses implement :meth:`.build` and set :attr:`.SUFFIX` to keep their cache files apart.
+    """
+    SUFFIX: ClassVar[str] = ''
+    """Added to the name of the cache file, so each kind of index has its own file"""
+
+    signature: FileSignature
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @classmethod
+    def build(cls, path: Path | str, **kwargs) -> 'CachedIndex':
+        """
+        Walk the file and make an index for it, without caching it.
+        """
+        raise NotImplementedError('Subclasses must implement build')
+
+    @classmethod
+    def load(cls, path: Path | str, config: Optional[Config] = None, **kwargs) -> 'CachedIndex':
+        """
+        Get the index for a file, from the cache if it hasn't changed since it was indexed,
+        otherwise build and cache it.
+
+        Args:
+            path (:class:`pathlib.Path`): Path to the hdf5 file
+            config (:class:`.Config`): Configuration to get the index directory from.
+                If ``None`` (default), use the environment-wide configuration.
+            **kwargs: passed to :meth:`.build` if the index needs to be built
+        """
+        if config is None:
+            config = Config()
+        signature = FileSignature.from_path(path)
+        index_path = cls.index_path(signature.path, config)
+
+        if index_path.exists():
+            try:
+                with open(index_path, 'rb') as f:
+                    index = pickle.load(f)
+                if isinstance(index, cls) and index.signature == signature:
+                    return index
+            except Exception as e:
+                warnings.warn(f"Could not load index for {signature.path}, rebuilding: {e}")
+
+        index = cls.build(signature.path, **kwargs)
+        index.save(index_path)
+        return index
+
+    def save(self, index_path: Path):
+        """
+        Save the index, writing to a temporary file first so concurrent readers never see a partial index.
+
+        Files with attrs that can't be pickled (like region references) aren't cached.
+        """
+        try:
+            data = pickle.dumps(self)
+        except Exception as e:
+            warnings.warn(f"Could not cache index for {self.signature.path}: {e}")
+            return
+        tmp_path = index_path.with_suffix(index_path.suffix + '.tmp')
+        tmp_path.write_bytes(data)
+        tmp_path.replace(index_path)
+
+    @classmethod
+    def index_path(cls, path: Path, config: Config) -> Path:
+        """
+        Location of the cached index for a file, which changes with :data:`.INDEX_VERSION`
+        and the package version so stale formats are rebuilt rather than unpickled.
+        """
+        key = '\n'.join([str(file_location(path, resolve=True)), _package_version()])
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return config.index_dir / f'{digest}{cls.SUFFIX}-v{INDEX_VERSION}.pkl'
+
+
+class FileIndex(CachedIndex):
+    """
+    The flattened :class:`~nwb_linkml.maps.hdf5.H5SourceItem` table for a whole file,
+    and the map from object addresses to the canonical path for each object, which resolves hard links.
+
+    Use :meth:`.load` to get the index for a file, which uses the index cached in the
+    :attr:`.Config.index_dir` if it's still valid, and otherwise builds and caches a new one.
+    """
+    items: Dict[str, H5SourceItem] = Field(default_factory=dict)
+    """Flattened items, as from :func:`~nwb_linkml.maps.hdf5.flatten_hdf` , keyed by path"""
+    hardlinks: Dict[int, HDF5_Path] = Field(default_factory=dict)
+    """Object address to the canonical path of the object, shared by every hard link to it"""
+
+    @classmethod
+    def build(cls, path: Path | str) -> 'FileIndex':
+        """
+        Walk the file and make an index for it, without caching it.
+        """
+        signature = FileSignature.from_path(path)
+        h5f = get_pool().get(signature.path)
+        hardlinks = HardlinkMap()
+        items = flatten_hdf(h5f, hardlinks=hardlinks)
+        return cls.model_construct(signature=signature, items=items, hardlinks=hardlinks.paths)
+
+    def subtree(self, path: str = '/') -> Dict[str, H5SourceItem]:
+        """
+        Items at and below ``path`` , as :func:`~nwb_linkml.maps.hdf5.flatten_hdf` would give for that group.
+
+        Each call returns copies, so the read can modify them without modifying the index.
+        """
+        if path == '/':
+            return {k: v.model_copy() for k, v in self.items.items()}
+        prefix = path.rstrip('/') + '/'
+        return {k: v.model_copy() for k, v in self.items.items() if k == path or k.startswith(prefix)}
+
+
+class Referrer(BaseModel):
+    """
+    Something in a file that holds a reference to another object
+    """
+    path: HDF5_Path
+    """Path of the object holding the reference"""
+    kind: Literal['attr', 'dataset', 'compound']
+    """
+    Where the reference is held:
+
+    * ``attr`` - an attribute of the object at ``path`` , named ``name``
+    * ``dataset`` - a dataset of references at ``path``
+    * ``compound`` - the column ``name`` of a compound dataset at ``path``
+    """
+    name: Optional[str] = None
+    """Name of the attribute or compound column, if any"""
+
+    def __hash__(self):
+        return hash((self.path, self.kind, self.name))
+
+
+class ReferenceIndex(CachedIndex):
+    """
+    Map from each object in a file to the attributes, reference datasets, and
+    compound columns that reference it, so finding what references an object doesn't need to search the file.
+
+    Build once with :meth:`.build` (or :meth:`.load` to use the cache), dereferencing
+    datasets in parallel if given an executor, then look up referrers with :meth:`.referrers` .
+    """
+    SUFFIX: ClassVar[str] = '-refs'
+
+    targets: Dict[HDF5_Path, List[Referrer]] = Field(default_factory=dict)
+    """Path of each referenced object to the things that reference it"""
+
+    @classmethod
+    def build(
+            cls,
+            path: Path | str,
+            executor: Optional[Executor] = None,
+            hardlinks: Optional[Dict[int, HDF5_Path]] = None
+        ) -> 'ReferenceIndex':
+        """
+        Find and dereference every reference in the file, without caching the index.
+
+        Attributes are dereferenced as the file is walked, and reference datasets are
+        dereferenced separately, in parallel if an ``executor`` is given.
+
+        References are resolved to the address of their target, and then to its canonical path
+        in ``hardlinks`` , so objects that are hard linked at several paths are indexed at the same
+        path a read finds them at.
+
+        Args:
+            path (:class:`pathlib.Path`): Path to the hdf5 file
+            executor (:class:`concurrent.futures.Executor`): Optional, dereference datasets with this executor.
+                If ``None`` (default), dereference them serially.
+            hardlinks (dict): Object address to canonical path, as in :attr:`.FileIndex.hardlinks` .
+                If ``None`` (default), use the file's (cached) :class:`.FileIndex` .
+                Objects that aren't in it (eg. below skipped groups) use the path they are first found at.
+        """
+        signature = FileSignature.from_path(path)
+        h5f = get_pool().get(signature.path)
+        if hardlinks is None:
+            hardlinks = FileIndex.load(signature.path).hardlinks
+        walked = HardlinkMap()
+
+        def _canonical(addr: int) -> Optional[HDF5_Path]:
+            return hardlinks.get(addr, walked.paths.get(addr))
+
+        # (target address, referrer address, kind, name)
+        found: List[Tuple[int, int, str, Optional[str]]] = []
+        datasets: List[Tuple[int, str, Optional[str]]] = []
+
+        def _find(name, obj: h5py.Group | h5py.Dataset):
+            addr = None
+            for attr_name, attr in obj.attrs.items():
+                if isinstance(attr, h5py.h5r.Reference) and attr:
+                    target = _deref_addr(h5f, attr)
+                    if target is not None:
+                        addr = h5py.h5o.get_info(obj.id).addr if addr is None else addr
+                        found.append((target, addr, 'attr', attr_name))
+            if isinstance(obj, h5py.Dataset):
+                if h5py.check_dtype(ref=obj.dtype) is not None:
+                    datasets.append((h5py.h5o.get_info(obj.id).addr, obj.name, None))
+                elif obj.dtype.names is not None:
+                    for field in obj.dtype.names:
+                        if h5py.check_dtype(ref=obj.dtype.fields[field][0]) is not None:
+                            datasets.append((h5py.h5o.get_info(obj.id).addr, obj.name, field))
+
+        _visit_pruned(h5f, _find, lambda group: False, walked)
+
+        args = [(signature.path, dset, field) for _, dset, field in datasets]
+        if executor is None:
+            results = [_dataset_targets(*arg) for arg in args]
+        else:
+            results = executor.map(_dataset_targets, *zip(*args)) if args else []
+
+        for (addr, _, field), targets in zip(datasets, results):
+            kind = 'dataset' if field is None else 'compound'
+            found.extend([(target, addr, kind, field) for target in targets])
+
+        index = {}
+        for target, addr, kind, name in found:
+            target = _canonical(target)
+            if target is None:
+                continue
+            referrer = Referrer(path=_canonical(addr), kind=kind, name=name)
+            referrers = index.setdefault(target, [])
+            if referrer not in referrers:
+                referrers.append(referrer)
+
+        return cls.model_construct(signature=signature, targets=index)
+
+    def referrers(self, path: str) -> List[Referrer]:
+        """
+        Everything that references the object at ``path`` .
+        Hard links to the same object have the same referrers, so ``path`` should be the object's canonical path.
+        """
+        return self.targets.get(HDF5_Path('/' + path.strip('/')), [])
+
+
+def _deref_addr(h5f: h5py.File, ref: h5py.h5r.Reference) -> Optional[int]:
+    """
+    Get the address of the object a reference points to, or ``None`` if it points to nothing
+    (eg. in files truncated with :func:`~nwb_linkml.io.hdf5.truncate_file` ).
+
+    Addresses rather than names are used because looking up names is slow (hdf5 has to search for them),
+    and the name hdf5 finds for an object with several hard links isn't necessarily its canonical path.
+    """
+    try:
+        oid = h5py.h5r.dereference(ref, h5f.id)
+    except (KeyError, ValueError):
+        return None
+    return h5py.h5o.get_info(oid).addr
+
+
+def _dataset_targets(h5f_path: Path, path: str, field: Optional[str] = None) -> List[int]:
+    """
+    Unique addresses referenced by a dataset of references, or a column of a compound dataset.
+
+    Opens the file by path so it can be run in another process.
+    """
+    h5f = get_pool().get(h5f_path)
+    dset = h5f[path]
+    refs = dset[field] if field is not None else dset[()]
+    targets = {}
+    for ref in refs.flat:
+        if ref:
+            targets[_deref_addr(h5f, ref)] = None
+    targets.pop(None, None)
+    return list(targets.keys())
@@ -0,0 +1,354 @@
+"""
+Read hdf5 files from remote and object storage (eg. DANDI) with :mod:`fsspec` .
+
+h5py reads files with many small reads (a few hundred bytes of metadata at a time),
+which would each be a separate request if made directly against a remote file. Instead,
+:class:`.BlockCache` sits between h5py and fsspec: it reads the file in fixed-size blocks,
+fetches each run of missing blocks with a single range request, and keeps the blocks it has
+fetched in memory (and optionally on disk in :attr:`.Config.remote_dir` ), so scanning the metadata
+of a file takes a handful of requests rather than one per read.
+
+Reading a slice of an array first :meth:`~.BlockCache.prefetch` es the byte ranges of every chunk
+the slice touches (see :func:`.chunk_ranges` ), so the chunks are fetched together rather than
+as h5py asks for them one at a time.
+
+Remote files are opened by the :class:`~nwb_linkml.types.hdf5.H5FilePool` when given a URL, which uses
+:func:`.open_remote` , so they can be used anywhere a path to a local file can be, eg::
+
+    io = HDF5IO('https://dandiarchive.s3.amazonaws.com/blobs/...')
+    model = io.read(arrays='skip')
+
+fsspec (and whatever fsspec needs for the protocol, eg. ``aiohttp`` for ``http`` ) must be installed
+to read remote files.
+"""
+import hashlib
+import io
+import itertools
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import h5py
+import numpy as np
+
+from nwb_linkml.config import Config
+
+
+class BlockCache(io.RawIOBase):
+    """
+    Read-only file-like object that reads a file from an fsspec filesystem in blocks,
+    caching the blocks in memory and, if given a ``cache_dir`` , on disk.
+
+    h5py uses the ``repr`` of file-like objects as their ``filename`` , so the ``repr`` of a
+    block cache is the ``name`` it was made with (its URL), which lets objects read from it
+    be found again in the :class:`~nwb_linkml.types.hdf5.H5FilePool` .
+    """
+
+    def __init__(
+            self,
+            fs: Any,
+            path: str,
+            name: Optional[str] = None,
+            block_size: int = 2 * 1024 ** 2,
+            cache_size: int = 256 * 1024 ** 2,
+            cache_dir: Optional[Path] = None
+        ):
+        """
+        Args:
+            fs (:class:`fsspec.AbstractFileSystem`): Filesystem the file is on
+            path (str): Path to the file within ``fs``
+            name (str): Name of the file, usually its URL. If ``None`` , use ``path``
+            block_size (int): Number of bytes in each block
+            cache_size (int): Approximate number of bytes of blocks to keep in memory
+            cache_dir (:class:`pathlib.Path`): If given, also cache blocks on disk in a subdirectory of this
+                directory, named by a hash of the file's name, size, and version (eg. its ETag or modification time)
+        """
+        super().__init__()
+        self.fs = fs
+        self.path = path
+        self.name = name if name is not None else path
+        self.block_size = block_size
+        self.max_blocks = max(cache_size // block_size, 1)
+
+        info = fs.info(path)
+        self.size: int = info['size']
+        self.version: str = str(next((info[k] for k in ('ETag', 'etag', 'mtime', 'LastModified', 'last_modified') if k in info), ''))
+        """Whatever the filesystem gives to tell versions of the file apart, if anything"""
+        self.fetches: int = 0
+        """Number of requests made to the filesystem, mostly for profiling and testing"""
+
+        self.cache_dir: Optional[Path] = None
+        if cache_dir is not None:
+            digest = hashlib.blake2b(
+                f'{self.name}:{self.size}:{self.version}:{self.block_size}'.encode('utf-8'), digest_size=16
+            ).hexdigest()
+            self.cache_dir = Path(cache_dir) / digest
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._blocks: OrderedDict[int, bytes] = OrderedDict()
+        self._lock = threading.RLock()
+        self._pos = 0
+
+    def __repr__(self) -> str:
+        return self.name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        return self._pos
+
+    def readinto(self, b) -> int:
+        n = max(min(len(b), self.size - self._pos), 0)
+        if n == 0:
+            return 0
+        b[:n] = self.read_range(self._pos, self._pos + n)
+        self._pos += n
+        return n
+
+    def read_range(self, start: int, end: int) -> bytes:
+        """Read the bytes from ``start`` to ``end`` , fetching any blocks that aren't cached"""
+        end = min(end, self.size)
+        if end <= start:
+            return b''
+        first, last = start // self.block_size, (end - 1) // self.block_size
+        blocks = self._get_blocks(range(first, last + 1))
+        data = b''.join(blocks[i] for i in range(first, last + 1))
+        offset = first * self.block_size
+        return data[start - offset:end - offset]
+
+    def prefetch(self, ranges: Iterable[Tuple[int, int]]):
+        """
+        Fetch every block in a set of ``(start, end)`` byte ranges that isn't cached yet,
+        with one request for each run of consecutive missing blocks.
+        """
+        needed = set()
+        for start, end in ranges:
+            end = min(end, self.size)
+            if end > start:
+                needed.update(range(start // self.block_size, (end - 1) // self.block_size + 1))
+        if needed:
+            self._get_blocks(sorted(needed))
+
+    def close(self):
+        with self._lock:
+            self._blocks.clear()
+        super().close()
+
+    def _get_blocks(self, indices: Iterable[int]) -> Dict[int, bytes]:
+        """Get blocks by index, from memory, disk, or the filesystem in that order"""
+        with self._lock:
+            found = {}
+            missing = []
+            for i in indices:
+                block = self._blocks.get(i, None)
+                if block is not None:
+                    self._blocks.move_to_end(i)
+                else:
+                    block = self._load_block(i)
+                if block is None:
+                    missing.append(i)
+                else:
+                    found[i] = block
+
+            if missing:
+                found.update(self._fetch(missing))
+            for i, block in found.items():
+                self._store(i, block)
+            return found
+
+    def _fetch(self, indices: List[int]) -> Dict[int, bytes]:
+        """Fetch blocks from the filesystem, one range request for each run of consecutive blocks"""
+        runs = []
+        for _, run in itertools.groupby(enumerate(indices), lambda pair: pair[1] - pair[0]):
+            run = [i for _, i in run]
+            runs.append((run[0], run[-1]))
+        starts = [first * self.block_size for first, _ in runs]
+        ends = [min((last + 1) * self.block_size, self.size) for _, last in runs]
+        datas = self.fs.cat_ranges([self.path] * len(runs), starts, ends)
+        self.fetches += len(runs)
+
+        blocks = {}
+        for (first, last), data in zip(runs, datas):
+            if isinstance(data, Exception):
+                raise data
+            for i in range(first, last + 1):
+                offset = (i - first) * self.block_size
+                blocks[i] = data[offset:offset + self.block_size]
+                self._save_block(i, blocks[i])
+        return blocks
+
+    def _store(self, index: int, block: bytes):
+        self._blocks[index] = block
+        self._blocks.move_to_end(index)
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+    def _load_block(self, index: int) -> Optional[bytes]:
+        if self.cache_dir is None:
+            return None
+        block_path = self.cache_dir / f'{index}.block'
+        if block_path.exists():
+            return block_path.read_bytes()
+        return None
+
+    def _save_block(self, index: int, block: bytes):
+        if self.cache_dir is None:
+            return
+        # write to a temporary file first so other processes never see a partial block
+        block_path = self.cache_dir / f'{index}.block'
+        tmp_path = block_path.with_suffix(f'.{threading.get_ident()}.tmp')
+        tmp_path.write_bytes(block)
+        tmp_path.replace(block_path)
+
+
+class NamedFile(io.RawIOBase):
+    """
+    Wrap a file-like object so that its ``repr`` (which h5py uses as the ``filename`` of files
+    opened from file-like objects) is a name it's registered under in the :class:`~nwb_linkml.types.hdf5.H5FilePool`
+    """
+
+    def __init__(self, fileobj: Any, name: str):
+        super().__init__()
+        self.fileobj = fileobj
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.fileobj.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.fileobj.seek(offset, whence)
+
+    def readinto(self, b) -> int:
+        data = self.fileobj.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def open_remote(url: str, config: Optional[Config] = None, **storage_options) -> BlockCache:
+    """
+    Open a file from a URL with fsspec, reading it through a :class:`.BlockCache` .
+
+    The block size, memory cache size, and whether blocks are also cached on disk
+    are set by the :class:`.Config` (``remote_block_size`` , ``remote_cache_size`` , ``remote_disk_cache`` ).
+
+    Args:
+        url (str): URL to the file, with any protocol fsspec understands
+        config (:class:`.Config`): If ``None`` (default), use the environment-wide configuration.
+        **storage_options: Passed to the fsspec filesystem, eg. credentials
+    """
+    try:
+        import fsspec
+    except ImportError as e:
+        raise ImportError('fsspec is needed to read remote files, install it with `pip install "nwb-linkml[remote]"`') from e
+    if config is None:
+        config = Config()
+    fs, path = fsspec.core.url_to_fs(url, **storage_options)
+    return BlockCache(
+        fs, path,
+        name=url,
+        block_size=config.remote_block_size,
+        cache_size=config.remote_cache_size,
+        cache_dir=config.remote_dir if config.remote_disk_cache else None
+    )
+
+
+def open_fileobj(fileobj: Any, name: str, config: Optional[Config] = None) -> BlockCache | NamedFile:
+    """
+    Prepare a file-like object to be opened by h5py with the given ``name`` .
+
+    fsspec files (which have a ``fs`` and ``path`` ) are read through a :class:`.BlockCache` ,
+    other file-like objects are read directly.
+    """
+    if hasattr(fileobj, 'fs') and hasattr(fileobj, 'path'):
+        if config is None:
+            config = Config()
+        return BlockCache(
+            fileobj.fs, fileobj.path,
+            name=name,
+            block_size=config.remote_block_size,
+            cache_size=config.remote_cache_size,
+            cache_dir=config.remote_dir if config.remote_disk_cache else None
+        )
+    return NamedFile(fileobj, name)
+
+
+def chunk_ranges(dset: h5py.Dataset, key: Any = ()) -> List[Tuple[int, int]]:
+    """
+    Byte ranges ``(start, end)`` in the file of the data a selection of a dataset reads:
+    the chunks the selection touches for chunked datasets, or the rows it spans for contiguous datasets.
+
+    Selections are made of ints and slices, anything else (eg. fancy indexing) along a dimension
+    is treated as selecting all of it. Returns an empty list if the data isn't stored in the file
+    (eg. compact or external datasets).
+    """
+    if dset.shape is None or len(dset.shape) == 0:
+        return []
+    bounds = _selection_bounds(dset.shape, key)
+    if any(stop <= start for start, stop in bounds):
+        return []
+
+    if dset.chunks is None:
+        offset = dset.id.get_offset()
+        if offset is None:
+            return []
+        row_bytes = int(np.prod(dset.shape[1:])) * dset.dtype.itemsize
+        start, stop = bounds[0]
+        return [(offset + start * row_bytes, offset + stop * row_bytes)]
+
+    ranges = []
+    chunk_indices = [range(start // chunk, (stop - 1) // chunk + 1) for (start, stop), chunk in zip(bounds, dset.chunks)]
+    for index in itertools.product(*chunk_indices):
+        coord = tuple(i * chunk for i, chunk in zip(index, dset.chunks))
+        info = dset.id.get_chunk_info_by_coord(coord)
+        if info.byte_offset is not None:
+            ranges.append((info.byte_offset, info.byte_offset + info.size))
+    return ranges
+
+
+def _selection_bounds(shape: Tuple[int, ...], key: Any) -> List[Tuple[int, int]]:
+    """``(start, stop)`` along each dimension of a selection"""
+    if not isinstance(key, tuple):
+        key = (key,)
+    if any(k is Ellipsis for k in key):
+        i = next(i for i, k in enumerate(key) if k is Ellipsis)
+        key = key[:i] + (slice(None),) * (len(shape) - len(key) + 1) + key[i + 1:]
+
+    bounds = []
+    for dim, size in enumerate(shape):
+        k = key[dim] if dim < len(key) else slice(None)
+        if isinstance(k, (int, np.integer)):
+            k = int(k) + size if k < 0 else int(k)
+            bounds.append((k, k + 1))
+        elif isinstance(k, slice):
+            start, stop, step = k.indices(size)
+            if step < 0:
+                start, stop = stop + 1, start + 1
+            bounds.append((start, max(stop, start)))
+        else:
+            bounds.append((0, size))
+    return bounds
@@ -0,0 +1,1047 @@
+"""
+Write models back to hdf5 files.
+
+Models don't record which of their fields were hdf5 attributes, datasets, or groups, so
+writing inverts the way the maps in :mod:`nwb_linkml.maps.hdf5` read them:
+
+* Models are groups, unless they are dataset models (with an ``array`` or ``value`` field),
+  which are datasets whose other fields are its attributes.
+* Models for classes that are ``tree_root`` s (see :class:`~nwb_linkml.generators.pydantic.LinkML_Meta` )
+  get ``neurodata_type`` and ``namespace`` attributes, as do any models that subclass them.
+* Scalars and arrays are attributes or datasets as the NWB schema declares them (see :class:`.SchemaLayout` ).
+  Without a schema, scalars are attributes of typed groups and datasets otherwise, and arrays are datasets.
+* Named subgroups that the schema requires (like ``/analysis`` or ``/stimulus/presentation`` ) are always made,
+  even when they are empty, and fixed or default attributes of datasets (like ``timestamps.unit`` ) are filled in.
+* Dictionaries of models are groups of their children, except the special ``children`` field,
+  whose items are children of the model itself (see :class:`~nwb_linkml.maps.hdf5.ResolveModelGroup` ).
+  Lists of models are also children of the model itself.
+* DynamicTables write their ``colnames`` as an attribute and their columns as ``VectorData`` ,
+  ``VectorIndex`` (with a ``target`` reference to the column they index) and ``ElementIdentifiers`` datasets.
+  Reference columns, including the references in compound columns (like ``TimeIntervals.timeseries`` ),
+  are remade to point within the new file.
+
+Arrays are never loaded into memory all at once: they are written in blocks of whole chunks
+(see :class:`.WriteOptions` ), and arrays from other hdf5 files that would be stored the same way
+are copied without decompressing them. Generators are written block by block into resizable datasets.
+
+Objects that appear more than once in the model (eg. the same model in two places, or two proxies
+to the same hdf5 dataset) are written once and hardlinked everywhere else.
+
+Files written with ``resizable=True`` can be appended to in place: :class:`.TableAppender` adds rows
+to DynamicTables and :class:`.SeriesAppender` adds samples to TimeSeries, both buffering appends
+into whole chunks with a :class:`.DatasetAppender` .
+"""
+import datetime
+import posixpath
+import warnings
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+from dask.array.core import Array as DaskArray
+from pydantic import BaseModel, Field
+
+from nwb_linkml.types.hdf5 import HDF5_Path, LazyModel, get_pool, file_location
+from nwb_linkml.types.ndarray import NDArrayProxy, NDArrayInfo
+
+
+class WriteOptions(BaseModel):
+    """
+    Options for how arrays are stored by :class:`.ModelWriter`
+    """
+    compression: Optional[str] = Field(
+        'gzip',
+        description="Compression filter for new datasets, or ``None`` for no compression")
+    compression_opts: Optional[Any] = Field(
+        4,
+        description="Options for the compression filter, eg. the gzip level")
+    shuffle: bool = Field(
+        False,
+        description="Use the shuffle filter, which can improve compression of numeric data")
+    chunks: Union[bool, Tuple[int, ...]] = Field(
+        True,
+        description=("Chunk shape for new datasets. ``True`` uses the chunks of arrays copied from other hdf5 files "
+                     "or guesses them with h5py, a tuple uses that chunk shape for every dataset, and ``False`` "
+                     "stores small arrays contiguously (arrays that need to be written in blocks are always chunked)"))
+    block_size: int = Field(
+        64 * 1024 ** 2,
+        description=("Approximate number of bytes to read and write at once. Blocks are always made "
+                     "of whole chunks along the first dimension, so at least one row of chunks is written at a time."))
+    resizable: bool = Field(
+        False,
+        description=("Make datasets resizable along their first dimension, so they can be appended to "
+                     "(see :class:`.TableAppender` and :class:`.SeriesAppender` ). Resizable datasets are always chunked."))
+    copy_chunks: bool = Field(
+        True,
+        description=("Copy arrays from other hdf5 files without decompressing them, "
+                     "if they would have the same chunks and filters in the new file"))
+
+
+class Layout:
+    """
+    The named attributes, datasets, groups, and links of a group or dataset in the NWB schema,
+    including those it inherits, each mapped to its spec (as a ``dict`` ).
+    """
+    __slots__ = ('attributes', 'datasets', 'groups', 'links')
+
+    def __init__(self):
+        self.attributes: Dict[str, dict] = {}
+        self.datasets: Dict[str, dict] = {}
+        self.groups: Dict[str, dict] = {}
+        self.links: Dict[str, dict] = {}
+
+    def update(self, spec: dict):
+        """Add the members of a spec, without replacing members from a more specific spec"""
+        for kind in self.__slots__:
+            for member in spec.get(kind, None) or []:
+                if member.get('name', None) is not None:
+                    getattr(self, kind).setdefault(member['name'], member)
+
+    def member(self, name: str) -> Tuple[Optional[str], Optional[dict]]:
+        """The kind of member (``'attributes'`` , ``'datasets'`` , ...) called ``name`` and its spec, if any"""
+        for kind in self.__slots__:
+            if name in getattr(self, kind):
+                return kind, getattr(self, kind)[name]
+        return None, None
+
+
+class SchemaLayout:
+    """
+    Where each field of a model is stored, from the NWB schema the models were generated from.
+
+    The LinkML schema (and so the models) doesn't keep whether a scalar slot was an attribute or a dataset,
+    or which subgroups are required, so :class:`.ModelWriter` looks them up in the NWB schema that
+    the LinkML schema was translated from.
+
+    Args:
+        specs (dict): Schema dictionaries, as from :func:`~nwb_linkml.io.hdf5.read_specs_as_dicts`
+    """
+
+    def __init__(self, specs: Dict[str, Dict[str, dict]]):
+        self.types: Dict[str, dict] = {}
+        """Spec of each ``neurodata_type_def`` , including those nested in other specs"""
+        for ns_name, ns_schemas in specs.items():
+            for name, schema in ns_schemas.items():
+                if name == 'namespace':
+                    continue
+                for spec in (schema.get('groups', None) or []) + (schema.get('datasets', None) or []):
+                    self._add_types(spec)
+        self._layouts: Dict[Tuple[int, Optional[str]], Optional[Layout]] = {}
+
+    def _add_types(self, spec: dict):
+        if spec.get('neurodata_type_def', None):
+            self.types.setdefault(spec['neurodata_type_def'], spec)
+        for child in (spec.get('groups', None) or []) + (spec.get('datasets', None) or []):
+            self._add_types(child)
+
+    def layout(self, spec: Optional[dict] = None, type_name: Optional[str] = None) -> Optional[Layout]:
+        """
+        Members of ``spec`` (eg. a named subgroup of its parent) and of the ``neurodata_type`` it is
+        an instance of, and every type that inherits from.
+
+        Args:
+            spec (dict): Spec of the group or dataset where it's used in its parent, if any
+            type_name (str): The ``neurodata_type`` of the model, if it has one, which may be a subtype of
+                the type the ``spec`` includes. If ``None`` , use the type the ``spec`` includes.
+
+        Returns:
+            :class:`.Layout` , or ``None`` if neither the spec nor the type are in the schema
+        """
+        key = (id(spec), type_name)
+        if key not in self._layouts:
+            layout = Layout()
+            if spec is not None:
+                layout.update(spec)
+            name = type_name if type_name in self.types else None
+            if name is None and spec is not None:
+                name = spec.get('neurodata_type_inc', None)
+            seen = set()
+            while name is not None and name in self.types and name not in seen:
+                seen.add(name)
+                layout.update(self.types[name])
+                name = self.types[name].get('neurodata_type_inc', None)
+            self._layouts[key] = layout if spec is not None or seen else None
+        return self._layouts[key]
+
+
+class ModelWriter:
+    """
+    Write a tree of models into an open hdf5 file.
+
+    Use :meth:`.HDF5IO.write` rather than using this directly.
+
+    Args:
+        h5f (:class:`h5py.File`): File to write to
+        options (:class:`.WriteOptions`): How to store arrays
+        schema (:class:`.SchemaLayout`): Where each field is stored. If ``None`` , guess from the values.
+
+    Attributes:
+        written (dict): Identities of the objects that have been written, mapped to the path they were written to,
+            used to hardlink objects that appear more than once.
+        sources (set): Paths to hdf5 files that arrays were copied from
+    """
+
+    def __init__(self, h5f: h5py.File, options: Optional[WriteOptions] = None, schema: Optional[SchemaLayout] = None):
+        if options is None:
+            options = WriteOptions()
+        self.h5f = h5f
+        self.options = options
+        self.schema = schema
+        self.written: Dict[Any, str] = {}
+        self.sources: set[Path | str] = set()
+        self._references: List[Tuple[str, Optional[str], Any]] = []
+        # table columns that are only written with the references, and are typed after them
+        self._reference_columns: List[Tuple[str, type]] = []
+
+    def write(self, model: BaseModel, path: str = '/'):
+        """
+        Write a model and everything it contains at ``path`` .
+
+        References are written after everything else, so they can point anywhere in the model.
+        """
+        path = '/' + path.strip('/')
+        if isinstance(model, LazyModel):
+            model = model.resolve()
+        if _is_dataset_model(model):
+            self._write_dataset_model(model, path)
+        else:
+            self._write_group(model, path)
+        self._write_references()
+
+    def _write_group(self, model: BaseModel, path: str, spec: Optional[dict] = None):
+        if self._link(model, path):
+            return
+        group = self.h5f.require_group(path)
+        typed = self._type_attrs(group, type(model))
+        layout = self._layout(type(model), spec)
+
+        is_table = _is_dynamic_table(type(model))
+        columns = []
+        colnames = None
+        indexes = _table_indexes(model) if is_table else set()
+        for key, value in _fields(model):
+            if value is None:
+                continue
+            if isinstance(value, LazyModel):
+                value = value.resolve()
+            kind, member = layout.member(key) if layout is not None else (None, None)
+            child_spec = member if kind in ('groups', 'datasets') else None
+
+            if is_table and key == 'colnames':
+                # written once we know which columns were written
+                colnames = value
+            elif key == 'children' and isinstance(value, dict):
+                for name, child in value.items():
+                    self._write_child(child, posixpath.join(path, name))
+            elif kind == 'links' and isinstance(value, HDF5_Path):
+                group[key] = h5py.SoftLink(value)
+            elif isinstance(value, BaseModel):
+                self._write_child(value, posixpath.join(path, key), child_spec)
+            elif isinstance(value, dict) and 'array' in value:
+                # a dataset that was never cast to a model
+                dset = self._write_array(posixpath.join(path, key), value['array'])
+                for attr_name, attr in value.items():
+                    if dset is not None and attr_name not in ('array', 'name', 'hdf5_path'):
+                        self._write_attr(dset, attr_name, attr)
+                self._spec_attrs(dset, child_spec)
+            elif isinstance(value, dict):
+                if len(value) == 0:
+                    continue
+                subgroup_path = posixpath.join(path, key)
+                self.h5f.require_group(subgroup_path)
+                for name, child in value.items():
+                    self._write_child(child, posixpath.join(subgroup_path, name))
+            elif isinstance(value, (list, tuple)) and len(value) > 0 and all(isinstance(v, BaseModel) for v in value):
+                for child in value:
+                    self._write_child(child, posixpath.join(path, child.name))
+            elif kind == 'attributes':
+                self._write_attr(group, key, value)
+            elif isinstance(value, (list, tuple)) and len(value) > 0 and all(isinstance(v, HDF5_Path) for v in value):
+                self._references.append((posixpath.join(path, key), None, list(value)))
+                columns.append(key)
+                if is_table:
+                    self._reference_columns.append((posixpath.join(path, key), type(model)))
+            elif _is_array(value):
+                if isinstance(value, (list, tuple)) and len(value) == 0:
+                    continue
+                if key in indexes and not _has_value(model.__dict__.get(key[:-len('_index')], None)):
+                    # an index for a column that isn't there can't be read
+                    continue
+                dset_path = posixpath.join(path, key)
+                dset = self._write_array(dset_path, value)
+                if dset is not None:
+                    self._spec_attrs(dset, child_spec)
+                    if is_table:
+                        self._column_attrs(dset, type(model), key in indexes)
+                    columns.append(key)
+                elif self._references and self._references[-1][0] == dset_path:
+                    columns.append(key)
+                    if is_table:
+                        self._reference_columns.append((dset_path, type(model)))
+            elif kind == 'datasets' or (kind is None and not typed):
+                # untyped groups can't have attributes (see ResolveContainerGroups), so scalars are datasets
+                dset = self.h5f.create_dataset(posixpath.join(path, key), data=_attr_value(value))
+                self._spec_attrs(dset, child_spec)
+            else:
+                self._write_attr(group, key, value)
+
+        if layout is not None:
+            self._require_groups(path, layout)
+
+        if is_table:
+            # an index for a column that couldn't be written can't be read either
+            for key in [c for c in columns if c in indexes and c[:-len('_index')] not in columns]:
+                index_path = posixpath.join(path, key)
+                del group[key]
+                columns.remove(key)
+                self._references = [ref for ref in self._references if ref[0] != index_path]
+            # only list the columns that were written, since tables can't be read without their columns
+            if colnames is None:
+                colnames = [c for c in columns if c != 'id' and c not in indexes]
+            else:
+                colnames = [c.decode('utf-8') if isinstance(c, bytes) else str(c) for c in colnames]
+                colnames = [c for c in colnames if c in columns]
+            group.attrs['colnames'] = _string_array(colnames)
+
+    def _layout(self, cls: type, spec: Optional[dict] = None) -> Optional[Layout]:
+        """Layout of a model in the schema, from its ``neurodata_type`` and its spec in its parent, if any"""
+        if self.schema is None:
+            return None
+        typed = _neurodata_type(cls)
+        return self.schema.layout(spec, typed.__name__ if typed is not None else None)
+
+    def _require_groups(self, path: str, layout: Layout):
+        """Make the named, untyped subgroups the schema requires, which may be empty"""
+        for name, spec in layout.groups.items():
+            if spec.get('neurodata_type_inc', None) or spec.get('neurodata_type_def', None):
+                continue
+            if spec.get('quantity', None) not in (None, 1, '1', '+'):
+                continue
+            subgroup_path = posixpath.join(path, name)
+            if subgroup_path in self.h5f and not isinstance(self.h5f[subgroup_path], h5py.Group):
+                continue
+            self.h5f.require_group(subgroup_path)
+            self._require_groups(subgroup_path, self.schema.layout(spec))
+
+    def _spec_attrs(self, dset: Optional[h5py.Dataset], spec: Optional[dict], type_name: Optional[str] = None):
+        """Fill in the fixed and default attributes of a dataset that weren't written from the model"""
+        if dset is None or self.schema is None or (spec is None and type_name is None):
+            return
+        layout = self.schema.layout(spec, type_name)
+        if layout is None:
+            return
+        for name, attr in layout.attributes.items():
+            value = attr.get('value', attr.get('default_value', None))
+            if value is not None and name not in dset.attrs:
+                self._write_attr(dset, name, value)
+
+    def _write_child(self, value: Any, path: str, spec: Optional[dict] = None):
+        if isinstance(value, LazyModel):
+            value = value.resolve()
+        if isinstance(value, BaseModel):
+            if _is_dataset_model(value):
+                self._write_dataset_model(value, path, spec)
+            else:
+                self._write_group(value, path, spec)
+        elif _is_array(value):
+            self._write_array(path, value)
+        else:
+            warnings.warn(f"Don't know how to write {type(value)} to {path}, skipping")
+
+    def _write_dataset_model(self, model: BaseModel, path: str, spec: Optional[dict] = None):
+        if self._link(model, path):
+            return
+        data = getattr(model, 'array', None)
+        if data is None:
+            data = getattr(model, 'value', None)
+        if data is None:
+            # a dataset model with no data is just its attributes, which need somewhere to live
+            data = np.array([])
+        if _is_array(data):
+            dset = self._write_array(path, data)
+        else:
+            dset = self.h5f.create_dataset(path, data=_attr_value(data))
+        if dset is None:
+            return
+        typed = self._type_attrs(dset, type(model))
+        for key, value in _fields(model):
+            if key in ('array', 'value') or value is None:
+                continue
+            self._write_attr(dset, key, value)
+        self._spec_attrs(dset, spec, _neurodata_type(type(model)).__name__ if typed else None)
+
+    def _write_attr(self, obj: h5py.Group | h5py.Dataset, key: str, value: Any):
+        if isinstance(value, HDF5_Path):
+            self._references.append((obj.name, key, value))
+            return
+        if isinstance(value, (NDArrayProxy, NDArrayInfo, DaskArray, h5py.Dataset)):
+            value = _source(value)[()]
+        try:
+            obj.attrs[key] = _attr_value(value)
+        except TypeError as e:
+            warnings.warn(f"Could not write attribute {key} of {obj.name}: {e}")
+
+    def _write_array(self, path: str, data: Any) -> Optional[h5py.Dataset]:
+        """
+        Write an array-like object to a dataset, in blocks if it's large.
+
+        Returns ``None`` if the dataset isn't written yet (references are written last)
+        """
+        key = _identity(data)
+        if key is not None and self._link(key, path):
+            return self.h5f[path]
+
+        if isinstance(data, NDArrayInfo):
+            data = data.proxy()
+        if isinstance(data, NDArrayProxy):
+            data = _source(data)
+
+        if isinstance(data, h5py.Dataset):
+            dset = self._write_h5_dataset(path, data)
+        elif isinstance(data, DaskArray):
+            dset = self._write_blocks(path, data, data.shape, data.dtype, chunks=None)
+        elif isinstance(data, (np.ndarray, list, tuple)):
+            arr = np.asarray(data)
+            if arr.dtype.kind in ('U', 'O'):
+                arr = _string_array(arr)
+            dset = self._write_blocks(path, arr, arr.shape, arr.dtype, chunks=None)
+        else:
+            dset = self._write_iterator(path, iter(data))
+
+        if key is not None and dset is not None:
+            self.written[key] = dset.name
+        return dset
+
+    def _write_h5_dataset(self, path: str, source: h5py.Dataset) -> Optional[h5py.Dataset]:
+        """Copy a dataset from another file, without decompressing it if its layout stays the same"""
+        self.sources.add(file_location(source.file.filename, resolve=True))
+        if h5py.check_dtype(ref=source.dtype) is not None:
+            # references need to be remade to point within this file
+            names = {}
+            targets = [_ref_path(source.file, ref, names) for ref in source[()].flat]
+            self._references.append((path, None, targets))
+            return None
+        if source.dtype.names is not None and any(
+            h5py.check_dtype(ref=source.dtype.fields[f][0]) is not None for f in source.dtype.names
+        ):
+            data = source[()]
+            names = {}
+            targets = {
+                f: [_ref_path(source.file, ref, names) for ref in data[f].flat]
+                for f in source.dtype.names if h5py.check_dtype(ref=source.dtype.fields[f][0]) is not None
+            }
+            self._references.append((path, None, _CompoundReferences(data, targets)))
+            return None
+
+        chunks = _chunks(self.options, source.chunks)
+        if (
+            self.options.copy_chunks
+            and source.chunks is not None
+            and chunks == source.chunks
+            and source.compression == self.options.compression
+            and source.compression_opts == self.options.compression_opts
+            and source.shuffle == self.options.shuffle
+            and (not self.options.resizable or (len(source.shape) > 0 and source.maxshape[0] is None))
+        ):
+            parent = self.h5f.require_group(posixpath.dirname(path))
+            source.file.copy(source, parent, name=posixpath.basename(path), without_attrs=True)
+            return self.h5f[path]
+        return self._write_blocks(path, source, source.shape, source.dtype, chunks=source.chunks)
+
+    def _write_blocks(
+            self,
+            path: str,
+            data: Any,
+            shape: Tuple[int, ...],
+            dtype: np.dtype,
+            chunks: Optional[Tuple[int, ...]]
+        ) -> h5py.Dataset:
+        """Write an array with a known shape in blocks of whole chunks"""
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if len(shape) == 0:
+            return self.h5f.create_dataset(path, data=np.asarray(data))
+        if nbytes == 0:
+            storage = _storage(self.options, shape, dtype, chunks) if self.options.resizable else {}
+            return self.h5f.create_dataset(path, data=np.empty(shape, dtype=dtype), **storage)
+
+        if isinstance(data, np.ndarray) and nbytes <= self.options.block_size:
+            # small in-memory arrays are written in one go
+            return self.h5f.create_dataset(
+                path, data=data, **_storage(self.options, shape, dtype, chunks, always_chunk=False)
+            )
+
+        dset = self.h5f.create_dataset(path, shape=shape, dtype=dtype, **_storage(self.options, shape, dtype, chunks))
+        for block in _blocks(shape, dtype, dset.chunks, self.options.block_size):
+            values = data[block]
+            if isinstance(values, DaskArray):
+                values = values.compute()
+            dset[block] = values
+        return dset
+
+    def _write_iterator(self, path: str, data: Iterator) -> h5py.Dataset:
+        """
+        Write blocks from an iterator along the first dimension of a resizable dataset,
+        buffering them so that writes are of whole chunks
+        """
+        appender = DatasetAppender(self.h5f, path, self.options)
+        for block in data:
+            appender.append(block)
+            if appender.ready:
+                appender.flush()
+        if appender.dset is None:
+            raise ValueError(f"Can't write an empty iterator to {path}")
+        appender.flush()
+        return appender.dset
+
+    def _type_attrs(self, obj: h5py.Group | h5py.Dataset, cls: type) -> bool:
+        """
+        Add ``neurodata_type`` and ``namespace`` for models of (subclasses of) neurodata types,
+        returning whether the model has a type
+        """
+        typed = _neurodata_type(cls)
+        if typed is None:
+            return False
+        obj.attrs['neurodata_type'] = typed.__name__
+        obj.attrs['namespace'] = _namespace(typed)
+        return True
+
+    def _column_attrs(self, dset: h5py.Dataset, table_cls: type, is_index: bool = False):
+        """Type the columns of a DynamicTable, and point indexes at the column they index"""
+        if 'neurodata_type' in dset.attrs:
+            # already written by some other path, eg. hardlinked
+            return
+        column = posixpath.basename(dset.name)
+        if column == 'id':
+            dset.attrs['neurodata_type'] = 'ElementIdentifiers'
+        elif is_index:
+            dset.attrs['neurodata_type'] = 'VectorIndex'
+            target = posixpath.join(dset.parent.name, column[:-len('_index')])
+            self._references.append((dset.name, 'target', HDF5_Path(target)))
+        else:
+            dset.attrs['neurodata_type'] = 'VectorData'
+            dset.attrs['description'] = ''
+        # the columns are in the same namespace as the DynamicTable class
+        table_base = next(parent for parent in table_cls.__mro__ if parent.__name__ == 'DynamicTable')
+        dset.attrs['namespace'] = _namespace(table_base)
+
+    def _write_references(self):
+        """Write the references that were collected while writing, now that their targets exist"""
+        for path, attr, target in self._references:
+            if attr is not None:
+                if target in self.h5f:
+                    self.h5f[path].attrs[attr] = self.h5f[target].ref
+                else:
+                    warnings.warn(f"Reference target {target} for {path}.{attr} was not written")
+                continue
+            if path in self.h5f:
+                del self.h5f[path]
+            if isinstance(target, _CompoundReferences):
+                data = target.data
+                dtype = np.dtype([
+                    (f, h5py.ref_dtype if f in target.targets else data.dtype.fields[f][0]) for f in data.dtype.names
+                ])
+                values = np.empty(data.shape, dtype=dtype)
+                for f in data.dtype.names:
+                    if f in target.targets:
+                        values[f] = np.array(self._refs(path, target.targets[f]), dtype=h5py.ref_dtype).reshape(data.shape)
+                    else:
+                        values[f] = data[f]
+                self.h5f.create_dataset(path, data=values, dtype=dtype)
+            else:
+                self.h5f.create_dataset(path, data=np.array(self._refs(path, target), dtype=h5py.ref_dtype), dtype=h5py.ref_dtype)
+        self._references = []
+
+        for path, table_cls in self._reference_columns:
+            if path in self.h5f:
+                self._column_attrs(self.h5f[path], table_cls)
+        self._reference_columns = []
+
+    def _refs(self, path: str, targets: List[Optional[HDF5_Path]]) -> List[h5py.Reference]:
+        refs = []
+        for t in targets:
+            if t is not None and t in self.h5f:
+                refs.append(self.h5f[t].ref)
+            else:
+                if t is not None:
+                    warnings.warn(f"Reference target {t} for {path} was not written")
+                refs.append(h5py.Reference())
+        return refs
+
+    def _link(self, obj: Any, path: str) -> bool:
+        """
+        Hardlink an object that has already been written, returning ``True`` if it was.
+        Otherwise, record that it's being written to ``path`` .
+        """
+        key = obj if isinstance(obj, tuple) else ('model', id(obj))
+        if key in self.written and self.written[key] != path:
+            self.h5f[path] = self.h5f[self.written[key]]
+            return True
+        if not isinstance(obj, tuple):
+            self.written[key] = path
+        return False
+
+
+
+class DatasetAppender:
+    """
+    Append to a dataset along its first dimension, buffering appends so they are written in whole chunks.
+
+    If the dataset doesn't exist, it is made on the first append, resizable and with the
+    chunks and filters from the :class:`.WriteOptions` . Existing datasets must already be resizable
+    (eg. written with ``HDF5IO.write(..., resizable=True)`` ).
+
+    Call :meth:`.flush` to write whatever is buffered: appends are only written by :meth:`.flush` ,
+    and :attr:`.ready` says when enough is buffered to fill whole chunks.
+    """
+
+    def __init__(self, h5f: h5py.File, path: str, options: Optional[WriteOptions] = None):
+        if options is None:
+            options = WriteOptions()
+        self.h5f = h5f
+        self.path = path
+        self.options = options
+        self.dset: Optional[h5py.Dataset] = None
+        self._buffer: List[np.ndarray] = []
+        self._buffered = 0
+        self._rows_per_write = 1
+        if path in h5f:
+            self._open(h5f[path])
+
+    def __len__(self) -> int:
+        """Length of the dataset, including what's buffered"""
+        written = 0 if self.dset is None else self.dset.shape[0]
+        return written + self._buffered
+
+    @property
+    def ready(self) -> bool:
+        """Whether enough is buffered to write whole chunks"""
+        return self._buffered >= self._rows_per_write
+
+    def append(self, values: Any):
+        """Buffer values to append, with rows along the first dimension"""
+        values = np.asarray(values)
+        if values.dtype.kind in ('U', 'O'):
+            values = _string_array(values)
+        if values.ndim == 0:
+            raise ValueError(f"Can't append a scalar to {self.path}, values need a first dimension to append along")
+
+        if self.dset is None:
+            storage = _storage(self.options, (max(values.shape[0], 1),) + values.shape[1:], values.dtype, None)
+            storage['maxshape'] = (None,) + values.shape[1:]
+            self._open(self.h5f.create_dataset(
+                self.path, shape=(0,) + values.shape[1:], dtype=values.dtype, **storage
+            ))
+        elif values.shape[1:] != self.dset.shape[1:]:
+            raise ValueError(f"Can't append values with shape {values.shape} to {self.path} with shape {self.dset.shape}")
+
+        self._buffer.append(values)
+        self._buffered += values.shape[0]
+
+    def flush(self):
+        """Write everything that's buffered"""
+        if not self._buffer:
+            return
+        _append(self.dset, np.concatenate(self._buffer))
+        self._buffer, self._buffered = [], 0
+
+    def _open(self, dset: h5py.Dataset):
+        if len(dset.shape) == 0 or dset.maxshape[0] is not None:
+            raise ValueError(
+                f"{dset.name} isn't resizable, so it can't be appended to. "
+                "Write it with HDF5IO.write(..., resizable=True)")
+        self.dset = dset
+        row_bytes = max(int(np.prod(dset.shape[1:])) * dset.dtype.itemsize, 1)
+        self._rows_per_write = _block_rows(dset.chunks[0], row_bytes, self.options.block_size)
+
+
+class TableAppender:
+    """
+    Append rows to a DynamicTable, extending its ``id`` , every column, and the offsets
+    of its ``VectorIndex`` es together.
+
+    Rows are buffered and written together whenever enough are buffered to fill whole chunks of ``id`` ,
+    and when :meth:`.flush` is called. A table with no columns yet gets its columns, and
+    ``colnames`` , from its first append: columns whose values are sequences are ragged, and get a ``VectorIndex`` .
+
+    Use :meth:`.HDF5IO.appender` rather than making this directly, which flushes when it's done.
+    """
+
+    def __init__(self, h5f: h5py.File, path: str, options: Optional[WriteOptions] = None):
+        if options is None:
+            options = WriteOptions()
+        self.h5f = h5f
+        self.path = path
+        self.options = options
+        self.group: h5py.Group = h5f[path]
+
+        colnames = self.group.attrs.get('colnames', [])
+        self.colnames: List[str] = [c.decode('utf-8') if isinstance(c, bytes) else str(c) for c in colnames]
+        self.id = DatasetAppender(h5f, posixpath.join(path, 'id'), options)
+        self.columns: Dict[str, DatasetAppender] = {}
+        self.indexes: Dict[str, DatasetAppender] = {}
+        for name in self.colnames:
+            self._add_column(name, ragged=f'{name}_index' in self.group and f'{name}_index' not in self.colnames)
+        self._colnames_changed = False
+
+    def __len__(self) -> int:
+        """Number of rows, including those that are buffered"""
+        return len(self.id)
+
+    def append(self, rows: Dict[str, Any], ids: Optional[Any] = None):
+        """
+        Append rows to the table.
+
+        Args:
+            rows (dict): Values for each column, with one item per row. Every column must be given.
+                Values for ragged columns are a sequence per row.
+            ids: ``id`` s for the new rows. If ``None`` (default), continue counting up from the last row.
+        """
+        if not self.colnames and len(self) == 0:
+            for name, values in rows.items():
+                self._add_column(name, ragged=len(values) > 0 and _is_sequence(values[0]))
+                self.colnames.append(name)
+            self._colnames_changed = True
+
+        missing = [c for c in self.colnames if c not in rows]
+        extra = [c for c in rows if c not in self.colnames]
+        if missing or extra:
+            raise ValueError(f"Rows for {self.path} must have exactly its columns, missing: {missing}, unexpected: {extra}")
+        lengths = {len(values) for values in rows.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Every column needs the same number of rows, got lengths {lengths}")
+        n_rows = lengths.pop() if lengths else 0
+        if n_rows == 0:
+            return
+
+        if ids is None:
+            ids = np.arange(len(self), len(self) + n_rows)
+        elif len(ids) != n_rows:
+            raise ValueError(f"Got {len(ids)} ids for {n_rows} rows")
+
+        for name in self.colnames:
+            values = rows[name]
+            column = self.columns[name]
+            if name in self.indexes:
+                values = [np.asarray(v) for v in values]
+                offsets = len(column) + np.cumsum([len(v) for v in values])
+                self._append(column, np.concatenate(values), 'VectorData')
+                self._append(self.indexes[name], offsets, 'VectorIndex', target=column)
+            else:
+                self._append(column, values, 'VectorData')
+        self._append(self.id, ids, 'ElementIdentifiers')
+
+        if self.id.ready:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows, and ``colnames`` if it changed"""
+        for column in self.columns.values():
+            column.flush()
+        for index in self.indexes.values():
+            index.flush()
+        # ids last, so the table never seems to have rows that aren't written yet
+        self.id.flush()
+        if self._colnames_changed:
+            self.group.attrs['colnames'] = _string_array(self.colnames)
+            self._colnames_changed = False
+
+    def _add_column(self, name: str, ragged: bool):
+        self.columns[name] = DatasetAppender(self.h5f, posixpath.join(self.path, name), self.options)
+        if ragged:
+            self.indexes[name] = DatasetAppender(self.h5f, posixpath.join(self.path, f'{name}_index'), self.options)
+
+    def _append(self, appender: DatasetAppender, values: Any, neurodata_type: str, target: Optional[DatasetAppender] = None):
+        """Append, typing the dataset like :meth:`.ModelWriter._column_attrs` if it was just made"""
+        new = appender.dset is None
+        appender.append(values)
+        if not new:
+            return
+        appender.dset.attrs['neurodata_type'] = neurodata_type
+        appender.dset.attrs['namespace'] = 'hdmf-common'
+        if neurodata_type == 'VectorData':
+            appender.dset.attrs['description'] = ''
+        if target is not None:
+            appender.dset.attrs['target'] = target.dset.ref
+
+
+class SeriesAppender:
+    """
+    Append samples to a TimeSeries, extending ``data`` and ``timestamps`` together.
+
+    Series timed by a ``starting_time`` and ``rate`` only have their ``data`` extended.
+    Samples are buffered and written whenever enough are buffered to fill whole chunks of ``data`` ,
+    and when :meth:`.flush` is called.
+
+    Use :meth:`.HDF5IO.appender` rather than making this directly, which flushes when it's done.
+    """
+
+    def __init__(self, h5f: h5py.File, path: str, options: Optional[WriteOptions] = None):
+        if options is None:
+            options = WriteOptions()
+        self.h5f = h5f
+        self.path = path
+        self.group: h5py.Group = h5f[path]
+        self.data = DatasetAppender(h5f, posixpath.join(path, 'data'), options)
+        self.timestamps: Optional[DatasetAppender] = None
+        if 'starting_time' not in self.group:
+            self.timestamps = DatasetAppender(h5f, posixpath.join(path, 'timestamps'), options)
+
+    def __len__(self) -> int:
+        """Number of samples, including those that are buffered"""
+        return len(self.data)
+
+    def append(self, data: Any, timestamps: Optional[Any] = None):
+        """
+        Append samples to the series.
+
+        Args:
+            data: Samples along the first dimension. A scalar is a single sample.
+            timestamps: Timestamp of each sample, required unless the series has a ``starting_time``
+        """
+        data = np.asarray(data)
+        if data.ndim == 0:
+            data = data[np.newaxis]
+        if self.timestamps is None:
+            if timestamps is not None:
+                raise ValueError(f"{self.path} is timed by its starting_time and rate, so can't have timestamps")
+        else:
+            if timestamps is None:
+                raise ValueError(f"{self.path} has timestamps, so appended samples need timestamps too")
+            timestamps = np.atleast_1d(np.asarray(timestamps))
+            if timestamps.shape[0] != data.shape[0]:
+                raise ValueError(f"Got {timestamps.shape[0]} timestamps for {data.shape[0]} samples")
+            self.timestamps.append(timestamps)
+        self.data.append(data)
+
+        if self.data.ready:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered samples"""
+        self.data.flush()
+        if self.timestamps is not None:
+            self.timestamps.flush()
+
+def model_source(value: Any) -> Optional[Path | str]:
+    """
+    The hdf5 file a model was read from, found from the first array in it that is still in a file
+    (an :class:`.NDArrayProxy` , :class:`.NDArrayInfo` , or :class:`h5py.Dataset` ), or ``None`` if there aren't any.
+
+    Lazy models aren't resolved to look inside them.
+    """
+    if isinstance(value, (NDArrayProxy, NDArrayInfo)):
+        return value.h5f_file
+    elif isinstance(value, h5py.Dataset):
+        return value.file.filename
+    elif isinstance(value, BaseModel) and not isinstance(value, LazyModel):
+        values = (v for _, v in _fields(value))
+    elif isinstance(value, dict):
+        values = value.values()
+    elif isinstance(value, (list, tuple)) and len(value) > 0 and isinstance(value[0], BaseModel):
+        values = value
+    else:
+        return None
+    for v in values:
+        source = model_source(v)
+        if source is not None:
+            return source
+    return None
+
+
+def _ref_path(h5f: h5py.File, ref: h5py.Reference, names: Dict[int, HDF5_Path]) -> Optional[HDF5_Path]:
+    """
+    Path of the object a reference in another file points to, or ``None`` if it points to nothing,
+    with names cached by object address in ``names`` since the same objects are often referenced many times
+    """
+    if not ref:
+        return None
+    try:
+        oid = h5py.h5r.dereference(ref, h5f.id)
+    except (KeyError, ValueError):
+        return None
+    addr = h5py.h5o.get_info(oid).addr
+    if addr not in names:
+        names[addr] = HDF5_Path(h5py.h5i.get_name(oid).decode('utf-8'))
+    return names[addr]
+
+
+class _CompoundReferences(NamedTuple):
+    """A compound dataset from another file, whose reference columns are remade once their targets are written"""
+    data: np.ndarray
+    targets: Dict[str, List[Optional[HDF5_Path]]]
+
+
+def _fields(model: BaseModel) -> Iterator[Tuple[str, Any]]:
+    """Fields (and extra fields) of a model that should be written"""
+    for key in model.model_fields:
+        if key in ('name', 'hdf5_path'):
+            continue
+        yield key, model.__dict__.get(key, None)
+    if model.model_extra:
+        yield from model.model_extra.items()
+
+
+def _is_dataset_model(model: BaseModel) -> bool:
+    return 'array' in model.model_fields or 'value' in model.model_fields
+
+
+def _is_dynamic_table(cls: type) -> bool:
+    # compare names, like :class:`~nwb_linkml.maps.hdf5.ResolveDynamicTable` , since each schema version has its own class
+    return 'DynamicTable' in [parent.__name__ for parent in cls.__mro__]
+
+
+def _table_indexes(model: BaseModel) -> set[str]:
+    """
+    Names of the ``VectorIndex`` columns of a DynamicTable model: columns ending in ``_index``
+    that aren't themselves one of the ``colnames`` (like the ``local_index`` column of some ``Units`` tables)
+    """
+    colnames = model.__dict__.get('colnames', None)
+    colnames = set() if colnames is None else {c.decode('utf-8') if isinstance(c, bytes) else str(c) for c in colnames}
+    return {key for key, _ in _fields(model) if key.endswith('_index') and key not in colnames}
+
+
+def _has_value(value: Any) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, (list, tuple, dict)):
+        return len(value) > 0
+    return True
+
+
+def _is_sequence(value: Any) -> bool:
+    return isinstance(value, (list, tuple)) or (isinstance(value, np.ndarray) and value.ndim > 0)
+
+
+def _neurodata_type(cls: type) -> Optional[type]:
+    """The first class in the MRO that's a ``tree_root`` of its schema, ie. a ``neurodata_type``"""
+    for parent in cls.__mro__:
+        # the ClassVar is the Field that holds the LinkML_Meta
+        meta = getattr(parent.__dict__.get('linkml_meta', None), 'default', None)
+        if meta is not None and meta.tree_root:
+            return parent
+    return None
+
+
+def _namespace(cls: type) -> str:
+    """
+    Namespace of a generated model class, from its module,
+    eg. ``nwb_linkml.models.pydantic.hdmf_common.v1_1_3.hdmf_common_table`` is in ``hdmf-common``
+    """
+    parts = cls.__module__.split('.')
+    if len(parts) > 3 and parts[:3] == ['nwb_linkml', 'models', 'pydantic']:
+        return parts[3].replace('_', '-')
+    return parts[0].replace('_', '-')
+
+
+def _is_array(value: Any) -> bool:
+    if isinstance(value, (np.ndarray, NDArrayProxy, NDArrayInfo, DaskArray, h5py.Dataset)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(not isinstance(v, (BaseModel, dict)) for v in value)
+    if isinstance(value, (str, bytes, dict, BaseModel)):
+        return False
+    return hasattr(value, '__next__') or hasattr(value, '__iter__')
+
+
+def _identity(data: Any) -> Optional[tuple]:
+    """Key for arrays that may appear more than once, so they can be hardlinked"""
+    if isinstance(data, (NDArrayProxy, NDArrayInfo)):
+        return ('hdf5', str(file_location(data.h5f_file, resolve=True)), data.path)
+    elif isinstance(data, h5py.Dataset):
+        return ('hdf5', str(file_location(data.file.filename, resolve=True)), data.name)
+    elif isinstance(data, (np.ndarray, DaskArray)):
+        return ('array', id(data))
+    return None
+
+
+def _source(data: NDArrayProxy | NDArrayInfo | h5py.Dataset | DaskArray) -> h5py.Dataset | DaskArray:
+    if isinstance(data, NDArrayInfo):
+        data = data.proxy()
+    if isinstance(data, NDArrayProxy):
+        return get_pool().get(data.h5f_file)[data.path]
+    return data
+
+
+def _string_array(value: Any) -> np.ndarray:
+    arr = np.asarray(value)
+    if arr.dtype.kind == 'S':
+        return arr
+    return np.array([v.decode('utf-8') if isinstance(v, bytes) else str(v) for v in arr.flat],
+                    dtype=h5py.string_dtype()).reshape(arr.shape)
+
+
+def _attr_value(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        if len(value) > 0 and all(isinstance(v, (datetime.datetime, datetime.date)) for v in value):
+            return _string_array([v.isoformat() for v in value])
+        arr = np.asarray(value)
+        if arr.dtype.kind in ('U', 'O'):
+            return _string_array(arr)
+        return arr
+    if isinstance(value, np.ndarray) and value.dtype.kind in ('U', 'O'):
+        return _string_array(value)
+    return value
+
+
+def _block_rows(chunk_rows: int, row_bytes: int, block_size: int) -> int:
+    """Number of rows to write at once: the most whole chunks that fit in ``block_size`` , and at least one"""
+    n_chunks = max(block_size // max(chunk_rows * row_bytes, 1), 1)
+    return n_chunks * chunk_rows
+
+
+def _blocks(shape: Tuple[int, ...], dtype: np.dtype, chunks: Optional[Tuple[int, ...]], block_size: int) -> Iterator[slice]:
+    """Slices along the first dimension, aligned to chunks"""
+    chunk_rows = chunks[0] if chunks else 1
+    row_bytes = int(np.prod(shape[1:])) * dtype.itemsize
+    rows = _block_rows(chunk_rows, row_bytes, block_size)
+    for start in range(0, shape[0], rows):
+        yield slice(start, min(start + rows, shape[0]))
+
+
+def _append(dset: h5py.Dataset, block: np.ndarray):
+    start = dset.shape[0]
+    dset.resize(start + block.shape[0], axis=0)
+    dset[start:] = block
+
+
+def _storage(
+        options: WriteOptions,
+        shape: Tuple[int, ...],
+        dtype: np.dtype,
+        chunks: Optional[Tuple[int, ...]],
+        always_chunk: bool = True
+    ) -> dict:
+    """Keyword arguments for :meth:`h5py.Group.create_dataset` that set the chunks and filters"""
+    chunks = _chunks(options, chunks)
+    resizable = options.resizable and len(shape) > 0
+    if chunks is None and not always_chunk and not resizable:
+        return {}
+    if chunks is None:
+        chunks = True
+    kwargs = {'chunks': chunks}
+    if resizable:
+        kwargs['maxshape'] = (None,) + tuple(shape[1:])
+    if options.compression is not None:
+        kwargs['compression'] = options.compression
+        kwargs['compression_opts'] = options.compression_opts
+    if options.shuffle:
+        kwargs['shuffle'] = True
+    return kwargs
+
+
+def _chunks(options: WriteOptions, source_chunks: Optional[Tuple[int, ...]]) -> Optional[Tuple[int, ...]] | bool:
+    """Chunks to use for a dataset: a chunk shape, ``True`` to let h5py guess, or ``None`` to not chunk"""
+    if isinstance(options.chunks, tuple):
+        return options.chunks
+    elif options.chunks:
+        return source_chunks if source_chunks is not None else True
+    else:
+        return None
@@ -6,21 +6,36 @@ so we will make our own mapping class here and re-evaluate whether they should b
 """
 import datetime
 import pdb
+import pickle
+import sys
+import threading
+import warnings
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from itertools import repeat
+from collections import deque
 from abc import abstractmethod
 from pathlib import Path
-from typing import Literal, List, Dict, Optional, Type, Union, Tuple
+from functools import partial
+from typing import Literal, List, Dict, Optional, Type, Union, Tuple, Iterable, Iterator, Set, Any, Callable
 import inspect
+import typing
+import posixpath
+from fnmatch import fnmatchcase
 
 import h5py
+import numpy as np
 from enum import StrEnum
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, field_validator
 
+from nwb_linkml.config import Config
 from nwb_linkml.providers.schema import SchemaProvider
 from nwb_linkml.maps import Map
 from nwb_linkml.maps.hdmf import dynamictable_to_model
-from nwb_linkml.types.hdf5 import HDF5_Path
-from nwb_linkml.types.ndarray import NDArrayProxy
+from nwb_linkml.types.hdf5 import HDF5_Path, H5FilePool, get_pool, LazyModel, lazy_model
+from nwb_linkml.types.ndarray import NDArrayProxy, NDArrayInfo, ArrayModes, lazy_array
+from nwb_linkml.types.zarr import ZarrDataset, ZarrGroup, ZarrNode
 from nwb_linkml.annotations import unwrap_optional
 
 
@@ -32,87 +47,218 @@ class ReadPhases(StrEnum):
     construct = 'construct'
     """After reading, casting the results of the read into their models"""
 
-class H5SourceItem(BaseModel):
-    """
-    Descriptor of items for each element when :func:`.flatten_hdf` flattens an hdf5 file.
 
-    Consumed by :class:`.HDF5Map` classes, orchestrated by :class:`.ReadQueue`
-    """
-    path: str
-    """Absolute hdf5 path of element"""
-    h5f_path: str
-    """Path to the source hdf5 file"""
-    leaf: bool
-    """If ``True``, this item has no children (and thus we should start instantiating it before ascending to parent classes)"""
-    h5_type: Literal['group', 'dataset']
-    """What kind of hdf5 element this is"""
-    depends: List[str] = Field(default_factory=list)
-    """Paths of other source items that this item depends on before it can be instantiated. eg. from softlinks"""
-    attrs: dict = Field(default_factory=dict)
-    """Any static attrs that can be had from the element"""
-    namespace: Optional[str] = None
-    """Optional: The namespace that the neurodata type belongs to"""
-    neurodata_type: Optional[str] = None
-    """Optional: the neurodata type for this dataset or group"""
+ValidateModes = Literal['eager', 'deferred', 'off']
+"""How models are validated when they are read, see :attr:`.ReadOptions.validation`"""
 
-    model_config = ConfigDict(arbitrary_types_allowed=True)
-    @property
-    def parts(self) -> List[str]:
-        """path split by /"""
-        return self.path.split('/')
 
-class H5ReadResult(BaseModel):
-    """
-    Result returned by each of our mapping operations.
-
-    Also used as the source for operations in the ``construct`` :class:`.ReadPhases`
-    """
-    path: str
-    """absolute hdf5 path of element"""
-    source: Union[H5SourceItem, 'H5ReadResult']
-    """
-    Source that this result is based on. 
-    The map can modify this item, so the container should update the source
-    queue on each pass
-    """
-    completed: bool = False
-    """
-    Was this item completed by this map step? False for cases where eg. 
-    we still have dependencies that need to be completed before this one
+class ReadOptions(BaseModel):
     """
-    result: Optional[dict | str | int | float | BaseModel] = None
+    Options for a read that change what the maps do, given to every map by the :class:`.ReadQueue`
     """
-    If completed, built result. A dict that can be instantiated into the model.
-    If completed is True and result is None, then remove this object
+    arrays: ArrayModes = 'proxy'
     """
-    model: Optional[Type[BaseModel]] = None
-    """
-    The model that this item should be cast into
+    How to read arrays:
+
+    * ``'skip'`` - don't read array data at all, just describe each array's shape, dtype, and storage with
+      an :class:`~nwb_linkml.types.ndarray.NDArrayInfo` (eg. for indexing the metadata of many files)
+    * ``'proxy'`` - lazily load arrays when they are accessed with an :class:`~nwb_linkml.types.ndarray.NDArrayProxy`
+      (DynamicTable columns are chunk-aligned dask arrays)
+    * ``'dask'`` - lazily load all arrays as chunk-aligned dask arrays that can be computed
+      with any of dask's schedulers
+    * ``'load'`` - load arrays into memory as numpy arrays
+
+    Arrays are made by :func:`~nwb_linkml.types.ndarray.lazy_array`
     """
-    completes: List[HDF5_Path] = Field(default_factory=list)
+    array_block_size: Optional[int] = None
     """
-    If this result completes any other fields, we remove them from the build queue.
+    Approximate number of bytes in each block of the dask arrays that are made (see
+    :meth:`~nwb_linkml.types.ndarray.NDArrayProxy.to_dask` ). If ``None`` , the :class:`.ReadQueue`
+    uses :attr:`.Config.array_block_size` , read once for the whole read rather than once per array.
     """
-    namespace: Optional[str] = None
+    lazy: bool = False
     """
-    Optional: the namespace of the neurodata type for this object
+    If ``True`` , groups with a ``neurodata_type`` below the group being read are not read,
+    but are left as :class:`~nwb_linkml.types.hdf5.LazyModel` placeholders that read them
+    (lazily, in turn) when first used. See :attr:`.H5SourceItem.lazy`
     """
-    neurodata_type: Optional[str] = None
+    validation: ValidateModes = 'eager'
     """
-    Optional: The neurodata type to use for this object
+    How to validate the models for groups as they're constructed:
+
+    * ``'eager'`` - validate each model as it's made
+    * ``'deferred'`` - make models from the values in the file without validating them (see :func:`.construct_model` ),
+      so they can be validated later, or in the background, with :func:`.validate_model`
+    * ``'off'`` - make models without validating them, trusting the file to follow its schema.
+      :func:`.validate_model` leaves them as they are.
     """
-    applied: List[str] = Field(default_factory=list)
+
+
+_REQUIRED = object()
+
+class SlotRecord:
     """
-    Which map operations were applied to this item
+    Base class for the compact records that a read keeps for every object in a file
+    (:class:`.H5SourceItem` and :class:`.H5ReadResult` ).
+
+    A read makes one or more records per object, so they use ``__slots__`` rather than being pydantic models,
+    whose per-instance bookkeeping is larger than most of the records themselves. Fields are declared in
+    ``_fields`` (and ``__slots__`` ) with their defaults, and aren't validated. Fields whose default is
+    ``dict`` get a new empty dict, and list fields default to an empty tuple that is shared between records,
+    so they should be replaced rather than modified in place.
+
+    Records have the parts of the pydantic model interface that are used on them:
+    :meth:`.model_construct` , :meth:`.model_copy` , and :meth:`.model_dump` .
     """
-    errors: List[str] = Field(default_factory=list)
+    __slots__ = ()
+    _fields: Dict[str, Any] = {}
+
+    def __init__(self, **kwargs):
+        for name, default in self._fields.items():
+            if name in kwargs:
+                value = kwargs.pop(name)
+            elif default is _REQUIRED:
+                raise TypeError(f'{type(self).__name__} missing required field {name}')
+            else:
+                value = dict() if default is dict else default
+            setattr(self, name, value)
+        if kwargs:
+            raise TypeError(f'{type(self).__name__} got unexpected fields {list(kwargs.keys())}')
+
+    @classmethod
+    def model_construct(cls, **kwargs) -> 'SlotRecord':
+        """Make a record, setting required fields that aren't given to ``None``"""
+        for name, default in cls._fields.items():
+            if default is _REQUIRED and name not in kwargs:
+                kwargs[name] = None
+        return cls(**kwargs)
+
+    def model_copy(self, update: Optional[Dict[str, Any]] = None) -> 'SlotRecord':
+        """Shallow copy of the record, with any fields in ``update`` replaced"""
+        fields = self.model_dump()
+        if update:
+            fields.update(update)
+        return type(self)(**fields)
+
+    def model_dump(self, exclude: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """The record's fields as a (shallow) dict"""
+        return {name: getattr(self, name) for name in self._fields if not exclude or name not in exclude}
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.model_dump() == other.model_dump()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{type(self).__name__}({fields})'
+
+
+class H5SourceItem(SlotRecord):
     """
-    Problems that occurred during resolution
+    Descriptor of items for each element when :func:`.flatten_hdf` flattens an hdf5 file.
+
+    Consumed by :class:`.HDF5Map` classes, orchestrated by :class:`.ReadQueue`
+
+    Fields:
+
+    * ``path`` (str) - Absolute hdf5 path of element
+    * ``h5f_path`` (str) - Path to the source hdf5 file
+    * ``leaf`` (bool) - If ``True``, this item has no children (and thus we should start instantiating it before ascending to parent classes)
+    * ``h5_type`` (``'group'`` | ``'dataset'`` ) - What kind of hdf5 element this is
+    * ``depends`` (list of str) - Paths of other source items that this item depends on before it can be instantiated. eg. from softlinks
+    * ``attrs`` (dict) - Any static attrs that can be had from the element. Object references are replaced with the :class:`.HDF5_Path` they refer to
+    * ``namespace`` (str) - Optional: The namespace that the neurodata type belongs to
+    * ``neurodata_type`` (str) - Optional: the neurodata type for this dataset or group
+    * ``lazy`` (bool) - If ``True`` , this group's children were not flattened, and it should be read later, see :attr:`.ReadOptions.lazy`
+    * ``partial`` (bool) - If ``True`` , only some of this group's children were selected to be read (see :func:`.flatten_hdf` ),
+      so references to its other children are dropped and its model may be incomplete
+    * ``addr`` (int) - Address of the object in the file, shared by all the paths that are hard links to it
+    * ``n_hardlinks`` (int) - Number of hard links to this object, if more than one then it is also found at other paths
+    * ``shape`` (tuple) - For datasets: shape of the dataset
+    * ``dtype`` (:class:`numpy.dtype` ) - For datasets: dtype of the dataset
+    * ``chunks`` (tuple) - For datasets: chunk shape, if the dataset is chunked
+    * ``compression`` (str) - For datasets: name of the compression filter, if any
+    * ``compression_opts`` - For datasets: options for the compression filter, if any
+    * ``children`` (list of str) - For groups: names of all links in the group, including soft links
+    * ``links`` (dict) - For groups: soft links in the group, mapping their names to the :class:`.HDF5_Path` s they point to
+    * ``aliases`` (dict) - For groups: children that are hard links to an object that was flattened at another path,
+      mapping their names to the object's canonical path (see :class:`.HardlinkMap` ). ``None`` if there are none
+    * ``empty`` (bool) - For groups: whether the group is empty, see :func:`.check_empty` . :func:`.flatten_hdf`
+      works this out from the flattened children, without reading them again
+    * ``empty_children`` (list of str) - For groups: names of the children that are empty, and so are pruned rather than read
     """
-    depends: List[HDF5_Path] = Field(default_factory=list)
+    _fields = {
+        'path': _REQUIRED,
+        'h5f_path': _REQUIRED,
+        'leaf': _REQUIRED,
+        'h5_type': _REQUIRED,
+        'depends': (),
+        'attrs': dict,
+        'namespace': None,
+        'neurodata_type': None,
+        'lazy': False,
+        'partial': False,
+        'addr': None,
+        'n_hardlinks': 1,
+        'shape': None,
+        'dtype': None,
+        'chunks': None,
+        'compression': None,
+        'compression_opts': None,
+        'children': (),
+        'links': dict,
+        'aliases': None,
+        'empty': False,
+        'empty_children': (),
+    }
+    __slots__ = tuple(_fields.keys())
+
+    @property
+    def parts(self) -> List[str]:
+        """path split by /"""
+        return self.path.split('/')
+
+
+class H5ReadResult(SlotRecord):
     """
-    Other items that the final resolution of this item depends on
+    Result returned by each of our mapping operations.
+
+    Also used as the source for operations in the ``construct`` :class:`.ReadPhases`
+
+    Fields:
+
+    * ``path`` (str) - absolute hdf5 path of element
+    * ``source`` (:class:`.H5SourceItem` | :class:`.H5ReadResult` ) - Source that this result is based on.
+      The map can modify this item, so the container should update the source queue on each pass
+    * ``completed`` (bool) - Was this item completed by this map step? False for cases where eg.
+      we still have dependencies that need to be completed before this one
+    * ``result`` (dict | str | int | float | :class:`pydantic.BaseModel` ) - If completed, built result.
+      A dict that can be instantiated into the model. If completed is True and result is None, then remove this object
+    * ``model`` (type) - The model that this item should be cast into
+    * ``completes`` (list of :class:`.HDF5_Path` ) - If this result completes any other fields, we remove them from the build queue.
+    * ``namespace`` (str) - Optional: the namespace of the neurodata type for this object
+    * ``neurodata_type`` (str) - Optional: The neurodata type to use for this object
+    * ``applied`` (list of str) - Which map operations were applied to this item
+    * ``errors`` (list of str) - Problems that occurred during resolution
+    * ``depends`` (list of :class:`.HDF5_Path` ) - Other items that the final resolution of this item depends on
     """
+    _fields = {
+        'path': _REQUIRED,
+        'source': _REQUIRED,
+        'completed': False,
+        'result': None,
+        'model': None,
+        'completes': (),
+        'namespace': None,
+        'neurodata_type': None,
+        'applied': (),
+        'errors': (),
+        'depends': (),
+    }
+    __slots__ = tuple(_fields.keys())
 
 
 FlatH5 = Dict[str, H5SourceItem]
@@ -125,15 +271,44 @@ class HDF5Map(Map):
     Within a phase, sort mapping operations from low to high priority
     (maybe this should be renamed because highest priority last doesnt make a lot of sense)
     """
+    h5_types: Optional[Tuple[str, ...]] = None
+    """
+    The ``h5_type`` s of the items this map can apply to, or ``None`` for any.
+    Used by :class:`.MapDispatch` to skip maps that can't apply without calling :meth:`.check`
+    """
+    has_neurodata_type: Optional[bool] = None
+    """Whether the items this map can apply to have a ``neurodata_type`` ( ``None`` for either)"""
+    neurodata_types: Optional[Tuple[str, ...]] = None
+    """The ``neurodata_type`` s that the items this map can apply to are or inherit from, or ``None`` for any"""
+
+    @classmethod
+    def dispatches(cls, h5_type: Optional[str], neurodata_type: Optional[str], ancestry: Tuple[str, ...] = ()) -> bool:
+        """
+        Whether this map could apply to an item, from its :attr:`.h5_types` , :attr:`.has_neurodata_type` ,
+        and :attr:`.neurodata_types` . Maps still need to :meth:`.check` the item.
+
+        Args:
+            h5_type (str): ``h5_type`` of the item's source
+            neurodata_type (str): ``neurodata_type`` of the item, if it has one
+            ancestry (tuple): Names of the item's model and the classes it inherits from,
+                see :func:`.neurodata_ancestry`
+        """
+        if cls.h5_types is not None and h5_type not in cls.h5_types:
+            return False
+        if cls.has_neurodata_type is not None and cls.has_neurodata_type != (neurodata_type is not None):
+            return False
+        if cls.neurodata_types is not None and not any(t in ancestry for t in cls.neurodata_types):
+            return False
+        return True
 
     @classmethod
     @abstractmethod
-    def check(cls, src: H5SourceItem|H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
+    def check(cls, src: H5SourceItem|H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
         """Check if this map applies to the given item to read"""
 
     @classmethod
     @abstractmethod
-    def apply(cls, src: H5SourceItem|H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5SourceItem|H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         """Actually apply the map!"""
 
 
@@ -148,7 +323,7 @@ def check_empty(obj: h5py.Group) -> bool:
     Returns:
         bool
     """
-    if isinstance(obj, h5py.Dataset):
+    if isinstance(obj, (h5py.Dataset, ZarrDataset)):
         return False
 
     # check if we are empty
@@ -163,7 +338,7 @@ def check_empty(obj: h5py.Group) -> bool:
     # check if immediate children are empty
     # handles empty groups of empty groups
     children_empty = False
-    if all([isinstance(item, h5py.Group) and \
+    if all([isinstance(item, (h5py.Group, ZarrGroup)) and \
             len(item.keys()) == 0 and \
             len(item.attrs) == 0 \
             for item in obj.values()]):
@@ -178,15 +353,13 @@ def check_empty(obj: h5py.Group) -> bool:
 class PruneEmpty(HDF5Map):
     """Remove groups with no attrs """
     phase = ReadPhases.plan
+    h5_types = ('group',)
     @classmethod
-    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
-        if src.h5_type == 'group':
-            with h5py.File(src.h5f_path, 'r') as h5f:
-                obj = h5f.get(src.path)
-                return check_empty(obj)
+    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
+        return src.h5_type == 'group' and src.empty
 
     @classmethod
-    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         return H5ReadResult.model_construct(
             path = src.path,
             source=src,
@@ -194,6 +367,37 @@ class PruneEmpty(HDF5Map):
         )
 
 
+class ResolveLazyGroup(HDF5Map):
+    """
+    Groups that were left :attr:`~.H5SourceItem.lazy` by :func:`.flatten_hdf` are
+    returned as a :class:`~nwb_linkml.types.hdf5.LazyModel` placeholder for their model,
+    which reads the group with :func:`.read_group` when it is first used.
+    """
+    phase = ReadPhases.read
+    priority = 0
+    h5_types = ('group',)
+
+    @classmethod
+    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
+        return src.h5_type == 'group' and getattr(src, 'lazy', False)
+
+    @classmethod
+    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
+        model = provider.get_class(src.namespace, src.neurodata_type)
+        loader = partial(read_group, src.h5f_path, src.path, provider, options)
+        placeholder = lazy_model(model).lazy_construct(loader, name=src.parts[-1], hdf5_path=src.path)
+        return H5ReadResult(
+            path=src.path,
+            source=src,
+            completed=True,
+            result=placeholder,
+            model=model,
+            namespace=src.namespace,
+            neurodata_type=src.neurodata_type,
+            applied=['ResolveLazyGroup']
+        )
+
+
 class ResolveDynamicTable(HDF5Map):
     """
     Handle loading a dynamic table!
@@ -201,25 +405,28 @@ class ResolveDynamicTable(HDF5Map):
     Dynamic tables are sort of odd in that their models don't include their fields (except as a list of
     strings in ``colnames`` ), so we need to create a new model that includes fields for each column,
     and then we include the datasets as :class:`~.nwb_linkml.types.ndarray.NDArrayProxy` objects which
-    lazy load the arrays in a thread/process safe way.
+    lazy load the arrays in a thread/process safe way (or as described by :attr:`.ReadOptions.arrays` ).
 
     This map also resolves the child elements, indicating so by the ``completes`` field in the :class:`.ReadResult`
     """
     phase = ReadPhases.read
     priority = 1
+    h5_types = ('group',)
+    has_neurodata_type = True
+    neurodata_types = ('DynamicTable',)
+
     @classmethod
-    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
+    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
         if src.h5_type == 'dataset':
             return False
         if 'neurodata_type' in src.attrs:
             if src.attrs['neurodata_type'] == 'DynamicTable':
                 return True
             # otherwise, see if it's a subclass
-            model = provider.get_class(src.attrs['namespace'], src.attrs['neurodata_type'])
             # just inspect the MRO as strings rather than trying to check subclasses because
             # we might replace DynamicTable in the future, and there isn't a stable DynamicTable
             # class to inherit from anyway because of the whole multiple versions thing
-            parents = [parent.__name__ for parent in model.__mro__]
+            parents = neurodata_ancestry(provider, src.attrs['namespace'], src.attrs['neurodata_type'])
             if 'DynamicTable' in parents:
                 return True
             else:
@@ -228,15 +435,21 @@ class ResolveDynamicTable(HDF5Map):
             return False
 
     @classmethod
-    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
-        with h5py.File(src.h5f_path, 'r') as h5f:
-            obj = h5f.get(src.path)
-
-            # make a populated model :)
-            base_model = provider.get_class(src.namespace, src.neurodata_type)
-            model = dynamictable_to_model(obj, base=base_model)
+    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
+        h5f = get_pool().get(src.h5f_path)
+        obj = h5f.get(src.path)
+
+        # make a populated model :)
+        base_model = provider.get_class(src.namespace, src.neurodata_type)
+        model = dynamictable_to_model(
+            obj,
+            base=base_model,
+            arrays=options.arrays,
+            block_size=options.array_block_size,
+            attrs=src.attrs
+        )
 
-            completes = [HDF5_Path(child.name) for child in obj.values()]
+        completes = [_child_path(src, name) for name in src.children]
 
         return H5ReadResult(
             path=src.path,
@@ -290,35 +503,39 @@ class ResolveModelGroup(HDF5Map):
     """
     phase = ReadPhases.read
     priority = 10 # do this generally last
+    h5_types = ('group',)
+    has_neurodata_type = True
 
     @classmethod
-    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
+    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
         if 'neurodata_type' in src.attrs and src.h5_type == 'group':
             return True
         else:
             return False
 
     @classmethod
-    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         model = provider.get_class(src.namespace, src.neurodata_type)
         res = {}
         depends = []
-        with h5py.File(src.h5f_path, 'r') as h5f:
-            obj = h5f.get(src.path)
-            for key, type in model.model_fields.items():
-                if key == 'children':
-                    res[key] = {name: resolve_hardlink(child) for name, child in obj.items()}
-                    depends.extend([resolve_hardlink(child)for child in obj.values()])
-                elif key in obj.attrs:
-                    res[key] = obj.attrs[key]
+        for key, type in model.model_fields.items():
+            if key == 'children':
+                res[key] = {
+                    name: _child_path(src, name) for name in src.children if name not in src.empty_children
+                }
+                depends.extend(res[key].values())
+            elif key in src.attrs:
+                # references in attrs were already replaced with the paths they refer to
+                res[key] = src.attrs[key]
+                if isinstance(res[key], HDF5_Path):
+                    depends.append(res[key])
+            elif key in src.children:
+                # empty children are pruned, so leave the field to its default
+                if key in src.empty_children:
                     continue
-                elif key in obj.keys():
-                    # make sure it's not empty
-                    if check_empty(obj[key]):
-                        continue
-                    # stash a reference to this, we'll compile it at the end
-                    depends.append(resolve_hardlink(obj[key]))
-                    res[key] = resolve_hardlink(obj[key])
+                # stash a reference to this, we'll compile it at the end
+                res[key] = _child_path(src, key)
+                depends.append(res[key])
 
 
         res['hdf5_path'] = src.path
@@ -341,28 +558,38 @@ class ResolveDatasetAsDict(HDF5Map):
     that will be packaged into a model in the next step. Grabs the array in an :class:`~nwb_linkml.types.ndarray.NDArrayProxy`
     under an ``array`` key, and then grabs any additional ``attrs`` as well.
 
+    Depending on :attr:`.ReadOptions.arrays` , the ``array`` may instead be an
+    :class:`~nwb_linkml.types.ndarray.NDArrayInfo` that just describes the array,
+    or the array loaded into memory.
+
     Mutually exclusive with :class:`.ResolveScalars` - this only applies to datasets that are larger
     than a single entry.
     """
     phase = ReadPhases.read
     priority = 11
+    h5_types = ('dataset',)
+    has_neurodata_type = False
 
     @classmethod
-    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
-        if src.h5_type == 'dataset' and 'neurodata_type' not in src.attrs:
-            with h5py.File(src.h5f_path, 'r') as h5f:
-                obj = h5f.get(src.path)
-                if obj.shape != ():
-                    return True
-                else: return False
-        else:
-            return False
+    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
+        return src.h5_type == 'dataset' and 'neurodata_type' not in src.attrs and src.shape != ()
 
     @classmethod
-    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
+
+        info = NDArrayInfo(
+            h5f_file=src.h5f_path,
+            path=src.path,
+            shape=src.shape,
+            dtype=src.dtype,
+            chunks=src.chunks,
+            compression=src.compression,
+            compression_opts=src.compression_opts
+        )
+        array = lazy_array(info, options.arrays, options.array_block_size)
 
         res = {
-            'array': NDArrayProxy(h5f_file=src.h5f_path, path=src.path),
+            'array': array,
             'hdf5_path' : src.path,
             'name': src.parts[-1],
             **src.attrs
@@ -372,29 +599,29 @@ class ResolveDatasetAsDict(HDF5Map):
             source=src,
             completed=True,
             result=res,
-            applied=['ResolveDatasetAsDict']
+            applied=['ResolveDatasetAsDict'],
+            depends=[v for v in src.attrs.values() if isinstance(v, HDF5_Path)]
         )
 
 class ResolveScalars(HDF5Map):
     phase = ReadPhases.read
     priority = 11 #catchall
+    h5_types = ('dataset',)
+    has_neurodata_type = False
 
     @classmethod
-    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
-        if src.h5_type == 'dataset' and 'neurodata_type' not in src.attrs:
-            with h5py.File(src.h5f_path, 'r') as h5f:
-                obj = h5f.get(src.path)
-                if obj.shape == ():
-                    return True
-                else:
-                    return False
-        else:
-            return False
+    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
+        return src.h5_type == 'dataset' and 'neurodata_type' not in src.attrs and src.shape == ()
     @classmethod
-    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
-        with h5py.File(src.h5f_path, 'r') as h5f:
-            obj = h5f.get(src.path)
-            res = obj[()]
+    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
+        h5f = get_pool().get(src.h5f_path)
+        obj = h5f.get(src.path)
+        res = obj[()]
+        # scalars as python values, and strings as str rather than the bytes h5py gives
+        if isinstance(res, bytes):
+            res = res.decode('utf-8')
+        elif isinstance(res, np.generic):
+            res = res.item()
         return H5ReadResult(
             path=src.path,
             source = src,
@@ -411,29 +638,21 @@ class ResolveContainerGroups(HDF5Map):
     """
     phase = ReadPhases.read
     priority = 9
+    h5_types = ('group',)
+    has_neurodata_type = False
 
     @classmethod
-    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
-        if src.h5_type == 'group' and 'neurodata_type' not in src.attrs and len(src.attrs) == 0:
-            with h5py.File(src.h5f_path, 'r') as h5f:
-                obj = h5f.get(src.path)
-                if len(obj.keys()) > 0:
-                    return True
-                else:
-                    return False
-        else:
-            return False
+    def check(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
+        return src.h5_type == 'group' and \
+            'neurodata_type' not in src.attrs and \
+            len(src.attrs) == 0 and \
+            len(src.children) > 0
 
     @classmethod
-    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5SourceItem, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         """Simple, just return a dict with references to its children"""
-        depends = []
-        with h5py.File(src.h5f_path, 'r') as h5f:
-            obj = h5f.get(src.path)
-            children = {}
-            for k, v in obj.items():
-                children[k] = HDF5_Path(v.name)
-                depends.append(HDF5_Path(v.name))
+        children = {name: _child_path(src, name) for name in src.children if name not in src.empty_children}
+        depends = list(children.values())
 
         # res = {
         #     'name': src.parts[-1],
@@ -462,12 +681,13 @@ class CompletePassThrough(HDF5Map):
     - :class:`.ResolveDynamicTable`
     - :class:`.ResolveDatasetAsDict`
     - :class:`.ResolveScalars`
+    - :class:`.ResolveLazyGroup`
     """
     phase = ReadPhases.construct
     priority = 1
     @classmethod
-    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
-        passthrough_ops = ('ResolveDynamicTable', 'ResolveDatasetAsDict', 'ResolveScalars')
+    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
+        passthrough_ops = ('ResolveDynamicTable', 'ResolveDatasetAsDict', 'ResolveScalars', 'ResolveLazyGroup')
 
         for op in passthrough_ops:
             if hasattr(src, 'applied') and op in src.applied:
@@ -475,7 +695,7 @@ class CompletePassThrough(HDF5Map):
         return False
 
     @classmethod
-    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         return src
 
 class CompleteContainerGroups(HDF5Map):
@@ -487,9 +707,11 @@ class CompleteContainerGroups(HDF5Map):
     """
     phase = ReadPhases.construct
     priority = 3
+    h5_types = ('group',)
+    has_neurodata_type = False
 
     @classmethod
-    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
+    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
         if src.model is None and \
             src.neurodata_type is None and \
                 src.source.h5_type == 'group' and \
@@ -499,23 +721,19 @@ class CompleteContainerGroups(HDF5Map):
             return False
 
     @classmethod
-    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         res, errors, completes = resolve_references(src.result, completed)
 
-        return H5ReadResult(
-            result=res,
-            errors=errors,
-            completes=completes,
-            **src.model_dump(exclude={'result', 'errors', 'completes'})
-        )
+        return src.model_copy(update={'result': res, 'errors': errors, 'completes': completes})
 
 
 class CompleteModelGroups(HDF5Map):
     phase = ReadPhases.construct
     priority = 4
+    h5_types = ('group',)
 
     @classmethod
-    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
+    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
         if src.model is not None and \
                 src.source.h5_type == 'group' and \
                 src.neurodata_type != 'NWBFile' and \
@@ -525,7 +743,7 @@ class CompleteModelGroups(HDF5Map):
             return False
 
     @classmethod
-    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         # gather any results that were left for completion elsewhere
         # first get all already-completed items
         res = {k:v for k,v in src.result.items() if not isinstance(v, HDF5_Path)}
@@ -542,7 +760,7 @@ class CompleteModelGroups(HDF5Map):
 
 
 
-        instance = src.model(**res)
+        instance = _construct(src, res, errors, options)
         return H5ReadResult(
             path=src.path,
             source=src,
@@ -552,7 +770,7 @@ class CompleteModelGroups(HDF5Map):
             completes=completes,
             neurodata_type=src.neurodata_type,
             namespace=src.namespace,
-            applied=src.applied + ['CompleteModelGroups'],
+            applied=[*src.applied, 'CompleteModelGroups'],
             errors=errors
         )
 
@@ -567,9 +785,10 @@ class CompleteNWBFile(HDF5Map):
     """
     phase = ReadPhases.construct
     priority = 11
+    neurodata_types = ('NWBFile',)
 
     @classmethod
-    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> bool:
+    def check(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> bool:
         if src.neurodata_type == 'NWBFile' and \
                 all([depend in completed.keys() for depend in src.depends]):
             return True
@@ -577,32 +796,47 @@ class CompleteNWBFile(HDF5Map):
             return False
 
     @classmethod
-    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult]) -> H5ReadResult:
+    def apply(cls, src: H5ReadResult, provider:SchemaProvider, completed: Dict[str, H5ReadResult], options: ReadOptions) -> H5ReadResult:
         res = {k:v for k,v in src.result.items() if not isinstance(v, HDF5_Path)}
         unpacked_results, errors, completes = resolve_references(src.result, completed)
         res.update(unpacked_results)
 
         res['name'] = 'root'
-        res['file_create_date'] = [datetime.datetime.fromisoformat(ts.decode('utf-8')) for ts in  res['file_create_date']['array'][:]]
+        file_create_date = res['file_create_date']['array']
+        if isinstance(file_create_date, NDArrayInfo):
+            # we need the dates even if we skip the rest of the arrays
+            file_create_date = file_create_date.proxy()
+        res['file_create_date'] = [datetime.datetime.fromisoformat(ts.decode('utf-8')) for ts in file_create_date[:]]
         if 'stimulus' not in res.keys():
             res['stimulus'] = provider.get_class('core', 'NWBFileStimulus')()
         electrode_groups = []
-        egroup_keys = list(res['general'].get('extracellular_ephys', {}).keys())
+        # general might not have been selected in a partial read
+        extracellular_ephys = res.get('general', {}).get('extracellular_ephys', {})
+        egroup_keys = list(extracellular_ephys.keys())
         egroup_dict = {}
         for k in egroup_keys:
             if k != 'electrodes':
-                egroup = res['general']['extracellular_ephys'][k]
+                egroup = extracellular_ephys[k]
                 electrode_groups.append(egroup)
                 egroup_dict[egroup.hdf5_path] = egroup
-                del res['general']['extracellular_ephys'][k]
+                del extracellular_ephys[k]
         if len(electrode_groups) > 0:
-            res['general']['extracellular_ephys']['electrode_group'] = electrode_groups
-        trode_type = provider.get_class('core', 'NWBFileGeneralExtracellularEphysElectrodes')
-        #anmro = list(type(res['general']['extracellular_ephys']['electrodes']).__mro__)
-        #anmro.insert(1, trode_type)
-        trodes_original = res['general']['extracellular_ephys']['electrodes']
-        trodes = trode_type.model_construct(trodes_original.model_dump())
-        res['general']['extracellular_ephys']['electrodes'] = trodes
+            extracellular_ephys['electrode_group'] = electrode_groups
+        if 'electrodes' in extracellular_ephys:
+            trode_type = provider.get_class('core', 'NWBFileGeneralExtracellularEphysElectrodes')
+            #anmro = list(type(res['general']['extracellular_ephys']['electrodes']).__mro__)
+            #anmro.insert(1, trode_type)
+            trodes_original = extracellular_ephys['electrodes']
+            if isinstance(trodes_original, LazyModel):
+                # keep unread electrodes unread
+                trodes = lazy_model(trode_type).lazy_construct(
+                    partial(_as_electrodes, trodes_original, trode_type),
+                    name=trodes_original.name,
+                    hdf5_path=trodes_original.hdf5_path
+                )
+            else:
+                trodes = _as_electrodes(trodes_original, trode_type)
+            extracellular_ephys['electrodes'] = trodes
 
         #type(res['general']['extracellular_ephys']['electrodes']).__mro__ = tuple(anmro)
         # electrodes_dict = res['general']['extracellular_ephys']['electrodes'].model_dump()
@@ -610,7 +844,7 @@ class CompleteNWBFile(HDF5Map):
         #      electrodes_dict['group'] = [egroup_dict[h5f[e].name] for e in electrodes_dict['group'][:]]
         # res['general']['extracellular_ephys']['electrodes'] = electrodes_dict
 
-        instance = src.model(**res)
+        instance = _construct(src, res, errors, options)
         return H5ReadResult(
             path=src.path,
             source=src,
@@ -620,23 +854,34 @@ class CompleteNWBFile(HDF5Map):
             completes=completes,
             neurodata_type=src.neurodata_type,
             namespace=src.namespace,
-            applied=src.applied + ['CompleteModelGroups'],
+            applied=[*src.applied, 'CompleteModelGroups'],
             errors=errors
         )
 
 
 
 
+def _as_electrodes(table: BaseModel, trode_type: Type[BaseModel]) -> BaseModel:
+    """Cast the electrodes table read as a DynamicTable to the NWBFile's electrodes class"""
+    if isinstance(table, LazyModel):
+        table = table.resolve()
+    return trode_type.model_construct(table.model_dump())
+
+
 class ReadQueue(BaseModel):
     """Container model to store items as they are built """
-    h5f: Path = Field(
-        description=("Path to the source hdf5 file used when resolving the queue! "
-                     "Each translation step should handle opening and closing the file, "
-                     "rather than passing a handle around")
+    h5f: Path | str = Field(
+        description=("Path (or URL) to the source hdf5 file used when resolving the queue! "
+                     "Each translation step should borrow a handle from the :attr:`.pool` "
+                     "rather than opening and closing the file or passing a handle around")
     )
     provider: SchemaProvider = Field(
         description="SchemaProvider used by each of the items in the read queue"
     )
+    options: ReadOptions = Field(
+        default_factory=ReadOptions,
+        description="Options given to each of the maps"
+    )
     queue: Dict[str,H5SourceItem|H5ReadResult] = Field(
         default_factory=dict,
         description="Items left to be instantiated, keyed by hdf5 path",
@@ -650,115 +895,1044 @@ class ReadQueue(BaseModel):
         default_factory=list,
         description="Phases that have already been completed")
 
-    def apply_phase(self, phase:ReadPhases, max_passes=5):
-        phase_maps = [m for m in HDF5Map.__subclasses__() if m.phase == phase]
-        phase_maps = sorted(phase_maps, key=lambda x: x.priority)
-
-        results = []
-
-        # TODO: Thread/multiprocess this
-        for name, item in self.queue.items():
-            for op in phase_maps:
-                if op.check(item, self.provider, self.completed):
-                    # Formerly there was an "exclusive" property in the maps which let potentially multiple
-                    # operations be applied per stage, except if an operation was `exclusive` which would break
-                    # iteration over the operations. This was removed because it was badly implemented, but
-                    # if there is ever a need to do that, then we would need to decide what to do with the
-                    # multiple results.
-                    results.append(op.apply(item, self.provider, self.completed))
-                    break # out of inner iteration
-
-        # remake the source queue and save results
-        completes = []
-        for res in results:
-            # remove the original item
-            del self.queue[res.path]
-            if res.completed:
-                # if the item has been finished and there is some result, add it to the results
-                if res.result is not None:
-                    self.completed[res.path] = res
-                # otherwise if the item has been completed and there was no result,
-                # just drop it.
-
-                # if we have completed other things, delete them from the queue
-                completes.extend(res.completes)
-
-            else:
-                # if we didn't complete the item (eg. we found we needed more dependencies),
-                # add the updated source to the queue again
-                if phase != ReadPhases.construct:
-                    self.queue[res.path] = res.source
-                else:
-                    self.queue[res.path] = res
+    @field_validator('options')
+    @classmethod
+    def _read_block_size(cls, options: ReadOptions) -> ReadOptions:
+        """Read the configured block size once, rather than every time an array is made"""
+        if options.array_block_size is None:
+            options = options.model_copy(update={'array_block_size': Config().array_block_size})
+        return options
 
-        # delete the ones that were already completed but might have been
-        # incorrectly added back in the pile
-        for c in completes:
-            try:
-                del self.queue[c]
-            except KeyError:
-                pass
+    @property
+    def pool(self) -> H5FilePool:
+        """
+        Pool of read-only file handles that the maps borrow from for the duration of each phase.
+
+        This is the process-wide pool from :func:`.get_pool` , so that any :class:`.NDArrayProxy` s
+        created during the read (and worker processes, which get their own) reuse the same handles.
+        """
+        return get_pool()
+
+    def apply_phase(self, phase:ReadPhases, executor: Optional[Executor] = None):
+        """
+        Apply all the maps for a given phase to the items in the queue.
+
+        The ``plan`` and ``read`` phases make a single pass over the queue, since each
+        item is independent of the others. The ``construct`` phase visits each item
+        exactly once in dependency order using a :class:`.DependencyGraph` , so
+        an item is only constructed after everything it :attr:`~.H5ReadResult.depends` on.
+        Items that are part of a dependency cycle are left in the queue and reported with a warning.
+
+        Args:
+            phase (:class:`.ReadPhases`): Phase to apply
+            executor (:class:`concurrent.futures.Executor`): If ``None`` (default), apply maps serially.
+                Otherwise, submit them to the executor: ``plan`` and ``read`` phase items are
+                mapped over all at once, and ``construct`` phase items are submitted as soon as
+                their dependencies are finished. The ``construct`` phase shares the in-progress
+                :attr:`.completed` dict between items, so it can't use a :class:`~concurrent.futures.ProcessPoolExecutor` .
+        """
+        # open the file once for the whole phase, maps borrow the handle from the pool
+        _ = self.pool.get(self.h5f)
+
+        if phase == ReadPhases.construct:
+            if isinstance(executor, ProcessPoolExecutor):
+                raise ValueError('The construct phase can only be run serially or with threads')
+            self._apply_graph(executor)
+        else:
+            for res in self._apply_items(phase, executor):
+                self._store_result(res, phase)
 
-        # if we have nothing left in our queue, we have completed this phase
-        # and prepare only ever has one pass
+        # prepare only ever has one pass, and doesn't move items to the next phase
         if phase == ReadPhases.plan:
             self.phases_completed.append(phase)
             return
 
-        if len(self.queue) == 0:
-            self.phases_completed.append(phase)
+        if phase == ReadPhases.read:
+            self._trim_partial()
+
+        if phase != ReadPhases.construct:
+            if len(self.queue) > 0:
+                warnings.warn(f"No map could be applied in the {phase} phase for: {list(self.queue.keys())}")
+            # move our completed items to be the queue for the next phase
+            self.queue = self.completed
+            self.completed = {}
+        self.phases_completed.append(phase)
+
+    def iter_construct(self, executor: Optional[Executor] = None, release: bool = False) -> Iterator[H5ReadResult]:
+        """
+        Apply the ``construct`` phase, yielding each result whose result is a model as soon as it is constructed.
+
+        Models are yielded after the models they contain, so the last model yielded is the one for the
+        root of the queue (eg. the ``NWBFile`` ).
+
+        Args:
+            executor (:class:`concurrent.futures.Executor`): See :meth:`.apply_phase`
+            release (bool): If ``True`` , don't keep results after they're needed, so the memory used by the read
+                depends on the width of the tree rather than the size of the file:
+
+                * Once a model for a group has been yielded, the models that contain it get a
+                  :class:`~nwb_linkml.types.hdf5.LazyModel` placeholder for it instead,
+                  which reads the group again if it's used.
+                * Results are dropped from :attr:`.completed` once everything that depends on them is constructed,
+                  so only the results for the roots of the queue are left.
+        """
+        if isinstance(executor, ProcessPoolExecutor):
+            raise ValueError('The construct phase can only be run serially or with threads')
+        _ = self.pool.get(self.h5f)
+
+        graph = DependencyGraph(self.queue, completed=self.completed.keys())
+        n_dependents = {path: len(dependents) for path, dependents in graph.dependents.items()}
+        for res in self._iter_graph(graph, executor):
+            if isinstance(res.result, BaseModel):
+                yield res
+            if not release:
+                continue
+            # results that nothing depends on are the roots of the read, and are kept
+            if n_dependents.get(res.path, 0) > 0:
+                self._release_model(res)
+            for dep in graph.depends.get(res.path, ()):
+                n_dependents[dep] -= 1
+                if n_dependents[dep] == 0:
+                    self.completed.pop(dep, None)
+
+        self.phases_completed.append(ReadPhases.construct)
+
+    def read_depends(self):
+        """
+        After the ``read`` phase, read any items that the items in the queue depend on
+        but that weren't flattened into it, eg. because they are hardlinked from outside of the group
+        or selection being read. Repeats until all dependencies that can be found have been read.
+        """
+        h5f = self.pool.get(self.h5f)
+        tried = set()
+        while True:
+            missing = {
+                d for item in self.queue.values() for d in item.depends
+                if d not in self.queue and d not in tried
+            }
+            if not missing:
+                break
+            tried.update(missing)
+            extra = {}
+            for dep in missing:
+                obj = h5f.get(dep)
+                if obj is None:
+                    continue
+                if isinstance(obj, (h5py.Group, ZarrGroup)) and not (self.options.lazy and 'neurodata_type' in obj.attrs):
+                    extra.update(flatten_hdf(obj, lazy=self.options.lazy))
+                else:
+                    extra[dep] = source_item(obj, lazy=self.options.lazy)
+            extra_queue = ReadQueue(h5f=self.h5f, queue=extra, provider=self.provider, options=self.options)
+            extra_queue.apply_phase(ReadPhases.plan)
+            extra_queue.apply_phase(ReadPhases.read)
+            self.queue.update({k: v for k, v in extra_queue.queue.items() if k not in self.queue})
+
+    def _trim_partial(self):
+        """
+        Drop references from :attr:`~.H5SourceItem.partial` groups to children that weren't selected to be read
+        """
+        for res in self.completed.values():
+            if not getattr(res.source, 'partial', False):
+                continue
+            if isinstance(res.result, dict):
+                res.result = _drop_missing(res.result, self.completed)
+            res.depends = [d for d in res.depends if d in self.completed]
+
+    def _apply_items(self, phase: ReadPhases, executor: Optional[Executor] = None) -> List[H5ReadResult]:
+        """Apply maps to every item in the queue independently"""
+        items = list(self.queue.values())
+        if executor is None:
+            results = apply_maps(items, phase, self.provider, self.completed, self.options)
+        elif isinstance(executor, ProcessPoolExecutor):
+            # send items to workers in batches, and unpack the results
+            n_batches = max(1, min(len(items), getattr(executor, '_max_workers', 1) * 4))
+            batches = [items[i::n_batches] for i in range(n_batches)]
+            # executors from :func:`.process_executor` already have the provider
+            provider = None if _WORKER_EXECUTORS.get(executor) is self.provider else self.provider
+            results = []
+            for batch, batch_results in zip(
+                    batches,
+                    executor.map(_apply_batch, batches, repeat(phase), repeat(self.options), repeat(provider))
+            ):
+                for item, res in zip(batch, batch_results):
+                    if isinstance(res, bytes):
+                        res = pickle.loads(res)
+                    elif res is _UNPICKLABLE:
+                        # results that can't be sent between processes are redone here
+                        res = apply_maps([item], phase, self.provider, self.completed, self.options)[0]
+                    results.append(res)
+        else:
+            results = list(executor.map(
+                lambda item: apply_maps([item], phase, self.provider, self.completed, self.options)[0],
+                items
+            ))
+        return [r for r in results if r is not None]
+
+    def _release_model(self, res: H5ReadResult):
+        """
+        Replace the model for a group with a placeholder that reads it again when used, see :meth:`.iter_construct`
+        """
+        src = res.source
+        # results of the construct phase have the read phase result as their source
+        while isinstance(src, H5ReadResult):
+            src = src.source
+        if (
+            not isinstance(res.result, BaseModel)
+            or isinstance(res.result, LazyModel)
+            or not isinstance(src, H5SourceItem)
+            or src.h5_type != 'group'
+        ):
+            return
+        model = type(res.result)
+        loader = partial(read_group, src.h5f_path, src.path, self.provider, self.options)
+        fields = {'name': getattr(res.result, 'name', src.parts[-1]), 'hdf5_path': src.path}
+        fields = {k: v for k, v in fields.items() if k in model.model_fields}
+        res.result = lazy_model(model).lazy_construct(loader, **fields)
+
+    def _apply_graph(self, executor: Optional[Executor] = None):
+        """Apply maps to items in topological order of their dependencies"""
+        graph = DependencyGraph(self.queue, completed=self.completed.keys())
+        for _ in self._iter_graph(graph, executor):
+            pass
+
+    def _iter_graph(self, graph: 'DependencyGraph', executor: Optional[Executor] = None) -> Iterator[H5ReadResult]:
+        """
+        Apply construct maps to items in topological order of their dependencies,
+        yielding each completed result as it is stored
+        """
+
+        def _apply(path: str) -> Optional[H5ReadResult]:
+            # items can be removed from the queue by being completed by another item
+            item = self.queue.get(path, None)
+            if item is None:
+                return None
+            return apply_maps([item], ReadPhases.construct, self.provider, self.completed, self.options)[0]
+
+        if executor is None:
+            while graph.is_active():
+                for path in graph.get_ready():
+                    res = _apply(path)
+                    if res is not None:
+                        self._store_result(res, ReadPhases.construct)
+                        if res.path in self.completed:
+                            yield res
+                    graph.done(path)
+        else:
+            futures: Dict[Future, str] = {}
+            while graph.is_active():
+                for path in graph.get_ready():
+                    futures[executor.submit(_apply, path)] = path
+                finished, _ = wait(futures.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = futures.pop(future)
+                    res = future.result()
+                    # results are only stored from this thread, so maps only need to read ``completed``
+                    if res is not None:
+                        self._store_result(res, ReadPhases.construct)
+                        if res.path in self.completed:
+                            yield res
+                    graph.done(path)
+
+        if graph.blocked:
+            cycle = graph.find_cycle()
+            warnings.warn(
+                f"Dependency cycle found while constructing models: {' -> '.join(cycle)}. "
+                f"Items left unconstructed: {sorted(graph.blocked)}"
+            )
+
+    def _store_result(self, res: H5ReadResult, phase: ReadPhases):
+        """Remake the source queue and save the result"""
+        # remove the original item
+        del self.queue[res.path]
+        if res.completed:
+            # if the item has been finished and there is some result, add it to the results
+            if res.result is not None:
+                self.completed[res.path] = res
+            # otherwise if the item has been completed and there was no result,
+            # just drop it.
+
+            # if we have completed other things, delete them from the queue
+            for c in res.completes:
+                self.queue.pop(c, None)
+
+        else:
+            # if we didn't complete the item (eg. we found we needed more dependencies),
+            # add the updated source to the queue again
             if phase != ReadPhases.construct:
-                # if we're not in the last phase, move our completed to our queue
-                self.queue = self.completed
-                self.completed = {}
-        elif max_passes>0:
-            self.apply_phase(phase, max_passes=max_passes-1)
+                self.queue[res.path] = res.source
+            else:
+                self.queue[res.path] = res
+
+
+def read_group(
+        h5f_path: Path | str,
+        path: str,
+        provider: SchemaProvider,
+        options: Optional[ReadOptions] = None
+    ) -> BaseModel | dict:
+    """
+    Read a single group and its children serially, eg. to resolve a :class:`~nwb_linkml.types.hdf5.LazyModel`
+
+    Args:
+        h5f_path (:class:`pathlib.Path`): Path to the hdf5 file
+        path (str): Path of the group within the file
+        provider (:class:`.SchemaProvider`): Provider for the models
+        options (:class:`.ReadOptions`): Options for the read. If ``None`` , use the defaults
+
+    Returns:
+        The model (or dictionary of models) for the group
+    """
+    if options is None:
+        options = ReadOptions()
+    h5f = get_pool().get(h5f_path)
+    queue = ReadQueue(
+        h5f=h5f_path,
+        queue=flatten_hdf(h5f.get(path), lazy=options.lazy),
+        provider=provider,
+        options=options
+    )
+    queue.apply_phase(ReadPhases.plan)
+    queue.apply_phase(ReadPhases.read)
+
+    # hardlinks can point outside of the group, so read anything else the group depends on
+    queue.read_depends()
+
+    queue.apply_phase(ReadPhases.construct)
+    return queue.completed[path].result
+
+
+_UNPICKLABLE = False
+"""Marker returned by :func:`.apply_maps` in place of a result that can't be pickled"""
 
+_WORKER_PROVIDER: Optional[SchemaProvider] = None
+"""The provider a worker process was started with by :func:`.process_executor`"""
+_WORKER_EXECUTORS: 'weakref.WeakKeyDictionary[ProcessPoolExecutor, SchemaProvider]' = weakref.WeakKeyDictionary()
+"""Executors made by :func:`.process_executor` , and the provider their workers were started with"""
 
-def flatten_hdf(h5f:h5py.File | h5py.Group, skip='specifications') -> Dict[str, H5SourceItem]:
+def process_executor(provider: SchemaProvider, workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Make a :class:`~concurrent.futures.ProcessPoolExecutor` for the ``plan`` and ``read`` phases
+    whose workers are given the provider once when they start, rather than with every batch of items.
+
+    The provider's namespaces are imported first, so the models in results sent back from the
+    workers can be unpickled, and forked workers don't each need to import them again.
+
+    Args:
+        provider (:class:`.SchemaProvider`): Provider for the models
+        workers (int): Number of worker processes, or ``None`` for the number of CPUs
+    """
+    provider.import_namespaces()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(provider,))
+    _WORKER_EXECUTORS[executor] = provider
+    return executor
+
+
+def _init_worker(provider: SchemaProvider):
+    global _WORKER_PROVIDER
+    provider.import_namespaces()
+    _WORKER_PROVIDER = provider
+
+
+def _apply_batch(
+        items: List['H5SourceItem'],
+        phase: ReadPhases,
+        options: ReadOptions,
+        provider: Optional[SchemaProvider] = None
+    ) -> List[Optional[bytes]]:
+    """Apply maps to a batch of items in a worker process, see :meth:`.ReadQueue._apply_items`"""
+    if provider is None:
+        provider = _WORKER_PROVIDER
+    return apply_maps(items, phase, provider, {}, options, pickled=True)
+
+
+def apply_maps(
+        items: List[H5SourceItem|H5ReadResult],
+        phase: ReadPhases,
+        provider: SchemaProvider,
+        completed: Dict[str, H5ReadResult],
+        options: Optional[ReadOptions] = None,
+        pickled: bool = False
+    ) -> List[Optional[H5ReadResult|bytes]]:
+    """
+    Apply the first map for the given phase whose check passes to each item.
+
+    Module-level (rather than a method of :class:`.ReadQueue` ) so it can be sent to
+    worker processes.
+
+    Args:
+        items (list): Items to apply maps to
+        phase (:class:`.ReadPhases`): Phase whose maps to apply
+        provider (:class:`.SchemaProvider`): Provider for the models
+        completed (dict): Already completed items, see :attr:`.ReadQueue.completed`
+        options (:class:`.ReadOptions`): Options for the read. If ``None`` , use the defaults
+        pickled (bool): If ``True`` , return results pickled, or ``False`` if they can't be,
+            eg. when they contain open hdf5 objects. Used
+            by worker processes, where an unpicklable result would otherwise fail its whole batch.
+
+    Returns:
+        List of results, ``None`` for items that no map applies to.
+    """
+    if options is None:
+        options = ReadOptions()
+    dispatch = get_dispatch(phase, provider)
+
+    results = []
+    for item in items:
+        res = None
+        for op in dispatch.maps_for(item):
+            if op.check(item, provider, completed, options):
+                # Formerly there was an "exclusive" property in the maps which let potentially multiple
+                # operations be applied per stage, except if an operation was `exclusive` which would break
+                # iteration over the operations. This was removed because it was badly implemented, but
+                # if there is ever a need to do that, then we would need to decide what to do with the
+                # multiple results.
+                res = op.apply(item, provider, completed, options)
+                break # out of inner iteration
+
+        if pickled and res is not None:
+            try:
+                res = pickle.dumps(res)
+            except Exception:
+                res = _UNPICKLABLE
+        results.append(res)
+    return results
+
+
+class MapDispatch:
+    """
+    Dispatch table from the kinds of items in a phase to the maps that could apply to them, in priority order,
+    so each item only has its :meth:`.HDF5Map.check` called by the maps that could apply.
+
+    Items are keyed by their ``h5_type`` , ``namespace`` , and ``neurodata_type`` , and the maps for a key are
+    found with :meth:`.HDF5Map.dispatches` the first time an item with that key is seen.
+    The ancestry of each ``neurodata_type`` is looked up once from the provider (see :func:`.neurodata_ancestry` ).
+
+    In most cases you want the shared table for a phase and provider from :func:`.get_dispatch` .
+    """
+
+    def __init__(self, phase: ReadPhases, provider: SchemaProvider):
+        self.phase = phase
+        self.provider = provider
+        self.maps: List[Type[HDF5Map]] = sorted(
+            [m for m in HDF5Map.__subclasses__() if m.phase == phase],
+            key=lambda x: x.priority
+        )
+        self._table: Dict[Tuple[Optional[str], ...], List[Type[HDF5Map]]] = {}
+
+    def maps_for(self, item: H5SourceItem | H5ReadResult) -> List[Type[HDF5Map]]:
+        """The maps that could apply to an item, in the order they should be checked"""
+        key = dispatch_key(item)
+        maps = self._table.get(key, None)
+        if maps is None:
+            h5_type, namespace, neurodata_type = key
+            ancestry = ()
+            if neurodata_type is not None and any(m.neurodata_types is not None for m in self.maps):
+                ancestry = neurodata_ancestry(self.provider, namespace, neurodata_type)
+            maps = [m for m in self.maps if m.dispatches(h5_type, neurodata_type, ancestry)]
+            self._table[key] = maps
+        return maps
+
+
+def dispatch_key(item: H5SourceItem | H5ReadResult) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    The ``(h5_type, namespace, neurodata_type)`` of an item, used by :class:`.MapDispatch`
+    """
+    if isinstance(item, H5SourceItem):
+        return item.h5_type, item.attrs.get('namespace', None), item.attrs.get('neurodata_type', None)
+    source = item.source
+    while isinstance(source, H5ReadResult):
+        source = source.source
+    return getattr(source, 'h5_type', None), item.namespace, item.neurodata_type
+
+
+_DISPATCH: 'weakref.WeakKeyDictionary[SchemaProvider, Dict[ReadPhases, MapDispatch]]' = weakref.WeakKeyDictionary()
+_ANCESTRY: 'weakref.WeakKeyDictionary[SchemaProvider, Dict[Tuple[str, str], Tuple[str, ...]]]' = weakref.WeakKeyDictionary()
+_DISPATCH_LOCK = threading.Lock()
+
+def get_dispatch(phase: ReadPhases, provider: SchemaProvider) -> MapDispatch:
+    """
+    Get the :class:`.MapDispatch` for a phase, made once per phase and provider and shared between reads.
+    """
+    with _DISPATCH_LOCK:
+        tables = _DISPATCH.setdefault(provider, {})
+        if phase not in tables:
+            tables[phase] = MapDispatch(phase, provider)
+        return tables[phase]
+
+
+def neurodata_ancestry(provider: SchemaProvider, namespace: str, neurodata_type: str) -> Tuple[str, ...]:
+    """
+    Names of the model for a ``neurodata_type`` and all the classes it inherits from,
+    looked up once per provider.
+    """
+    with _DISPATCH_LOCK:
+        ancestry = _ANCESTRY.setdefault(provider, {})
+    key = (namespace, neurodata_type)
+    if key not in ancestry:
+        model = provider.get_class(namespace, neurodata_type)
+        ancestry[key] = tuple(parent.__name__ for parent in model.__mro__)
+    return ancestry[key]
+
+
+class DependencyGraph:
+    """
+    Directed acyclic graph of the items in a :class:`.ReadQueue` built from their
+    :attr:`.H5ReadResult.depends` , used to schedule the ``construct`` phase.
+
+    Works like :class:`graphlib.TopologicalSorter` : call :meth:`.get_ready` to get the items
+    whose dependencies have all been visited, and :meth:`.done` to mark them as visited, while :meth:`.is_active` .
+    Unlike it, cycles don't prevent the rest of the graph from being visited: items that are
+    part of (or depend on) a cycle are never made ready and remain in :attr:`.blocked`.
+
+    Dependencies that are already ``completed`` are satisfied, and dependencies that
+    are neither in the graph nor completed are ignored here and left for the maps to handle.
+    """
+
+    def __init__(self, items: Dict[str, H5SourceItem|H5ReadResult], completed: Iterable[str] = ()):
+        completed = set(completed)
+        self.depends: Dict[str, Set[str]] = {}
+        self.dependents: Dict[str, List[str]] = {path: [] for path in items}
+        for path, item in items.items():
+            depends = set(getattr(item, 'depends', []))
+            depends = {d for d in depends if d in items and d not in completed and d != path}
+            self.depends[path] = depends
+            for d in depends:
+                self.dependents[d].append(path)
+
+        self._n_waiting = {path: len(depends) for path, depends in self.depends.items()}
+        self._ready = deque([path for path, n in self._n_waiting.items() if n == 0])
+        self._n_passed_out = 0
+        self._n_done = 0
+        self.blocked: Set[str] = {path for path, n in self._n_waiting.items() if n > 0}
+        """Items that are still waiting on their dependencies"""
+
+    def get_ready(self) -> List[str]:
+        """Get all items whose dependencies have been visited"""
+        ready = list(self._ready)
+        self._ready.clear()
+        self._n_passed_out += len(ready)
+        return ready
+
+    def done(self, path: str):
+        """Mark an item as visited, releasing any items that depend on it"""
+        self._n_done += 1
+        for dependent in self.dependents[path]:
+            self._n_waiting[dependent] -= 1
+            if self._n_waiting[dependent] == 0:
+                self.blocked.discard(dependent)
+                self._ready.append(dependent)
+
+    def is_active(self) -> bool:
+        """Whether there are items that are ready or that have been gotten but not yet marked :meth:`.done`"""
+        return len(self._ready) > 0 or self._n_done < self._n_passed_out
+
+    def find_cycle(self) -> List[str]:
+        """
+        Find one dependency cycle among the :attr:`.blocked` items, if any
+
+        Returns:
+            List[str]: The cycle, starting and ending with the same item, or an empty list if there is none
+        """
+        for start in sorted(self.blocked):
+            path = [start]
+            seen = {start: 0}
+            current = start
+            while True:
+                waiting = sorted(d for d in self.depends[current] if d in self.blocked)
+                if not waiting:
+                    break
+                current = waiting[0]
+                if current in seen:
+                    return path[seen[current]:] + [current]
+                seen[current] = len(path)
+                path.append(current)
+        return []
+
+
+Selector = Union[str, Callable[[H5SourceItem], bool]]
+"""
+Selects elements in an hdf5 file, either
+
+* a glob pattern matched against the absolute path of the element, where ``*`` matches
+  within one level of the hierarchy and ``**`` matches any number of levels, eg.
+  ``/processing/*/Fluorescence/**``
+* a predicate called with the element's :class:`.H5SourceItem` , like those made by :func:`.has_type`
+"""
+Selectors = Union[Selector, List[Selector]]
+"""One or many :data:`.Selector` s"""
+
+
+def has_type(*neurodata_types: str) -> Callable[[H5SourceItem], bool]:
+    """
+    Make a :data:`.Selector` for elements that have one of the given ``neurodata_type`` s
+
+    Examples:
+
+        .. code-block:: python
+
+            io.read(include=has_type('Fluorescence', 'ImageSegmentation'))
+    """
+    def _has_type(item: H5SourceItem) -> bool:
+        return item.neurodata_type in neurodata_types
+    return _has_type
+
+
+class Selection:
+    """
+    Which elements of an hdf5 file to read, as used by :func:`.flatten_hdf` .
+
+    An element is selected if it or one of its parents matches any of the ``include``
+    selectors (or there are none) and neither it nor any of its parents matches any of the ``exclude`` selectors.
+    """
+    def __init__(self, include: Optional[Selectors] = None, exclude: Optional[Selectors] = None):
+        """
+        Args:
+            include (str, Callable, list): :data:`.Selector` or list of selectors to include
+            exclude (str, Callable, list): :data:`.Selector` or list of selectors to exclude
+        """
+        self.include = self._normalize(include)
+        self.exclude = self._normalize(exclude)
+        self._include_globs = [_glob_parts(s) for s in self.include if isinstance(s, str)]
+        self._include_predicates = any(callable(s) for s in self.include)
+
+    @staticmethod
+    def _normalize(selectors: Optional[Selectors]) -> List[Selector]:
+        if selectors is None:
+            return []
+        if isinstance(selectors, str) or callable(selectors):
+            return [selectors]
+        return list(selectors)
+
+    def includes(self, item: H5SourceItem) -> bool:
+        """Whether the item itself matches an ``include`` selector (or there are none)"""
+        if len(self.include) == 0:
+            return True
+        return self._matches(item, self.include)
+
+    def excludes(self, item: H5SourceItem) -> bool:
+        """Whether the item itself matches an ``exclude`` selector"""
+        return self._matches(item, self.exclude)
+
+    def may_include_below(self, path: str) -> bool:
+        """
+        Whether any element below ``path`` could match an ``include`` selector,
+        or else we can skip its children entirely.
+        """
+        if len(self.include) == 0 or self._include_predicates:
+            return True
+        parts = _path_parts(path)
+        return any(_match_parts(parts, glob, prefix=True) for glob in self._include_globs)
+
+    @staticmethod
+    def _matches(item: H5SourceItem, selectors: List[Selector]) -> bool:
+        for selector in selectors:
+            if isinstance(selector, str):
+                if _match_parts(_path_parts(item.path), _glob_parts(selector)):
+                    return True
+            elif selector(item):
+                return True
+        return False
+
+
+def _path_parts(path: str) -> List[str]:
+    return [p for p in path.split('/') if p]
+
+def _glob_parts(pattern: str) -> List[str]:
+    return [p for p in pattern.split('/') if p]
+
+def _match_parts(path: List[str], pattern: List[str], prefix: bool = False) -> bool:
+    """
+    Match split path against a split glob pattern.
+
+    If ``prefix`` , also match if the path could be extended to match the whole pattern
+    """
+    if len(path) == 0:
+        return prefix or all(p == '**' for p in pattern)
+    if len(pattern) == 0:
+        return False
+    if pattern[0] == '**':
+        return _match_parts(path, pattern[1:], prefix) or _match_parts(path[1:], pattern, prefix)
+    return fnmatchcase(path[0], pattern[0]) and _match_parts(path[1:], pattern[1:], prefix)
+
+
+class HardlinkMap:
+    """
+    The canonical path of each object in a file, keyed by its address, filled by :func:`.flatten_hdf`
+    as it walks the file.
+
+    An object can be hard linked at several paths, and none of them is more "real" than the others.
+    The walk visits each object once, at the first path it finds it at, which becomes its canonical path:
+    the object is flattened and read once, under that path, and its other paths are recorded as
+    :attr:`.aliases` that resolve to it, so every group that contains the object shares the same result.
+    """
+    __slots__ = ('paths', 'aliases')
+
+    def __init__(self):
+        self.paths: Dict[int, HDF5_Path] = {}
+        """Object address to its canonical path"""
+        self.aliases: Dict[HDF5_Path, HDF5_Path] = {}
+        """Other paths of objects found at more than one path, to their canonical path"""
+
+    def add(self, addr: int, path: str) -> HDF5_Path:
+        """
+        Record that the object at ``addr`` was found at ``path`` , returning its canonical path:
+        ``path`` if this is the first time it's been found, and otherwise the path it was first found at.
+        """
+        canonical = self.paths.setdefault(addr, HDF5_Path(path))
+        if canonical != path:
+            self.aliases[HDF5_Path(path)] = canonical
+        return canonical
+
+    def resolve(self, path: str) -> HDF5_Path:
+        """
+        Canonical path for ``path`` , including paths below a group that is itself an alias
+        (whose children were only visited under its canonical path).
+        """
+        if path in self.aliases:
+            return self.aliases[path]
+        head, tail = posixpath.split(path)
+        if not tail or not self.aliases:
+            return HDF5_Path(path)
+        parent = self.resolve(head)
+        if parent == head:
+            return HDF5_Path(path)
+        # the path below the canonical group might itself be an alias
+        return self.resolve(posixpath.join(parent, tail))
+
+
+def flatten_hdf(
+        h5f:h5py.File | h5py.Group,
+        skip='specifications',
+        lazy: bool = False,
+        include: Optional[Selectors] = None,
+        exclude: Optional[Selectors] = None,
+        hardlinks: Optional[HardlinkMap] = None
+    ) -> Dict[str, H5SourceItem]:
     """
     Flatten all child elements of hdf element into a dict of :class:`.H5SourceItem` s keyed by their path
 
+    Objects that are hard linked at several paths are flattened once, at their canonical path, and the groups
+    that contain them at their other paths have the canonical path in their :attr:`~.H5SourceItem.aliases`
+    (see :class:`.HardlinkMap` ), so reading doesn't need to look up the names of objects in the file.
+
+    When ``include`` or ``exclude`` are given, only the selected elements are flattened
+    (see :class:`.Selection` ), along with the ancestors needed to contain them. Ancestors
+    are marked :attr:`~.H5SourceItem.partial` , and include their datasets but only their selected
+    child groups. Subtrees that can't contain a selected element are skipped entirely
+    rather than filtered afterwards. ``h5f`` itself is always kept, so a selection that matches
+    nothing gives just ``h5f`` (as a partial group) and its datasets. Selectors are matched against
+    every path of objects that are hard linked at several paths, and objects matched at any of them
+    are selected at their canonical path.
+
+    Zarr stores are flattened the same way, given a :class:`~nwb_linkml.types.zarr.ZarrGroup` .
+
     Args:
         h5f (:class:`h5py.File` | :class:`h5py.Group`): HDF file or group to flatten!
+        skip (str): Skip elements whose path contains this string
+        lazy (bool): If ``True`` , don't flatten the children of groups that have a ``neurodata_type``
+            (other than ``h5f`` itself), and mark those groups as :attr:`~.H5SourceItem.lazy`
+        include (str, Callable, list): Only flatten elements selected by these :data:`.Selectors`
+            and their children.
+        exclude (str, Callable, list): Don't flatten elements selected by these :data:`.Selectors`
+            or their children.
+        hardlinks (:class:`.HardlinkMap`): Empty map to fill with the canonical paths of the objects
+            that are visited, if it's needed after flattening.
     """
+    if hardlinks is None:
+        hardlinks = HardlinkMap()
+    selection = None
+    if include is not None or exclude is not None:
+        selection = Selection(include=include, exclude=exclude)
+
+    visit = partial(_visit_pruned, hardlinks=hardlinks)
+    if isinstance(h5f, ZarrGroup):
+        from nwb_linkml.maps.zarr import visit_zarr as visit
+
     items = {}
+    selected = set()
+    excluded = set()
     def _itemize(name: str, obj: h5py.Dataset | h5py.Group):
-        if skip in name:
+        # use the absolute path, names given by visititems are relative to ``h5f``
+        if skip in obj.name:
             return
+        item = source_item(obj, lazy=_is_lazy(obj))
+        if selection is not None:
+            if obj.name != h5f.name and selection.excludes(item):
+                excluded.add(obj.name)
+                return
+            if selection.includes(item) or posixpath.dirname(obj.name) in selected:
+                selected.add(obj.name)
+        items[obj.name] = item
+
+    def _is_lazy(obj: h5py.Dataset | h5py.Group) -> bool:
+        return lazy and \
+            isinstance(obj, (h5py.Group, ZarrGroup)) and \
+            obj.name != h5f.name and \
+            'neurodata_type' in obj.attrs
+
+    def _prune(obj: h5py.Group) -> bool:
+        if skip in obj.name or _is_lazy(obj):
+            return True
+        if selection is not None:
+            return obj.name in excluded or \
+                (obj.name not in selected and not selection.may_include_below(obj.name))
+        return False
 
-        leaf = isinstance(obj, h5py.Dataset) or len(obj.keys()) == 0
+    def _select_aliases():
+        # the walk only visits objects at their canonical paths, but selectors should match objects
+        # at any of their paths, so check the aliases (and everything below them) too,
+        # and select what they match at its canonical path
+        matched = set()
+        def _check(name: str, obj: h5py.Dataset | h5py.Group):
+            if skip in obj.name or posixpath.dirname(obj.name) in matched:
+                return
+            item = source_item(obj)
+            if selection.excludes(item):
+                excluded.add(obj.name)
+            elif selection.includes(item) or posixpath.dirname(obj.name) in selected:
+                matched.add(obj.name)
+
+        def _prune_alias(obj: h5py.Group) -> bool:
+            return skip in obj.name or obj.name in excluded or obj.name in matched or \
+                not selection.may_include_below(obj.name)
+
+        checked = set()
+        while len(checked) < len(hardlinks.aliases):
+            for alias in [a for a in hardlinks.aliases if a not in checked]:
+                checked.add(alias)
+                if posixpath.dirname(alias) in excluded:
+                    continue
+                obj = h5f.file[alias]
+                _check(alias, obj)
+                if isinstance(obj, h5py.Group) and not _prune_alias(obj):
+                    _visit_pruned(obj, _check, _prune_alias)
+
+            for path in matched:
+                canonical = hardlinks.resolve(path)
+                # keep the groups that contain the alias, as well as the object itself
+                selected.add(path)
+                if canonical in selected:
+                    continue
+                obj = h5f.file[canonical]
+                selected.add(canonical)
+                items[canonical] = source_item(obj, lazy=_is_lazy(obj))
+                if isinstance(obj, h5py.Group) and not _prune(obj):
+                    visit(obj, _itemize, _prune)
+            matched.clear()
+
+    if selection is not None:
+        # root first, so its children know if they are in a selected group
+        _itemize(h5f.name, h5f)
+        visit(h5f, _itemize, _prune)
+        if hardlinks.aliases:
+            _select_aliases()
+        _mark_empty(items, hardlinks)
+        items = _select_items(items, selected, h5f.name)
+    else:
+        visit(h5f, _itemize, _prune)
+        # then add the root item
+        _itemize(h5f.name, h5f)
+        _mark_empty(items, hardlinks)
 
-        if isinstance(obj, h5py.Dataset):
-            h5_type = 'dataset'
-        elif isinstance(obj, h5py.Group):
-            h5_type = 'group'
-        else:
-            raise ValueError(f'Object must be a dataset or group! {obj}')
+    if hardlinks.aliases:
+        _resolve_aliases(items, hardlinks)
+    return items
 
-        # get references in attrs and datasets to populate dependencies
-        #depends = get_references(obj)
 
-        if not name.startswith('/'):
-           name = '/' + name
+def _mark_empty(items: Dict[str, H5SourceItem], hardlinks: HardlinkMap):
+    """
+    Mark groups whose children are all empty groups as :attr:`~.H5SourceItem.empty` too (see :func:`.check_empty` ),
+    and record the empty children of each group in its :attr:`~.H5SourceItem.empty_children` ,
+    from the flattened items rather than by reading the groups again.
+
+    Children that weren't flattened (eg. in lazy or skipped groups) aren't known to be empty,
+    so the groups that contain them aren't either.
+    """
+    def _target(item: H5SourceItem, name: str) -> HDF5_Path:
+        return hardlinks.resolve(item.links.get(name, None) or posixpath.join(item.path, name))
+
+    def _is_bare(item: Optional[H5SourceItem]) -> bool:
+        return item is not None and item.h5_type == 'group' and len(item.attrs) == 0 and len(item.children) == 0
+
+    empty = set()
+    for path, item in items.items():
+        if item.h5_type != 'group' or len(item.attrs) > 0:
+            continue
+        if item.empty or all(_is_bare(items.get(_target(item, name), None)) for name in item.children):
+            item.empty = True
+            empty.add(path)
+
+    if not empty:
+        return
+    for item in items.values():
+        if item.h5_type == 'group' and len(item.children) > 0:
+            names = tuple(name for name in item.children if _target(item, name) in empty)
+            if names:
+                item.empty_children = names
+
+
+def _resolve_aliases(items: Dict[str, H5SourceItem], hardlinks: HardlinkMap):
+    """
+    Point groups at the canonical paths of their children that are aliases, and of soft links that point to aliases
+    """
+    for alias, canonical in hardlinks.aliases.items():
+        parent = items.get(posixpath.dirname(alias), None)
+        if parent is None:
+            continue
+        if parent.aliases is None:
+            parent.aliases = {}
+        parent.aliases[posixpath.basename(alias)] = canonical
+    for item in items.values():
+        if item.links:
+            item.links = {name: hardlinks.resolve(target) for name, target in item.links.items()}
+
+
+def _select_items(items: Dict[str, H5SourceItem], selected: Set[str], root: str) -> Dict[str, H5SourceItem]:
+    """
+    Keep the selected items, their ancestors up to ``root`` , and the datasets within those ancestors.
+
+    ``root`` is always kept, even if nothing was selected, so a selection that matches nothing
+    reads as an empty (partial) model rather than nothing at all.
+    """
+    ancestors = {root}
+    for path in selected:
+        while path != root and path != '/':
+            path = posixpath.dirname(path)
+            if path in ancestors:
+                break
+            ancestors.add(path)
+
+    keep = {}
+    for path, item in items.items():
+        if path in selected:
+            keep[path] = item
+        elif path in ancestors:
+            item.partial = True
+            keep[path] = item
+        elif item.h5_type == 'dataset' and posixpath.dirname(path) in ancestors:
+            keep[path] = item
+    return keep
+
+
+def source_item(obj: h5py.Dataset | h5py.Group, lazy: bool = False) -> H5SourceItem:
+    """
+    Make the :class:`.H5SourceItem` for a single dataset or group
+
+    Args:
+        obj (:class:`h5py.Dataset` | :class:`h5py.Group`): Object to describe
+        lazy (bool): Whether the item's children are left unflattened, see :attr:`.H5SourceItem.lazy`
+    """
+    if isinstance(obj, ZarrNode):
+        from nwb_linkml.maps.zarr import zarr_source_item
+        return zarr_source_item(obj, lazy=lazy)
 
-        attrs = dict(obj.attrs.items())
+    attrs = {sys.intern(k): _dereference_attr(obj, v) for k, v in obj.attrs.items()}
+    info = h5py.h5o.get_info(obj.id)
+    structure = {}
 
-        items[name] = H5SourceItem.model_construct(
-            path = name,
-            h5f_path=h5f.file.filename,
-            leaf = leaf,
-            #depends = depends,
-            h5_type=h5_type,
-            attrs = attrs,
-            namespace = attrs.get('namespace', None),
-            neurodata_type= attrs.get('neurodata_type', None)
+    if isinstance(obj, h5py.Dataset):
+        h5_type = 'dataset'
+        leaf = True
+        structure = dict(
+            shape = obj.shape,
+            dtype = obj.dtype,
+            chunks = obj.chunks,
+            compression = obj.compression,
+            compression_opts = obj.compression_opts
+        )
+    elif isinstance(obj, h5py.Group):
+        h5_type = 'group'
+        children = []
+        links = {}
+        def _link(name: bytes, link_info: h5py.h5l.LinkInfo):
+            children.append(name.decode('utf-8'))
+            if link_info.type == h5py.h5l.TYPE_SOFT:
+                target = obj.id.links.get_val(name).decode('utf-8')
+                links[name.decode('utf-8')] = HDF5_Path(posixpath.normpath(posixpath.join(obj.name, target)))
+        obj.id.links.iterate(_link, info=True)
+
+        leaf = len(children) == 0
+        structure = dict(
+            children = children,
+            links = links,
+            # whether empty children make this group empty too is worked out by flatten_hdf,
+            # which has already flattened them
+            empty = len(attrs) == 0 and len(children) == 0
         )
+    else:
+        raise ValueError(f'Object must be a dataset or group! {obj}')
+
+    # get references in attrs and datasets to populate dependencies
+    #depends = get_references(obj)
+
+    return H5SourceItem.model_construct(
+        path = obj.name,
+        # every item in a file shares one copy of its filename
+        h5f_path=sys.intern(obj.file.filename),
+        leaf = leaf,
+        #depends = depends,
+        h5_type=h5_type,
+        attrs = attrs,
+        namespace = attrs.get('namespace', None),
+        neurodata_type= attrs.get('neurodata_type', None),
+        lazy = lazy,
+        addr = info.addr,
+        n_hardlinks = info.rc,
+        **structure
+    )
 
-    h5f.visititems(_itemize)
-    # then add the root item
-    _itemize(h5f.name, h5f)
-    return items
+
+def _visit_pruned(
+        group: h5py.Group,
+        func: Callable[[str, h5py.Dataset | h5py.Group], None],
+        prune: Callable[[h5py.Group], bool],
+        hardlinks: Optional[HardlinkMap] = None
+    ):
+    """
+    Like :meth:`h5py.Group.visititems` - visit each object below ``group`` once, depth first in name order,
+    following hard links but not soft or external links - except don't visit the children
+    of groups where ``prune(group)`` is ``True``.
+
+    Objects with multiple hard links are visited at the first path they are found at, and deduplicated
+    by their address in the file, which is read from the links in each group without opening the objects.
+    Their canonical paths and aliases are recorded in ``hardlinks`` , if given.
+    """
+    if hardlinks is None:
+        hardlinks = HardlinkMap()
+    hardlinks.add(h5py.h5o.get_info(group.id).addr, group.name)
+    stack = _hard_links(group)[::-1]
+    while stack:
+        parent, name, addr = stack.pop()
+        path = posixpath.join(parent.name, name)
+        if hardlinks.add(addr, path) != path:
+            continue
+        obj = parent[name]
+        func(obj.name, obj)
+        if isinstance(obj, h5py.Group) and not prune(obj):
+            stack.extend(_hard_links(obj)[::-1])
+
+
+def _hard_links(group: h5py.Group) -> List[Tuple[h5py.Group, str, int]]:
+    """The ``(group, name, address)`` of each hard link in a group, in name order"""
+    links = []
+    def _link(name: bytes, link_info: h5py.h5l.LinkInfo):
+        if link_info.type == h5py.h5l.TYPE_HARD:
+            links.append((group, name.decode('utf-8'), link_info.u))
+    group.id.links.iterate(_link, info=True)
+    return links
+
+
+def _dereference_attr(obj: h5py.Dataset | h5py.Group, value: Any) -> Any:
+    """
+    Object references in attrs are only meaningful with an open file, and
+    can't be pickled to send to other processes, so replace them with the
+    path they refer to (or ``None`` for null references).
+    """
+    if isinstance(value, h5py.h5r.Reference) and not isinstance(value, h5py.h5r.RegionReference):
+        if not value:
+            return None
+        return HDF5_Path(obj.file[value].name)
+    return value
 
 
 def get_references(obj: h5py.Dataset | h5py.Group) -> List[str]:
@@ -816,6 +1990,8 @@ def resolve_references(src: dict, completed: Dict[str, H5ReadResult]) -> Tuple[d
             other_item = completed.get(item, None)
             if other_item is None:
                 errors.append(f"Couldnt find: {item}")
+                res[path] = item
+                continue
             res[path] = other_item.result
             completes.append(item)
 
@@ -828,6 +2004,140 @@ def resolve_references(src: dict, completed: Dict[str, H5ReadResult]) -> Tuple[d
             res[path] = item
     return res, errors, completes
 
+def _drop_missing(src: dict, completed: Dict[str, H5ReadResult]) -> dict:
+    """Recursively drop references to items that aren't in ``completed``"""
+    res = {}
+    for key, item in src.items():
+        if isinstance(item, HDF5_Path):
+            if item in completed:
+                res[key] = item
+        elif isinstance(item, dict):
+            res[key] = _drop_missing(item, completed)
+        else:
+            res[key] = item
+    return res
+
+def _construct(src: H5ReadResult, res: dict, errors: List[str], options: ReadOptions) -> BaseModel:
+    """
+    Instantiate the model for a result.
+
+    Models are validated unless :attr:`.ReadOptions.validation` is ``'deferred'`` or ``'off'`` .
+    :attr:`~.H5SourceItem.partial` groups might be missing required children,
+    so if they don't validate, construct them without validation (see :func:`.construct_model` )
+    and note the error
+    """
+    if options.validation != 'eager':
+        return construct_model(src.model, res, deferred=options.validation == 'deferred')
+    if not getattr(src.source, 'partial', False):
+        return src.model(**res)
+    try:
+        return src.model(**res)
+    except ValidationError as e:
+        errors.append(f"Partially read {src.path} is not a valid {src.model.__name__}: {e}")
+        return construct_model(src.model, res, deferred=False)
+
+_DEFERRED: Dict[int, weakref.ref] = {}
+"""Models made by :func:`.construct_model` that haven't been validated, by id"""
+
+def construct_model(model: Type[BaseModel], values: dict, deferred: bool = True) -> BaseModel:
+    """
+    Make a model from values read from a file without validating them.
+
+    Only does the conversions that validation would need to do for values read from a file:
+    dicts are made into the models of the fields they are for (recursively, including the values of
+    dict fields), and strings are decoded or parsed as datetimes for ``str`` and ``datetime`` fields.
+    Everything else is used as it is.
+
+    Args:
+        model (:class:`pydantic.BaseModel`): Model to make
+        values (dict): Fields of the model
+        deferred (bool): If ``True`` (default), :func:`.validate_model` validates the model later,
+            otherwise it is left unvalidated
+    """
+    fields = {}
+    for key, value in values.items():
+        field = model.model_fields.get(key, None)
+        fields[key] = value if field is None else _construct_value(field.annotation, value, deferred)
+    instance = model.model_construct(**fields)
+    if deferred:
+        key = id(instance)
+        _DEFERRED[key] = weakref.ref(instance, lambda _, key=key: _DEFERRED.pop(key, None))
+    return instance
+
+
+def _construct_value(annotation: Any, value: Any, deferred: bool) -> Any:
+    annotation = unwrap_optional(annotation)
+    if isinstance(value, dict):
+        if inspect.isclass(annotation) and issubclass(annotation, BaseModel) and not isinstance(value, BaseModel):
+            return construct_model(annotation, value, deferred)
+        if typing.get_origin(annotation) is dict:
+            inner = typing.get_args(annotation)[-1]
+            return {k: _construct_value(inner, v, deferred) for k, v in value.items()}
+    elif isinstance(value, bytes) and annotation is str:
+        return value.decode('utf-8')
+    elif isinstance(value, (str, bytes)) and annotation in (datetime.datetime, datetime.date):
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return annotation.fromisoformat(value)
+    return value
+
+
+def validate_model(model: BaseModel, executor: Optional[Executor] = None) -> BaseModel | Future:
+    """
+    Validate a model read with :attr:`.ReadOptions.validation` ``== 'deferred'`` , and the models it contains.
+
+    Models that were made without validation are validated again from their fields, and the models that contain
+    them are copied to contain the validated models. Models that were already valid (or read with ``'off'`` )
+    are returned as they are. :class:`~nwb_linkml.types.hdf5.LazyModel` placeholders aren't read to validate them.
+
+    Args:
+        model (:class:`pydantic.BaseModel`): Model to validate
+        executor (:class:`concurrent.futures.Executor`): If given, validate in the background,
+            returning a :class:`concurrent.futures.Future` for the validated model
+
+    Returns:
+        :class:`pydantic.BaseModel` : The validated model
+
+    Raises:
+        :class:`pydantic.ValidationError` if a model isn't valid
+    """
+    if executor is not None:
+        return executor.submit(validate_model, model)
+    return _validate_value(model)
+
+
+def _validate_value(value: Any) -> Any:
+    if isinstance(value, LazyModel):
+        return value
+    if isinstance(value, BaseModel):
+        fields = {k: v for k, v in value.__dict__.items() if k in value.model_fields}
+        validated = {k: _validate_value(v) for k, v in fields.items()}
+        ref = _DEFERRED.get(id(value), None)
+        if ref is not None and ref() is value:
+            return type(value).model_validate(validated)
+        changed = {k: v for k, v in validated.items() if v is not fields[k]}
+        return value.model_copy(update=changed) if changed else value
+    if isinstance(value, dict):
+        validated = {k: _validate_value(v) for k, v in value.items()}
+        return validated if any(validated[k] is not value[k] for k in value) else value
+    if isinstance(value, list):
+        validated = [_validate_value(v) for v in value]
+        return validated if any(a is not b for a, b in zip(validated, value)) else value
+    return value
+
+
+def _child_path(src: H5SourceItem, name: str) -> HDF5_Path:
+    """
+    Canonical path of the child ``name`` of a flattened group, following soft links and hard link aliases
+    """
+    aliases = getattr(src, 'aliases', None)
+    if aliases and name in aliases:
+        return aliases[name]
+    if name in src.links:
+        return src.links[name]
+    return HDF5_Path(posixpath.join(src.path, name))
+
+
 def resolve_hardlink(obj: Union[h5py.Group, h5py.Dataset]) -> HDF5_Path:
     """
     Unhelpfully, hardlinks are pretty challenging to detect with h5py, so we have
@@ -839,6 +2149,9 @@ def resolve_hardlink(obj: Union[h5py.Group, h5py.Dataset]) -> HDF5_Path:
 
     We basically dereference the object and return that path instead of the path
     given by the object's ``name``
+
+    This asks hdf5 to search for the object's name, so while reading, the canonical paths
+    found by :func:`.flatten_hdf` (see :class:`.HardlinkMap` ) are used instead.
     """
     return HDF5_Path(obj.file[obj.ref].name)
 
@@ -1,29 +1,145 @@
 """
 Mapping functions for handling HDMF classes like DynamicTables
 """
-from typing import List, Type, Optional, Any
+from typing import Dict, List, Tuple, Type, Optional, Any
+import copyreg
+import threading
 import warnings
 
 
 import h5py
-from pydantic import create_model, BaseModel
+from pydantic import create_model, BaseModel, PrivateAttr
 import numpy as np
 from nwb_linkml.types.hdf5 import HDF5_Path
-from nwb_linkml.types.ndarray import NDArray, NDArrayProxy
-import dask.array as da
+from nwb_linkml.types.ndarray import NDArray, NDArrayProxy, NDArrayInfo, ArrayModes, lazy_array
+from nwb_linkml.types.ragged import RaggedArray, ReferencedValues
 
 
-def model_from_dynamictable(group:h5py.Group, base:Optional[BaseModel] = None) -> Type[BaseModel]:
+class DynamicTableModelMeta(type(BaseModel)):
+    """
+    Metaclass of the models made by :func:`.model_from_dynamictable` , so they can be pickled
+    (eg. to send them back from worker processes) even though they aren't defined in any module.
+
+    Cached models are pickled as their :func:`.dynamictable_signature` and name, and unpickled by
+    getting the model for them from the cache in the receiving process, which makes it if it doesn't have it yet.
+    """
+
+
+class DynamicTableMixin(BaseModel, metaclass=DynamicTableModelMeta):
+    """
+    Added to the models made by :func:`.model_from_dynamictable` to access ragged columns
+    """
+    _ragged: Dict[str, RaggedArray] = PrivateAttr(default_factory=dict)
+
+    def ragged(self, column: str) -> RaggedArray:
+        """
+        A ragged column split into rows by its VectorIndex (``{column}_index`` ), as a :class:`.RaggedArray` .
+
+        Doubly-indexed columns (with a ``{column}_index_index`` ) give a :class:`.RaggedArray` of
+        :class:`.RaggedArray` s, so each row is a list of rows.
+
+        eg. the spike times of the first 1000 units in one read::
+
+            spikes = nwbfile.units.ragged('spike_times')[0:1000]
+
+        Args:
+            column (str): Name of the column (not its index)
+        """
+        if column not in self._ragged:
+            index_name = f'{column}_index'
+            if getattr(self, index_name, None) is None:
+                raise KeyError(f'{column} has no index, so is not a ragged column')
+            ragged = RaggedArray(getattr(self, column), getattr(self, index_name))
+            while getattr(self, f'{index_name}_index', None) is not None:
+                index_name = f'{index_name}_index'
+                ragged = RaggedArray(ragged, getattr(self, index_name))
+            self._ragged[column] = ragged
+        return self._ragged[column]
+
+
+def dynamictable_signature(group:h5py.Group, base:Optional[Type[BaseModel]] = None) -> Tuple:
+    """
+    The things that determine the model :func:`.model_from_dynamictable` makes for a DynamicTable:
+    the base class, and the name and dtype of each column with the dtypes of its VectorIndex es.
+    """
+    columns = []
+    keys = set(group.keys())
+    for col in group.attrs['colnames']:
+        indexes = []
+        index_name = f'{col}_index'
+        while index_name in keys:
+            indexes.append(group[index_name].dtype)
+            index_name = f'{index_name}_index'
+        columns.append((col, group[col].dtype, tuple(indexes)))
+    return base, tuple(columns)
+
+
+_TABLE_MODELS: Dict[Tuple, Type[BaseModel]] = {}
+"""Models shared by tables with the same :func:`.dynamictable_signature` , keyed by the signature"""
+_NAMED_TABLE_MODELS: Dict[Tuple[Tuple, str], Type[BaseModel]] = {}
+"""Subclasses of the shared models named after each table, keyed by the signature and the table's name"""
+_TABLE_MODEL_KEYS: Dict[Type[BaseModel], Tuple] = {}
+"""The arguments to :func:`._table_model` that get each cached model, used to pickle them"""
+_TABLE_MODELS_LOCK = threading.Lock()
+
+def model_from_dynamictable(
+        group:h5py.Group,
+        base:Optional[Type[BaseModel]] = None,
+        cache: bool = True
+    ) -> Type[BaseModel]:
     """
     Create a pydantic model from a dynamic table
+
+    The model has fields for each column and the VectorIndex s of ragged columns,
+    and the :meth:`.DynamicTableMixin.ragged` accessor
+
+    The fields are made once per process for each :func:`.dynamictable_signature` and reused
+    for tables with the same columns, which is most of them. Each table name gets its own
+    empty subclass of that shared model, so models are still named after their table
+    (eg. ``trials`` and ``epochs`` have different models that share one parent).
+
+    Args:
+        group (:class:`h5py.Group`): The DynamicTable
+        base (:class:`pydantic.BaseModel`): Class for the model to inherit from
+        cache (bool): If ``False`` , always make a new model
     """
-    colnames = group.attrs['colnames']
+    name = group.name.split('/')[-1]
+    if not cache:
+        return _model_from_signature(dynamictable_signature(group, base), name)
+    return _table_model(dynamictable_signature(group, base), name)
+
+
+def _table_model(signature: Tuple, name: Optional[str] = None) -> Type[BaseModel]:
+    """
+    Get the cached model for a :func:`.dynamictable_signature` named after a table,
+    or the model they share if ``name`` is ``None``
+    """
+    with _TABLE_MODELS_LOCK:
+        if signature not in _TABLE_MODELS:
+            base = signature[0]
+            # not the name of any schema class, since models are matched to them by name
+            shared_name = f"{base.__name__ if base is not None else 'DynamicTable'}Columns"
+            shared = _model_from_signature(signature, shared_name)
+            _TABLE_MODELS[signature] = shared
+            _TABLE_MODEL_KEYS[shared] = (signature,)
+        shared = _TABLE_MODELS[signature]
+        if name is None:
+            return shared
+        if (signature, name) not in _NAMED_TABLE_MODELS:
+            model = create_model(name, __base__=shared, __module__=shared.__module__)
+            _NAMED_TABLE_MODELS[(signature, name)] = model
+            _TABLE_MODEL_KEYS[model] = (signature, name)
+        return _NAMED_TABLE_MODELS[(signature, name)]
+
+
+def _model_from_signature(signature: Tuple, name: str) -> Type[BaseModel]:
+    base, columns = signature
     types = {}
-    for col in colnames:
+    for col, dtype, indexes in columns:
 
-        nptype = group[col].dtype.type
+        nptype = dtype.type
         if nptype == np.void:
-            warnings.warn(f"Cant handle numpy void type for column {col} in {group.name}")
+            warnings.warn(f"Cant handle numpy void type for column {col} in {name}")
             continue
         type_ = Optional[NDArray[Any, nptype]]
 
@@ -31,62 +147,140 @@ def model_from_dynamictable(group:h5py.Group, base:Optional[BaseModel] = None) -
         #types[col] = (List[type_ | None], ...)
         types[col] = (type_, None)
 
-    model = create_model(group.name.split('/')[-1], **types, __base__=base)
+        # ragged columns, which may be indexed more than once
+        index_name = f'{col}_index'
+        for index_dtype in indexes:
+            if base is None or index_name not in base.model_fields:
+                types[index_name] = (Optional[NDArray[Any, index_dtype.type]], None)
+            index_name = f'{index_name}_index'
+
+    bases = (base, DynamicTableMixin) if base is not None else (DynamicTableMixin,)
+    model = create_model(name, **types, __base__=bases)
     return model
 
 
+def _reduce_table_model(model: DynamicTableModelMeta):
+    key = _TABLE_MODEL_KEYS.get(model)
+    if key is None:
+        # defined in a module, so pickled by reference as usual
+        return model.__qualname__
+    return _table_model, key
+
+copyreg.pickle(DynamicTableModelMeta, _reduce_table_model)
+
+
 def dynamictable_to_model(
     group:h5py.Group,
     model:Optional[Type[BaseModel]]=None,
-    base:Optional[Type[BaseModel]] = None) -> BaseModel:
+    base:Optional[Type[BaseModel]] = None,
+    arrays: ArrayModes = 'proxy',
+    block_size: Optional[int] = None,
+    attrs: Optional[Dict[str, Any]] = None) -> BaseModel:
     """
     Instantiate a dynamictable model
 
     Calls :func:`.model_from_dynamictable` if ``model`` is not provided.
+
+    Args:
+        arrays (str): How to read the columns (see :func:`.lazy_array` ) - ``'proxy'`` (default) or ``'dask'``
+            as chunk-aligned dask arrays (or :class:`.NDArrayProxy` for types dask can't handle), ``'skip'`` as
+            :class:`.NDArrayInfo` descriptions without reading any data, or ``'load'`` into memory.
+        block_size (int): Approximate number of bytes in each block of the dask arrays,
+            see :meth:`.NDArrayProxy.to_dask`
+        attrs (dict): The group's attrs, if they have already been read (eg. in an
+            :class:`~nwb_linkml.maps.hdf5.H5SourceItem` , with references replaced by their paths).
+            Otherwise they are read from the group.
     """
     if model is None:
         model = model_from_dynamictable(group, base)
+    if attrs is None:
+        attrs = group.attrs
 
     items = {}
     for col, col_type in model.model_fields.items():
         if col not in group.keys():
-            if col in group.attrs:
-                items[col] = group.attrs[col]
+            if col in attrs:
+                items[col] = attrs[col]
             continue
 
         if col_type.annotation is HDF5_Path:
             items[col] = [HDF5_Path(group[d].name) for d in group[col][:]]
         else:
-            try:
-                items[col] = da.from_array(group[col])
-            except NotImplementedError:
-                # if str in get_inner_types(col_type.annotation):
-                #     # dask can't handle this, we just arrayproxy it
-                items[col] = NDArrayProxy(h5f_file=group.file.filename, path=group[col].name)
-                #else:
-                #    warnings.warn(f"Dask cant handle object type arrays like {col} in {group.name}. Skipping")
-                # pdb.set_trace()
-                # # can't auto-chunk with "object" type
-                # items[col] = da.from_array(group[col], chunks=-1)
+            items[col] = lazy_array(
+                NDArrayInfo.from_dataset(group[col]),
+                'dask' if arrays == 'proxy' else arrays,
+                block_size
+            )
 
     return model.model_construct(hdf5_path = group.name,
                  name = group.name.split('/')[-1],
                  **items)
 
 
-def dereference_reference_vector(dset: h5py.Dataset, data:Optional[List[Any]]) -> List:
+def dereference_reference_vector(dset: h5py.Dataset, data:Optional[List[Any]] = None) -> RaggedArray:
     """
     Given a compound dataset with indices, counts, and object references, dereference to values
 
     Data is of the form
     (idx_start, count, target)
+
+    Rows are grouped by the object they refer to, and the values are read lazily when rows of the
+    returned :class:`.RaggedArray` are accessed, in as few reads of each target as possible
+    (see :class:`.ReferencedValues` ) rather than one read per row.
+
+    Args:
+        dset (:class:`h5py.Dataset`): The compound dataset of references
+        data: Rows of ``dset`` , if they have already been read
+
+    Returns:
+        :class:`.RaggedArray` : with one row of referenced values per row of ``data``
     """
-    # assume all these references are to the same target
-    # and the index is in the 3rd position
-    if data is None:
-        data = dset[:]
+    read = data is None
+    if read:
+        data = dset[()]
+    elif not isinstance(data, np.ndarray) or data.dtype.names is None:
+        data = np.array([tuple(d) for d in data], dtype=dset.dtype)
+    names = data.dtype.names
+    refs = data[names[-1]]
+
+    if read and isinstance(dset, h5py.Dataset):
+        # group by the raw references, rather than resolving the reference in every row
+        keys = _reference_keys(dset, names[-1])
+        _, first, target_index = np.unique(keys, return_index=True, return_inverse=True)
+        targets = [_dereference(dset, refs[i]) for i in first]
+    else:
+        # zarr datasets give paths rather than references, which can be grouped directly
+        # the first row that refers to each object
+        unique = {}
+        target_index = [unique.setdefault(_reference_key(dset, ref), i) for i, ref in enumerate(refs)]
+        first, target_index = np.unique(target_index, return_inverse=True)
+        targets = [_dereference(dset, refs[i]) for i in first]
+
+    values = ReferencedValues(targets, target_index, data[names[0]], data[names[1]])
+    return RaggedArray(values, values.index)
+
+
+def _reference_keys(dset: h5py.Dataset, field: str) -> np.ndarray:
+    """
+    The raw bytes of the references in one field of a compound dataset,
+    which are equal for references to the same object
+    """
+    ftype = dset.id.get_type()
+    member = ftype.get_member_type(ftype.get_member_index(field.encode('utf-8')))
+    mtype = h5py.h5t.create(h5py.h5t.COMPOUND, member.get_size())
+    mtype.insert(field.encode('utf-8'), 0, member)
+    keys = np.empty(dset.shape, dtype=np.dtype((np.void, member.get_size())))
+    dset.id.read(h5py.h5s.ALL, h5py.h5s.ALL, keys, mtype=mtype)
+    return keys
+
+
+def _reference_key(dset: h5py.Dataset, ref: Any) -> Optional[str]:
+    if isinstance(ref, h5py.Reference):
+        return h5py.h5r.get_name(ref, dset.id).decode('utf-8') if ref else None
+    return ref
 
-    target = dset.parent.get(data[0][-1])
-    res = [target[d[0]:d[0]+d[1]] for d in data]
-    return res
 
+def _dereference(dset: h5py.Dataset, ref: Any) -> Optional[h5py.Dataset]:
+    if ref is None or (isinstance(ref, h5py.Reference) and not ref):
+        return None
+    return dset.parent.get(ref)
@@ -0,0 +1,81 @@
+"""
+Flattening NWB Zarr stores into the same :class:`~nwb_linkml.maps.hdf5.H5SourceItem` s as hdf5 files,
+so they can be read by the same maps and :class:`~nwb_linkml.maps.hdf5.ReadQueue` .
+
+Zarr stores are read through the h5py-like views in :mod:`nwb_linkml.types.zarr` ,
+and :func:`~nwb_linkml.maps.hdf5.flatten_hdf` and :func:`~nwb_linkml.maps.hdf5.source_item`
+use the functions here when they are given one, so zarr stores are flattened with ``flatten_hdf`` like hdf5 files.
+"""
+from typing import Callable
+
+from nwb_linkml.maps.hdf5 import H5SourceItem
+from nwb_linkml.types.zarr import ZarrDataset, ZarrGroup, ZarrNode
+
+
+def zarr_source_item(obj: ZarrNode, lazy: bool = False) -> H5SourceItem:
+    """
+    Make the :class:`.H5SourceItem` for a single zarr array or group
+
+    Zarr has no hard links, so :attr:`~.H5SourceItem.addr` is ``None`` and :attr:`~.H5SourceItem.n_hardlinks` is 1
+
+    Args:
+        obj (:class:`.ZarrDataset` | :class:`.ZarrGroup`): Object to describe
+        lazy (bool): Whether the item's children are left unflattened, see :attr:`.H5SourceItem.lazy`
+    """
+    attrs = dict(obj.attrs)
+
+    if isinstance(obj, ZarrDataset):
+        h5_type = 'dataset'
+        leaf = True
+        structure = dict(
+            shape=obj.shape,
+            dtype=obj.dtype,
+            chunks=obj.chunks,
+            compression=obj.compression,
+            compression_opts=obj.compression_opts
+        )
+    elif isinstance(obj, ZarrGroup):
+        h5_type = 'group'
+        children = obj.keys()
+        leaf = len(children) == 0
+        structure = dict(
+            children=children,
+            links=obj.links,
+            empty=len(attrs) == 0 and len(children) == 0
+        )
+    else:
+        raise ValueError(f'Object must be a zarr array or group! {obj}')
+
+    return H5SourceItem.model_construct(
+        path=obj.name,
+        h5f_path=obj.file.filename,
+        leaf=leaf,
+        h5_type=h5_type,
+        attrs=attrs,
+        namespace=attrs.get('namespace', None),
+        neurodata_type=attrs.get('neurodata_type', None),
+        lazy=lazy,
+        addr=None,
+        n_hardlinks=1,
+        **structure
+    )
+
+
+def visit_zarr(
+        group: ZarrGroup,
+        func: Callable[[str, ZarrNode], None],
+        prune: Callable[[ZarrGroup], bool]
+    ):
+    """
+    Like :meth:`.ZarrGroup.visititems` , visiting each object below ``group`` without following links,
+    except don't visit the children of groups where ``prune(group)`` is ``True`` .
+
+    The zarr equivalent of :func:`~nwb_linkml.maps.hdf5._visit_pruned`
+    """
+    stack = [group]
+    while stack:
+        current = stack.pop()
+        for obj in current.members():
+            func(obj.name, obj)
+            if isinstance(obj, ZarrGroup) and not prune(obj):
+                stack.append(obj)
@@ -43,7 +43,7 @@ so eg. for the linkML and pydantic providers:
 import pdb
 import shutil
 from pprint import pformat
-from typing import Dict, TypedDict, List, Optional, Literal, TypeVar, Any, Dict, Type, Callable
+from typing import Dict, TypedDict, List, Optional, Literal, TypeVar, Any, Dict, Type, Callable, Tuple
 from types import ModuleType
 from pathlib import Path
 import os
@@ -52,6 +52,7 @@ from importlib.abc import MetaPathFinder
 import warnings
 import importlib
 import sys
+import threading
 
 from pydantic import BaseModel
 
@@ -72,6 +73,12 @@ from nwb_linkml.ui import AdapterProgress
 
 P = TypeVar('P')
 
+_IMPORT_LOCK = threading.RLock()
+"""
+Held while model modules are imported, since they are put in :data:`sys.modules` before
+they are executed and other threads would otherwise see them half-imported
+"""
+
 class Provider(ABC):
     """
     Metaclass for different kind of providers!
@@ -670,32 +677,33 @@ class PydanticProvider(Provider):
         Returns:
             :class:`types.ModuleType`
         """
-        # get latest version if None
-        if version is None:
-            version = self.available_versions[namespace][-1]
+        with _IMPORT_LOCK:
+            # get latest version if None
+            if version is None:
+                version = self.available_versions[namespace][-1]
 
-        path = self.namespace_path(namespace, version) / 'namespace.py'
-        if not path.exists():
-            raise ImportError(f'Module has not been built yet {path}')
-        module_name = self.module_name(namespace, version)
+            path = self.namespace_path(namespace, version) / 'namespace.py'
+            if not path.exists():
+                raise ImportError(f'Module has not been built yet {path}')
+            module_name = self.module_name(namespace, version)
 
-        # import module level first - when python does relative imports,
-        # it needs to have the parent modules imported separately
-        # this breaks split model creation when they are outside of the
-        # package repository (ie. loaded from an nwb file) because it tries
-        # to look for the containing namespace folder within the nwb_linkml package and fails
-        init_spec = importlib.util.spec_from_file_location(module_name, path.parent / '__init__.py')
-        init_module = importlib.util.module_from_spec(init_spec)
-        sys.modules[module_name] = init_module
-        init_spec.loader.exec_module(init_module)
+            # import module level first - when python does relative imports,
+            # it needs to have the parent modules imported separately
+            # this breaks split model creation when they are outside of the
+            # package repository (ie. loaded from an nwb file) because it tries
+            # to look for the containing namespace folder within the nwb_linkml package and fails
+            init_spec = importlib.util.spec_from_file_location(module_name, path.parent / '__init__.py')
+            init_module = importlib.util.module_from_spec(init_spec)
+            sys.modules[module_name] = init_module
+            init_spec.loader.exec_module(init_module)
 
-        # then the namespace package
-        module_name = module_name + '.namespace'
-        spec = importlib.util.spec_from_file_location(module_name, path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
-        return module
+            # then the namespace package
+            module_name = module_name + '.namespace'
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+            return module
 
 
 
@@ -743,24 +751,25 @@ class PydanticProvider(Provider):
         module_name = self.module_name(namespace, version)
         namespace_name = module_name + '.namespace'
 
-        if not allow_repo:
-            self._clear_package_imports()
+        with _IMPORT_LOCK:
+            if not allow_repo:
+                self._clear_package_imports()
 
-        if namespace_name in sys.modules:
-            return sys.modules[namespace_name]
+            if namespace_name in sys.modules:
+                return sys.modules[namespace_name]
 
-        try:
-            path = self.namespace_path(namespace, version, allow_repo)
-        except FileNotFoundError:
-            path = None
+            try:
+                path = self.namespace_path(namespace, version, allow_repo)
+            except FileNotFoundError:
+                path = None
 
-        if path is None or not path.exists():
-            _ = self.build(namespace, version=version)
+            if path is None or not path.exists():
+                _ = self.build(namespace, version=version)
 
 
 
-        module = self.import_module(namespace, version)
-        return module
+            module = self.import_module(namespace, version)
+            return module
 
     @staticmethod
     def _clear_package_imports():
@@ -878,12 +887,33 @@ class SchemaProvider(Provider):
             **kwargs: passed to superclass __init__ (see :class:`.Provider` )
         """
         self.versions = versions
+        self._pydantic_provider = None
+        self._classes: Dict[Tuple[str, str, Optional[str]], Type[BaseModel]] = {}
         super(SchemaProvider, self).__init__(**kwargs)
 
     @property
     def path(self) -> Path:
         return self.config.cache_dir
 
+    @property
+    def pydantic_provider(self) -> 'PydanticProvider':
+        """
+        The :class:`.PydanticProvider` used to get models, made once rather than for every
+        call to :meth:`.get` , since each one adds an :class:`.EctopicModelFinder` to ``sys.meta_path``
+        """
+        if self._pydantic_provider is None:
+            with _IMPORT_LOCK:
+                if self._pydantic_provider is None:
+                    self._pydantic_provider = PydanticProvider(path=self.path)
+        return self._pydantic_provider
+
+    def __getstate__(self) -> dict:
+        # classes and providers are looked up again after unpickling
+        state = self.__dict__.copy()
+        state['_pydantic_provider'] = None
+        state['_classes'] = {}
+        return state
+
 
     def build(
         self,
@@ -920,6 +950,8 @@ class SchemaProvider(Provider):
         results = {}
         for ns, ns_result in linkml_res.items():
             results[ns] = pydantic_provider.build(ns_result['namespace'], versions=self.versions, **pydantic_kwargs)
+        # the most recent version of a namespace may have changed
+        self._classes = {}
         return results
 
     def get(self, namespace: str, version: Optional[str] = None) -> ModuleType:
@@ -931,18 +963,38 @@ class SchemaProvider(Provider):
         if version is None and self.versions is not None:
             version = self.versions.get(namespace, None)
 
-        return PydanticProvider(path=self.path).get(namespace, version)
+        return self.pydantic_provider.get(namespace, version)
+
+    def import_namespaces(self) -> Dict[str, ModuleType]:
+        """
+        Import the modules for every namespace in :attr:`.versions` .
+
+        Called before models are used from several threads or sent between processes,
+        so every module a model could refer to is already imported.
+
+        Returns:
+            Dict[str, :class:`types.ModuleType`] mapping namespaces to their modules
+        """
+        if self.versions is None:
+            return {}
+        return {namespace: self.get(namespace) for namespace in self.versions}
 
     def get_class(self, namespace: str, class_: str, version: Optional[str] = None) -> Type[BaseModel]:
         """
         Get a pydantic model class from a given namespace and version!
 
-        Wrapper around :meth:`.PydanticProvider.get_class`
+        Wrapper around :meth:`.PydanticProvider.get_class` , caching classes
+        so repeated lookups don't need to go through the import system.
         """
         if version is None and self.versions is not None:
             version = self.versions.get(namespace, None)
 
-        return PydanticProvider(path=self.path).get_class(namespace, class_, version)
+        key = (namespace, class_, version)
+        if key not in self._classes:
+            with _IMPORT_LOCK:
+                if key not in self._classes:
+                    self._classes[key] = self.pydantic_provider.get_class(namespace, class_, version)
+        return self._classes[key]
 
 
 
@@ -29,6 +29,7 @@ from pydantic import (
 
 from nwb_linkml.maps.hdmf import model_from_dynamictable, dereference_reference_vector
 from nwb_linkml.types.hdf5 import HDF5_Path
+from nwb_linkml.types.ragged import RaggedArray
 
 
 class DataFrame(BaseModel, pd.DataFrame):
@@ -145,8 +146,9 @@ def dynamictable_to_df(group:h5py.Group,
             continue
         idxname = col + '_index'
         if idxname in group.keys():
-            idx = group.get(idxname)[:]
-            data = group.get(col)[idx-1]
+            # ragged column, split into rows by its index
+            items[col] = RaggedArray(group.get(col), group.get(idxname)[:]).tolist()
+            continue
         else:
             data = group.get(col)[:]
 
@@ -178,7 +180,7 @@ def dynamictable_to_df(group:h5py.Group,
             dset = group.get(col)
             names = dset.dtype.names
             if names is not None and names[0] == 'idx_start' and names[1] == 'count':
-                data = dereference_reference_vector(dset, data)
+                data = list(dereference_reference_vector(dset))
 
         else:
             data = data.tolist()
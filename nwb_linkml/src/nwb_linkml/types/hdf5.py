@@ -1,6 +1,15 @@
-from typing import Any
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type
+
+import h5py
 from pydantic_core import CoreSchema, core_schema
-from pydantic import GetCoreSchemaHandler
+from pydantic import BaseModel, ConfigDict, GetCoreSchemaHandler, PrivateAttr
+import numpy as np
+
+from nwb_linkml.config import Config
 
 class HDF5_Path(str):
     """Trivial subclass of string to indicate that it is a reference to a location within an HDF5 file"""
@@ -8,4 +17,395 @@ class HDF5_Path(str):
     def __get_pydantic_core_schema__(
         cls, source_type: Any, handler: GetCoreSchemaHandler
     ) -> CoreSchema:
-        return core_schema.no_info_after_validator_function(cls, handler(str))
\ No newline at end of file
+        return core_schema.no_info_after_validator_function(cls, handler(str))
+
+
+def is_remote(path: Any) -> bool:
+    """Whether a file location is a URL to a remote file (rather than a local path or ``file://`` URL)"""
+    return isinstance(path, str) and '://' in path and not path.startswith('file://')
+
+
+def is_zarr(path: Any) -> bool:
+    """Whether a file location is a zarr store: named ``*.zarr`` , or a local directory with a ``.zgroup``"""
+    if str(path).rstrip('/').endswith('.zarr'):
+        return True
+    return isinstance(path, Path) and (path / '.zgroup').exists()
+
+
+def file_location(path: Any, resolve: bool = False) -> Path | str:
+    """
+    Normalize the location of an hdf5 file: local files are :class:`pathlib.Path` s
+    (resolved if ``resolve`` is ``True`` ), and remote URLs and the names of
+    file-like objects registered with :meth:`.H5FilePool.register` stay strings.
+    """
+    if isinstance(path, str):
+        if is_remote(path) or path.startswith(FILEOBJ_PREFIX):
+            return path
+        if path.startswith('file://'):
+            path = path[len('file://'):]
+    path = Path(path)
+    return path.resolve() if resolve else path
+
+
+FILEOBJ_PREFIX = 'fileobj-'
+"""Prefix of the names given to file-like objects by :meth:`.H5FilePool.register`"""
+
+
+class H5FilePool:
+    """
+    A pool of open, read-only :class:`h5py.File` handles keyed by file path.
+
+    Opening an HDF5 file is expensive relative to reading the metadata of any single
+    node within it, so rather than opening and closing the file for every access,
+    the :class:`~nwb_linkml.maps.hdf5.ReadQueue`, its maps, and
+    :class:`~nwb_linkml.types.ndarray.NDArrayProxy` borrow handles from a pool.
+
+    * **Threads** - h5py serializes all calls into the HDF5 library with a global lock,
+      so every thread in a process shares the same handle for a given file.
+    * **Processes** - handles can't be shared across processes, so the pool remembers
+      the pid it was created in and drops (without closing) any handles inherited
+      by a forked child, which then opens its own. Pickling a pool gives an empty pool.
+
+    So the number of times a file is opened scales with the number of workers
+    rather than the number of nodes read.
+
+    Files can also be remote URLs, which are opened with :func:`~nwb_linkml.io.remote.open_remote` and read through
+    a :class:`~nwb_linkml.io.remote.BlockCache` , or file-like objects, which are given a name by :meth:`.register` .
+    File-like objects can only be used by the process they were registered in.
+    Local or remote zarr stores (see :func:`.is_zarr` ) are opened as a :class:`~nwb_linkml.types.zarr.ZarrFile` .
+
+    Handles are reopened if the file changes on disk (by inode, size, or mtime).
+    Call :meth:`.close` before opening a file for writing that the pool may be holding open.
+
+    In most cases you want the process-wide pool from :func:`.get_pool` rather
+    than instantiating your own.
+    """
+
+    def __init__(self):
+        self._handles: Dict[Path | str, Tuple[h5py.File, tuple, Any]] = {}
+        self._fileobjs: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self.opened: int = 0
+        """Number of times a file has been opened by this pool, mostly for profiling and testing"""
+
+    def get(self, path: Path | str) -> h5py.File:
+        """
+        Get an open, read-only handle to an hdf5 file (or zarr store), opening it if needed.
+
+        The handle is owned by the pool: don't close it yourself, use :meth:`.close`
+
+        Args:
+            path (:class:`pathlib.Path`): Path to the hdf5 file, a remote URL, or the name
+                of a registered file-like object
+        """
+        return self._get(path)[0]
+
+    def signature(self, path: Path | str) -> tuple:
+        """
+        Signature of a file (see :meth:`.get` ), opening it if needed.
+        Changes whenever the file changes and its handle is reopened,
+        so it can be used to key caches of the file's contents.
+        """
+        return self._get(path)[1]
+
+    def _get(self, path: Path | str) -> Tuple[h5py.File, tuple]:
+        path = file_location(path, resolve=True)
+        signature = self._signature(path)
+        with self._lock:
+            self._check_pid()
+            handle = self._handles.get(path, None)
+            if handle is not None:
+                h5f, handle_signature, _ = handle
+                if handle_signature == signature and (not isinstance(h5f, h5py.File) or h5f.id.valid):
+                    return h5f, signature
+                self._close_handle(handle)
+
+            if is_zarr(path):
+                from nwb_linkml.types.zarr import open_zarr
+                h5f, fileobj = open_zarr(path), None
+            else:
+                fileobj = self._open_fileobj(path)
+                h5f = h5py.File(str(path) if fileobj is None else fileobj, 'r')
+            self.opened += 1
+            self._handles[path] = (h5f, signature, fileobj)
+            return h5f, signature
+
+    def register(self, fileobj: Any) -> str:
+        """
+        Register a file-like object so it can be opened like a file, returning the name to open it by.
+
+        fsspec files are read through a :class:`~nwb_linkml.io.remote.BlockCache` , other file-like objects are read directly.
+        """
+        name = f'{FILEOBJ_PREFIX}{id(fileobj):x}'
+        with self._lock:
+            self._check_pid()
+            self._fileobjs[name] = fileobj
+        return name
+
+    def fileobj(self, path: Path | str) -> Optional[Any]:
+        """
+        The file-like object an open remote or registered file is being read through, if any
+        (eg. to :meth:`~nwb_linkml.io.remote.BlockCache.prefetch` from it)
+        """
+        path = file_location(path, resolve=True)
+        if isinstance(path, Path):
+            return None
+        with self._lock:
+            handle = self._handles.get(path, None) if os.getpid() == self._pid else None
+        return None if handle is None else handle[2]
+
+    def prefetch(self, path: Path | str, dset: h5py.Dataset, key: Any):
+        """Prefetch the chunks a selection of a dataset reads, if it's in a remote file"""
+        fileobj = self.fileobj(path)
+        if fileobj is not None and hasattr(fileobj, 'prefetch'):
+            from nwb_linkml.io.remote import chunk_ranges
+            fileobj.prefetch(chunk_ranges(dset, key))
+
+    def close(self, path: Optional[Path | str] = None):
+        """
+        Close handles held by the pool.
+
+        Any :class:`h5py.Dataset` or :class:`h5py.Group` objects gotten from the closed handles
+        become invalid, but later calls to :meth:`.get` will reopen the file.
+
+        Args:
+            path (:class:`pathlib.Path`): If ``None`` (default), close all handles. Otherwise
+                just close the handle for the given file, if it is open.
+        """
+        with self._lock:
+            self._check_pid()
+            if path is None:
+                paths = list(self._handles.keys())
+            else:
+                paths = [file_location(path, resolve=True)]
+            for a_path in paths:
+                handle = self._handles.pop(a_path, None)
+                if handle is not None:
+                    self._close_handle(handle)
+
+    def __contains__(self, path: Path | str) -> bool:
+        return os.getpid() == self._pid and file_location(path, resolve=True) in self._handles
+
+    def __len__(self) -> int:
+        return len(self._handles) if os.getpid() == self._pid else 0
+
+    def __getstate__(self) -> dict:
+        return {}
+
+    def __setstate__(self, state: dict):
+        self.__init__()
+
+    def _check_pid(self):
+        """If we have been forked, forget the handles we inherited from the parent"""
+        if os.getpid() != self._pid:
+            self._handles = {}
+            self._fileobjs = {}
+            self._pid = os.getpid()
+
+    def _open_fileobj(self, path: Path | str) -> Optional[Any]:
+        """File-like object to open a remote or registered file from, or ``None`` for local files"""
+        if isinstance(path, Path):
+            return None
+        from nwb_linkml.io.remote import open_remote, open_fileobj
+        if path.startswith(FILEOBJ_PREFIX):
+            if path not in self._fileobjs:
+                raise FileNotFoundError(f'{path} is not a file-like object registered in this process')
+            return open_fileobj(self._fileobjs[path], path)
+        return open_remote(path)
+
+    @staticmethod
+    def _signature(path: Path | str) -> tuple:
+        if not isinstance(path, Path):
+            # remote files and file-like objects are assumed not to change while they're open
+            return (path,)
+        stat = path.stat()
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _close_handle(handle: Tuple[h5py.File, tuple, Any]):
+        h5f, _, fileobj = handle
+        try:
+            h5f.close()
+        except Exception:
+            # already closed, or the file has gone missing underneath us
+            pass
+        if fileobj is not None and hasattr(fileobj, 'prefetch'):
+            # only block caches we opened are ours to close, not registered file-like objects
+            fileobj.close()
+
+
+_POOL: Optional[H5FilePool] = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool() -> H5FilePool:
+    """
+    Get the process-wide :class:`.H5FilePool` shared by reads and array proxies.
+    """
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = H5FilePool()
+    return _POOL
+
+
+class ChunkCache:
+    """
+    A least-recently-used cache of decompressed dataset chunks, up to a byte budget.
+
+    Used by :class:`~nwb_linkml.types.ndarray.NDArrayProxy` so repeated or overlapping reads
+    of the same chunks don't read and decompress them again. Keys are made by the reader and should
+    include the :meth:`.H5FilePool.signature` of the file, so chunks from a file that has since changed
+    are never returned. Like the :class:`.H5FilePool` , a forked child starts with an empty cache.
+
+    In most cases you want the process-wide cache from :func:`.get_chunk_cache` .
+    """
+
+    def __init__(self, size: Optional[int] = None):
+        """
+        Args:
+            size (int): Approximate number of bytes of chunks to keep. If ``None`` (default),
+                use :attr:`.Config.chunk_cache_size`
+        """
+        if size is None:
+            size = Config().chunk_cache_size
+        self.size = size
+        self.nbytes = 0
+        self._chunks: OrderedDict[Hashable, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            self._check_pid()
+            chunk = self._chunks.get(key, None)
+            if chunk is None:
+                self.misses += 1
+                return None
+            self._chunks.move_to_end(key)
+            self.hits += 1
+            return chunk
+
+    def put(self, key: Hashable, chunk: np.ndarray):
+        if chunk.nbytes > self.size:
+            return
+        with self._lock:
+            self._check_pid()
+            old = self._chunks.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._chunks[key] = chunk
+            self.nbytes += chunk.nbytes
+            while self.nbytes > self.size:
+                _, evicted = self._chunks.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._chunks) if os.getpid() == self._pid else 0
+
+    def _check_pid(self):
+        if os.getpid() != self._pid:
+            self._chunks = OrderedDict()
+            self.nbytes = 0
+            self._pid = os.getpid()
+
+
+_CHUNK_CACHE: Optional[ChunkCache] = None
+
+def get_chunk_cache() -> ChunkCache:
+    """
+    Get the process-wide :class:`.ChunkCache` shared by array proxies.
+    """
+    global _CHUNK_CACHE
+    if _CHUNK_CACHE is None:
+        with _POOL_LOCK:
+            if _CHUNK_CACHE is None:
+                _CHUNK_CACHE = ChunkCache()
+    return _CHUNK_CACHE
+
+
+class LazyModel:
+    """
+    Mixin for placeholder models that stand in for a model in an hdf5 file until it is first used.
+
+    Placeholders are instances of a subclass of the model they stand in for (see :func:`.lazy_model` ),
+    so they can be used wherever the model is expected, and validate as members of their parent models.
+    They are created with only the fields that are cheap to get (like ``name`` and ``hdf5_path`` ),
+    and the first time any other public attribute is accessed, the ``loader`` is called to read the real model.
+    The placeholder then *becomes* the real model - it takes its fields and its class - so
+    references to it held elsewhere in the model tree see the loaded model too.
+    """
+    __slots__ = ()
+    _lazy_lock = threading.RLock()
+
+    @classmethod
+    def lazy_construct(cls, loader: Callable[[], BaseModel], **fields) -> BaseModel:
+        """
+        Make a placeholder
+
+        Args:
+            loader (Callable): Called with no arguments to read the real model
+            **fields: Any fields that are already known, without calling the ``loader``
+        """
+        instance = cls.model_construct(**fields)
+        # drop any defaults, so that accessing them triggers a load
+        object.__setattr__(instance, '__dict__', {k: v for k, v in instance.__dict__.items() if k in fields})
+        instance._lazy_loader = loader
+        return instance
+
+    def resolve(self) -> BaseModel:
+        """
+        Load the real model in place, if it hasn't been already.
+
+        Returns:
+            This instance, which is now an instance of the loaded model's class rather than a placeholder
+        """
+        with self._lazy_lock:
+            if not isinstance(self, LazyModel):
+                # already loaded by another thread
+                return self
+            loaded = self._lazy_loader()
+            object.__setattr__(self, '__dict__', loaded.__dict__)
+            object.__setattr__(self, '__pydantic_fields_set__', loaded.__pydantic_fields_set__)
+            object.__setattr__(self, '__pydantic_extra__', loaded.__pydantic_extra__)
+            object.__setattr__(self, '__pydantic_private__', loaded.__pydantic_private__)
+            object.__setattr__(self, '__class__', type(loaded))
+        return self
+
+    def __getattr__(self, item: str) -> Any:
+        if item.startswith('_'):
+            return super().__getattr__(item)
+        self.resolve()
+        return getattr(self, item)
+
+
+_LAZY_MODELS: Dict[Type[BaseModel], Type[BaseModel]] = {}
+_LAZY_MODELS_LOCK = threading.Lock()
+
+def lazy_model(model: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Get the :class:`.LazyModel` placeholder class for a model, which is a subclass of it.
+
+    Placeholder classes are made once per model and reused.
+    """
+    with _LAZY_MODELS_LOCK:
+        if model not in _LAZY_MODELS:
+            _LAZY_MODELS[model] = type(
+                f'Lazy{model.__name__}',
+                (LazyModel, model),
+                {
+                    '__module__': model.__module__,
+                    '_lazy_loader': PrivateAttr(default=None),
+                    # placeholders are only ever made with model_construct, so they don't need a validator
+                    'model_config': ConfigDict(**model.model_config, defer_build=True)
+                }
+            )
+        return _LAZY_MODELS[model]
@@ -9,10 +9,14 @@ from pathlib import Path
 from typing import (
     Any,
     Callable,
+    List,
+    Literal,
+    Optional,
     Tuple
 )
 import sys
 from copy import copy
+from itertools import product
 
 from pydantic_core import core_schema
 from pydantic import (
@@ -24,8 +28,12 @@ from pydantic import (
 from pydantic.json_schema import JsonSchemaValue
 
 import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
 import h5py
-from dask.array.core import Array as DaskArray
+import dask
+import dask.array as da
+from dask.array.core import Array as DaskArray, normalize_chunks
+from dask.base import tokenize
 import blosc2
 
 from nptyping import NDArray as _NDArray
@@ -34,7 +42,13 @@ from nptyping import Shape, Number
 from nptyping.nptyping_type import NPTypingType
 from nptyping.shape_expression import check_shape
 
+from nwb_linkml.config import Config
 from nwb_linkml.maps.dtype import np_to_python, allowed_precisions
+from nwb_linkml.types.hdf5 import get_pool, get_chunk_cache, file_location
+
+
+ArrayModes = Literal['skip', 'proxy', 'dask', 'load']
+"""How array data is read, see :func:`.lazy_array` and :attr:`~nwb_linkml.maps.hdf5.ReadOptions.arrays`"""
 
 
 class NDArrayMeta(_NDArrayMeta, implementation="NDArray"):
@@ -125,6 +139,9 @@ class NDArray(NPTypingType, metaclass=NDArrayMeta):
                 arr = instance.__array__()
             elif isinstance(instance, NDArrayProxy):
                 arr = instance[:]
+            elif isinstance(instance, NDArrayInfo):
+                # there is no data to serialize, just the description
+                return instance.to_dict()
             else:
                 arr = instance
 
@@ -153,7 +170,8 @@ class NDArray(NPTypingType, metaclass=NDArrayMeta):
                     core_schema.union_schema([
                         core_schema.is_instance_schema(cls=np.ndarray),
                         core_schema.is_instance_schema(cls=DaskArray),
-                        core_schema.is_instance_schema(cls=NDArrayProxy)
+                        core_schema.is_instance_schema(cls=NDArrayProxy),
+                        core_schema.is_instance_schema(cls=NDArrayInfo)
                         ]),
                     core_schema.no_info_plain_validator_function(validate_dtype),
                     core_schema.no_info_plain_validator_function(validate_shape)
@@ -165,32 +183,203 @@ class NDArray(NPTypingType, metaclass=NDArrayMeta):
             )
         )
 
-class NDArrayProxy():
+class NDArrayProxy(NDArrayOperatorsMixin):
     """
     Thin proxy to numpy arrays stored within hdf5 files,
     only read into memory when accessed, but otherwise
     passthrough all attempts to access attributes.
+
+    Borrows a file handle from the process-wide :class:`.H5FilePool` rather
+    than opening the file on every access.
+
+    The array's ``shape`` , ``dtype`` , and ``chunks`` are read once and kept (in an :class:`.NDArrayInfo` ),
+    so they don't need the file at all. Reads of chunked arrays go through the process-wide
+    :class:`~nwb_linkml.types.hdf5.ChunkCache` a chunk at a time, so repeated or overlapping reads
+    don't read and decompress the same chunks again. Selections that aren't ints and slices,
+    or that are too big to cache, are read directly.
+
+    Proxies can be used with numpy functions, ufuncs, and operators without loading the whole array.
+    They are evaluated over a chunk-aligned dask array (see :meth:`.to_dask` ), a block at a time:
+
+    * Elementwise operations (eg. ``proxy * 2`` , ``np.sqrt(proxy)`` ) give a lazy dask array,
+      so they can be chained and reduced without holding the intermediate results in memory.
+    * Reductions and other numpy functions (eg. ``np.mean(proxy, axis=0)`` , ``np.add.reduce(proxy)`` )
+      are computed, giving numpy arrays like they do for numpy arrays.
+
+    Object arrays (eg. strings), which dask can't chunk, are loaded first.
+    ``np.asarray(proxy)`` loads the whole array.
     """
-    def __init__(self, h5f_file: Path|str, path: str):
+    def __init__(self, h5f_file: Path|str, path: str, info: Optional['NDArrayInfo'] = None):
         """
         Args:
-            h5f_file (:class:`pathlib.Path`): Path to source HDF5 file
+            h5f_file (:class:`pathlib.Path`): Path to source HDF5 file, or its URL if remote
             path (str): Location within HDF5 file where this array is located
+            info (:class:`.NDArrayInfo`): Description of the array, if already known.
+                Otherwise it's read from the file the first time it's needed.
         """
-        self.h5f_file = Path(h5f_file)
+        self.h5f_file = file_location(h5f_file)
         self.path = path
+        self._info = info
+
+    @classmethod
+    def from_dataset(cls, dset: h5py.Dataset) -> 'NDArrayProxy':
+        """Proxy an open dataset, keeping its metadata"""
+        return cls(h5f_file=dset.file.filename, path=dset.name, info=NDArrayInfo.from_dataset(dset))
+
+    @property
+    def info(self) -> 'NDArrayInfo':
+        """Description of the array"""
+        if self._info is None:
+            self._info = NDArrayInfo.from_dataset(self._dataset())
+        return self._info
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.info.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.info.dtype
+
+    @property
+    def chunks(self) -> Optional[Tuple[int, ...]]:
+        return self.info.chunks
+
+    @property
+    def ndim(self) -> int:
+        return self.info.ndim
+
+    @property
+    def size(self) -> int:
+        return self.info.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.info.nbytes
+
+    def __len__(self) -> int:
+        return len(self.info)
+
+    def to_dask(self, block_size: Optional[int] = None) -> DaskArray:
+        """
+        A dask array that reads this array through the proxy, in blocks that are whole numbers of its chunks.
+
+        Args:
+            block_size (int): Approximate number of bytes in each block. If ``None`` , use
+                :attr:`.Config.array_block_size` - when making many arrays, read it once and pass it here instead.
+
+        Raises:
+            NotImplementedError: for object arrays, which dask can't chunk automatically
+        """
+        if block_size is None:
+            block_size = Config().array_block_size
+        chunks = normalize_chunks(
+            'auto',
+            shape=self.shape,
+            dtype=self.dtype,
+            previous_chunks=self.chunks,
+            limit=block_size
+        )
+        return da.from_array(
+            self,
+            chunks=chunks,
+            name=f'proxy-{tokenize(str(self.h5f_file), self.path, chunks)}',
+            asarray=True,
+            meta=np.empty((0,) * self.ndim, dtype=self.dtype)
+        )
+
+    def __array__(self, dtype: Optional[np.dtype] = None) -> np.ndarray:
+        return np.asarray(self[()], dtype=dtype)
+
+    def __array_ufunc__(self, ufunc: np.ufunc, method: str, *inputs, **kwargs) -> Any:
+        if any(isinstance(o, NDArrayProxy) for o in kwargs.get('out', ())):
+            return NotImplemented
+        if method == '__call__':
+            # elementwise, keep it lazy for whatever comes next
+            return ufunc(*_as_blocks(inputs), **kwargs)
+        elif method == 'reduce' and ufunc in _REORDERABLE and len(inputs) == 1 and \
+                not ({'out', 'where', 'initial'} & set(kwargs.keys())):
+            return _reduce(ufunc, _as_blocks(inputs[0]), **kwargs)
+        else:
+            # accumulations, outer products, and so on need the whole array
+            return getattr(ufunc, method)(*_as_blocks(inputs, load=True), **kwargs)
+
+    def __array_function__(self, func: Callable, types: tuple, args: tuple, kwargs: dict) -> Any:
+        return dask.compute(func(*_as_blocks(args), **_as_blocks(kwargs)))[0]
 
     def __getattr__(self, item):
-        with h5py.File(self.h5f_file, 'r') as h5f:
-            obj = h5f.get(self.path)
-            return getattr(obj, item)
+        if item.startswith('__') or item in ('h5f_file', 'path', '_info'):
+            # don't open the file looking for dunder methods like __setstate__ when unpickling
+            raise AttributeError(item)
+        return getattr(self._dataset(), item)
+
     def __getitem__(self, slice) -> np.ndarray:
-        with h5py.File(self.h5f_file, 'r') as h5f:
-            obj = h5f.get(self.path)
+        selection = _box_selection(slice, self.shape)
+        cache = get_chunk_cache()
+        if self.chunks is None or self.dtype.kind == 'O' or selection is None or \
+                _skips_chunks(selection, self.chunks) or \
+                _chunks_nbytes(selection, self.chunks, self.dtype) > cache.size // 2:
+            pool = get_pool()
+            obj = self._dataset()
+            # fetch all the chunks of remote arrays at once, rather than as h5py reads them
+            pool.prefetch(self.h5f_file, obj, slice)
             return obj[slice]
+        return self._read_chunks(selection)
+
     def __setitem__(self, slice, value):
         raise NotImplementedError(f"Cant write into an arrayproxy yet!")
 
+    def _dataset(self) -> h5py.Dataset:
+        return get_pool().get(self.h5f_file).get(self.path)
+
+    def _read_chunks(self, selection: List[Tuple[int, int, int, bool]]) -> np.ndarray:
+        """
+        Assemble a selection from the cached chunks it overlaps, reading the missing ones
+        """
+        pool = get_pool()
+        cache = get_chunk_cache()
+        signature = pool.signature(self.h5f_file)
+        out = np.empty([len(range(start, stop, step)) for start, stop, step, _ in selection], dtype=self.dtype)
+        ranges = [
+            range(start // size, (stop - 1) // size + 1)
+            for (start, stop, _, _), size in zip(selection, self.chunks)
+        ]
+
+        missing = []
+        for index in product(*ranges):
+            chunk = cache.get((self.h5f_file, signature, self.path, index))
+            if chunk is None:
+                missing.append(index)
+            else:
+                self._place(out, chunk, index, selection)
+
+        if missing:
+            obj = self._dataset()
+            pool.prefetch(self.h5f_file, obj, tuple(slice(start, stop) for start, stop, _, _ in selection))
+            for index in missing:
+                chunk = obj[tuple(
+                    slice(i * size, min((i + 1) * size, n))
+                    for i, size, n in zip(index, self.chunks, self.shape)
+                )]
+                cache.put((self.h5f_file, signature, self.path, index), chunk)
+                self._place(out, chunk, index, selection)
+
+        result = out[tuple(0 if is_int else slice(None) for _, _, _, is_int in selection)]
+        return result[()] if result.ndim == 0 else result
+
+    def _place(self, out: np.ndarray, chunk: np.ndarray, index: Tuple[int, ...], selection: List[Tuple[int, int, int, bool]]):
+        """Copy the selected elements of a chunk into their place in the output"""
+        out_slices = []
+        chunk_slices = []
+        for i, size, (start, stop, step, _) in zip(index, self.chunks, selection):
+            lo = max(i * size, start)
+            hi = min((i + 1) * size, stop)
+            # first selected index within the chunk
+            first = start + -(-(lo - start) // step) * step
+            count = len(range(first, hi, step))
+            out_slices.append(slice((first - start) // step, (first - start) // step + count))
+            chunk_slices.append(slice(first - i * size, hi - i * size, step))
+        out[tuple(out_slices)] = chunk[tuple(chunk_slices)]
 
     @classmethod
     def __get_pydantic_core_schema__(
@@ -207,3 +396,239 @@ class NDArrayProxy():
         # )
 
         return NDArray_.__get_pydantic_core_schema__(cls, _source_type, _handler)
+
+
+class NDArrayInfo():
+    """
+    Description of an array stored within an hdf5 file - its shape, dtype, and
+    storage layout - without any of its data.
+
+    Used in place of an :class:`.NDArrayProxy` when reading metadata only
+    (see :attr:`.ReadOptions.arrays` ). Has a ``shape`` and ``dtype`` like
+    the array does, so it passes :class:`.NDArray` validation, and can be
+    turned into an :class:`.NDArrayProxy` with :meth:`.proxy` if the data
+    turns out to be needed after all.
+    """
+    def __init__(
+            self,
+            h5f_file: Path|str,
+            path: str,
+            shape: Tuple[int, ...],
+            dtype: np.dtype,
+            chunks: Optional[Tuple[int, ...]] = None,
+            compression: Optional[str] = None,
+            compression_opts: Any = None
+        ):
+        """
+        Args:
+            h5f_file (:class:`pathlib.Path`): Path to source HDF5 file
+            path (str): Location within HDF5 file where this array is located
+            shape (tuple): Shape of the array
+            dtype (:class:`numpy.dtype`): dtype of the array
+            chunks (tuple): Chunk shape, if the array is chunked
+            compression (str): Name of the compression filter, if any
+            compression_opts: Options for the compression filter
+        """
+        self.h5f_file = file_location(h5f_file)
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.chunks = tuple(chunks) if chunks is not None else None
+        self.compression = compression
+        self.compression_opts = compression_opts
+
+    @classmethod
+    def from_dataset(cls, dset: h5py.Dataset) -> 'NDArrayInfo':
+        """Describe an open dataset, reading only its metadata"""
+        return cls(
+            h5f_file=dset.file.filename,
+            path=dset.name,
+            shape=dset.shape,
+            dtype=dset.dtype,
+            chunks=dset.chunks,
+            compression=dset.compression,
+            compression_opts=dset.compression_opts
+        )
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the array in memory when loaded (rather than on disk)"""
+        return self.size * self.dtype.itemsize
+
+    def __len__(self) -> int:
+        if self.ndim == 0:
+            raise TypeError('len() of unsized object')
+        return self.shape[0]
+
+    def proxy(self) -> NDArrayProxy:
+        """Get an :class:`.NDArrayProxy` to load the described array"""
+        return NDArrayProxy(h5f_file=self.h5f_file, path=self.path, info=self)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable description of the array"""
+        return {
+            'hdf5_path': self.path,
+            'shape': list(self.shape),
+            'dtype': self.dtype.name,
+            'chunks': list(self.chunks) if self.chunks is not None else None,
+            'compression': self.compression
+        }
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, NDArrayInfo):
+            return NotImplemented
+        return self.__dict__ == other.__dict__
+
+    def __repr__(self) -> str:
+        return f"NDArrayInfo(path={self.path!r}, shape={self.shape}, dtype={self.dtype}, chunks={self.chunks}, compression={self.compression!r})"
+
+
+def _box_selection(key: Any, shape: Tuple[int, ...]) -> Optional[List[Tuple[int, int, int, bool]]]:
+    """
+    Normalize a selection of ints, slices with positive steps, and an ``Ellipsis`` into its bounding box -
+    ``(start, stop, step, is_int)`` for each dimension - or ``None`` if it's anything else or selects nothing.
+    """
+    if not isinstance(key, tuple):
+        key = (key,)
+    n_ellipsis = sum(k is Ellipsis for k in key)
+    if n_ellipsis > 1:
+        return None
+    n_missing = len(shape) - (len(key) - n_ellipsis)
+    if n_missing < 0:
+        return None
+    if n_ellipsis:
+        at = [i for i, k in enumerate(key) if k is Ellipsis][0]
+        key = key[:at] + (slice(None),) * n_missing + key[at + 1:]
+    else:
+        key = key + (slice(None),) * n_missing
+
+    selection = []
+    for k, n in zip(key, shape):
+        if isinstance(k, (int, np.integer)) and not isinstance(k, (bool, np.bool_)):
+            i = int(k) + n if k < 0 else int(k)
+            if not 0 <= i < n:
+                return None
+            selection.append((i, i + 1, 1, True))
+        elif isinstance(k, slice):
+            start, stop, step = k.indices(n)
+            if step < 1:
+                return None
+            count = len(range(start, stop, step))
+            if count == 0:
+                return None
+            selection.append((start, start + (count - 1) * step + 1, step, False))
+        else:
+            return None
+    return selection
+
+
+def _skips_chunks(selection: List[Tuple[int, int, int, bool]], chunks: Tuple[int, ...]) -> bool:
+    """
+    Whether a selection steps over whole chunks, so most of the chunks in its bounding box hold none of it
+    and caching the ones it does overlap would decompress far more than is selected
+    """
+    return any(step > size for (_, _, step, _), size in zip(selection, chunks))
+
+
+def _chunks_nbytes(selection: List[Tuple[int, int, int, bool]], chunks: Tuple[int, ...], dtype: np.dtype) -> int:
+    """Size of the chunks a selection overlaps, once they are decompressed"""
+    return int(np.prod([
+        ((stop - 1) // size - start // size + 1) * size
+        for (start, stop, _, _), size in zip(selection, chunks)
+    ])) * dtype.itemsize
+
+
+_REORDERABLE = {
+    np.add, np.multiply, np.maximum, np.minimum, np.fmax, np.fmin,
+    np.logical_and, np.logical_or, np.logical_xor, np.bitwise_and, np.bitwise_or, np.bitwise_xor
+}
+"""ufuncs whose reductions can be computed block by block and then combined"""
+
+
+def _as_blocks(value: Any, load: bool = False) -> Any:
+    """
+    Replace proxies (including within lists, tuples, and dicts) with their dask arrays,
+    or load them if ``load`` or they can't be chunked
+    """
+    if isinstance(value, NDArrayProxy):
+        if load:
+            return np.asarray(value)
+        try:
+            return value.to_dask()
+        except NotImplementedError:
+            return np.asarray(value)
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_as_blocks(v, load) for v in value)
+    elif isinstance(value, dict):
+        return {k: _as_blocks(v, load) for k, v in value.items()}
+    return value
+
+
+def _reduce(
+        ufunc: np.ufunc,
+        array: np.ndarray | DaskArray,
+        axis: Optional[int | Tuple[int, ...]] = 0,
+        dtype: Optional[np.dtype] = None,
+        keepdims: bool = False
+    ) -> np.ndarray:
+    """Reduce each block with a ufunc, then reduce the results"""
+    if not isinstance(array, DaskArray):
+        return ufunc.reduce(array, axis=axis, dtype=dtype, keepdims=keepdims)
+
+    def _reduce_block(block: np.ndarray, axis: Tuple[int, ...], keepdims: bool) -> np.ndarray:
+        return ufunc.reduce(block, axis=axis, dtype=dtype, keepdims=keepdims)
+
+    out_dtype = ufunc.reduce(np.ones((1,), dtype=array.dtype), dtype=dtype).dtype
+    return da.reduction(
+        array, _reduce_block, _reduce_block, axis=axis, keepdims=keepdims, dtype=out_dtype
+    ).compute()
+
+
+def lazy_array(
+        info: NDArrayInfo,
+        arrays: ArrayModes = 'proxy',
+        block_size: Optional[int] = None
+    ) -> NDArrayInfo | NDArrayProxy | DaskArray | np.ndarray:
+    """
+    Make the array for a dataset, the way the maps were asked to read it.
+
+    All maps make their arrays here, so every dataset read the same way gives the same kind of array.
+    The arrays are made from a description of the dataset, so (except for ``'load'`` ) the file doesn't need
+    to be touched to make them.
+
+    Args:
+        info (:class:`.NDArrayInfo`): Description of the dataset
+        arrays (str): How to read it -
+
+            * ``'skip'`` - just the :class:`.NDArrayInfo` description, without any data
+            * ``'proxy'`` - an :class:`.NDArrayProxy` that reads data when it's accessed
+            * ``'dask'`` - a dask array with blocks aligned to the dataset's chunks (see :meth:`.NDArrayProxy.to_dask` ).
+              Its tasks read through an :class:`.NDArrayProxy` , which opens the file by path,
+              so the array can be pickled and computed with the threaded or multiprocessing schedulers.
+              Object arrays (eg. strings), which dask can't chunk, are given as an :class:`.NDArrayProxy` instead.
+            * ``'load'`` - the whole array, loaded into memory
+        block_size (int): For dask arrays, the approximate number of bytes in each block,
+            see :meth:`.NDArrayProxy.to_dask`
+    """
+    if arrays == 'skip':
+        return info
+    proxy = info.proxy()
+    if arrays == 'proxy':
+        return proxy
+    elif arrays == 'dask':
+        try:
+            return proxy.to_dask(block_size)
+        except NotImplementedError:
+            return proxy
+    elif arrays == 'load':
+        return proxy[()]
+    else:
+        raise ValueError(f"arrays must be one of {ArrayModes.__args__}, got {arrays}")
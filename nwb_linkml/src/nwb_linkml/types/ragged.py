@@ -0,0 +1,208 @@
+"""
+Ragged arrays, like the columns of DynamicTables that are split into rows by a VectorIndex
+"""
+from typing import Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from nwb_linkml.types.ndarray import NDArrayInfo
+
+
+class RaggedArray:
+    """
+    A ragged array: flat ``data`` split into rows by an ``index`` of the offset where each row ends,
+    as hdmf stores ragged columns (a VectorData and its VectorIndex).
+
+    Row ``i`` is ``data[index[i-1]:index[i]]`` (starting from 0 for the first row). Getting one row is one read
+    of ``data`` - a view, with no copy, if ``data`` is a numpy array. Getting a batch of rows (a slice,
+    an array of row numbers, or a boolean mask) reads the span of ``data`` that covers them in one read,
+    then gathers them with offset arithmetic, giving another :class:`.RaggedArray` .
+
+    ``data`` can be anything sliceable like an array - a numpy array, an :class:`~nwb_linkml.types.ndarray.NDArrayProxy` ,
+    a dask array (giving lazy rows) - or another :class:`.RaggedArray` , for doubly-indexed columns
+    whose rows are lists of rows.
+
+    The index is read (once) the first time it's needed.
+    """
+
+    def __init__(self, data: Any, index: Any):
+        """
+        Args:
+            data: Flat values of all the rows
+            index: Offset in ``data`` of the end of each row
+        """
+        self.data = data
+        self.index = index
+        self._offsets: Optional[np.ndarray] = None
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Offsets of the start of each row and the end of the last row, so row ``i`` is ``data[offsets[i]:offsets[i+1]]``"""
+        if self._offsets is None:
+            if isinstance(self.index, NDArrayInfo):
+                raise ValueError("Can't split a ragged array by an index that wasn't read, read with arrays='proxy' or 'load'")
+            offsets = np.empty(len(self.index) + 1, dtype=np.int64)
+            offsets[0] = 0
+            offsets[1:] = np.asarray(self.index)
+            self._offsets = offsets
+        return self._offsets
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Length of each row"""
+        return np.diff(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, key: Any) -> Any:
+        offsets = self.offsets
+        if isinstance(key, (int, np.integer)):
+            row = int(key) + len(self) if key < 0 else int(key)
+            if not 0 <= row < len(self):
+                raise IndexError(f'row {key} is out of bounds for a ragged array with {len(self)} rows')
+            return self.data[offsets[row]:offsets[row + 1]]
+
+        if isinstance(key, slice) and key.step in (None, 1):
+            # contiguous rows are a contiguous span of the data
+            start, stop, _ = key.indices(len(self))
+            stop = max(start, stop)
+            lo = offsets[start]
+            return RaggedArray(self.data[lo:offsets[stop]], offsets[start + 1:stop + 1] - lo)
+
+        rows = np.arange(len(self))[key]
+        starts = offsets[rows]
+        lengths = offsets[rows + 1] - starts
+        ends = np.cumsum(lengths)
+        if len(rows) == 0 or ends[-1] == 0:
+            return RaggedArray(self.data[0:0], ends)
+        lo = starts.min()
+        block = self.data[lo:(starts + lengths).max()]
+        return RaggedArray(block[_spans(starts - lo, lengths)], ends)
+
+    def __iter__(self) -> Iterator[Any]:
+        # read everything once, rather than once per row
+        ragged = self[:]
+        offsets = ragged.offsets
+        for i in range(len(ragged)):
+            yield ragged.data[offsets[i]:offsets[i + 1]]
+
+    def tolist(self) -> List[Any]:
+        """Rows as (nested) lists"""
+        return [row.tolist() if hasattr(row, 'tolist') else list(row) for row in self]
+
+    def __repr__(self) -> str:
+        return f'RaggedArray(rows={len(self) if self._offsets is not None else "?"}, data={self.data!r})'
+
+
+class ReferencedValues:
+    """
+    The values referred to by the rows of a reference vector - ranges ``(start, count)`` of one or more
+    target arrays, like the ``(idx_start, count, timeseries)`` rows of a TimeSeriesReferenceVectorData -
+    flattened in row order, to use as the ``data`` of a :class:`.RaggedArray` split by :attr:`.index` .
+
+    Nothing is read until the values are sliced, and then only the ranges that overlap the slice are read:
+    grouped by target, with adjacent and overlapping ranges merged, so each target is read
+    in as few reads as possible rather than once per row.
+
+    Rows with no target (``None`` , eg. from null references) or a negative count are empty.
+    """
+
+    def __init__(self, targets: List[Any], target_index: Any, starts: Any, counts: Any):
+        """
+        Args:
+            targets: Arrays (or datasets) the rows refer to
+            target_index: Index in ``targets`` of each row's target
+            starts: Start of each row's range in its target
+            counts: Length of each row's range
+        """
+        self.targets = targets
+        self.target_index = np.asarray(target_index, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        counts = np.maximum(np.asarray(counts, dtype=np.int64), 0)
+        missing = np.array([t is None for t in targets], dtype=bool)
+        if missing.any():
+            counts[missing[self.target_index]] = 0
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    @property
+    def index(self) -> np.ndarray:
+        """Offset of the end of each row, to split these values with a :class:`.RaggedArray`"""
+        return self.offsets[1:]
+
+    @property
+    def dtype(self) -> np.dtype:
+        dtypes = [t.dtype for t in self.targets if t is not None]
+        return np.result_type(*dtypes) if dtypes else np.dtype(np.float64)
+
+    @property
+    def shape(self) -> tuple:
+        trailing = next((tuple(t.shape[1:]) for t in self.targets if t is not None), ())
+        return (len(self),) + trailing
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, key: Any) -> np.ndarray:
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            return self[:][key]
+
+        lo, hi, _ = key.indices(len(self))
+        hi = max(lo, hi)
+        out = np.empty((hi - lo,) + self.shape[1:], dtype=self.dtype)
+
+        # the part of each row that overlaps the slice
+        offsets = self.offsets
+        rows = np.arange(np.searchsorted(offsets, lo, side='right') - 1, np.searchsorted(offsets, hi, side='left'))
+        seg_lo = np.maximum(offsets[rows], lo)
+        seg_hi = np.minimum(offsets[rows + 1], hi)
+        keep = seg_hi > seg_lo
+        rows, seg_lo, seg_hi = rows[keep], seg_lo[keep], seg_hi[keep]
+
+        lengths = seg_hi - seg_lo
+        sources = self.starts[rows] + seg_lo - offsets[rows]
+        targets = self.target_index[rows]
+        for target in np.unique(targets):
+            mask = targets == target
+            block, positions = _read_merged(self.targets[target], sources[mask], lengths[mask])
+            out[_spans(seg_lo[mask] - lo, lengths[mask])] = block[_spans(positions, lengths[mask])]
+        return out
+
+    def __array__(self, dtype: Optional[np.dtype] = None) -> np.ndarray:
+        return np.asarray(self[:], dtype=dtype)
+
+    def __repr__(self) -> str:
+        return f'ReferencedValues(rows={len(self.offsets) - 1}, targets={len(self.targets)})'
+
+
+def _spans(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Positions of every item in the spans ``[start, start+length)`` , concatenated in order"""
+    ends = np.cumsum(lengths)
+    if len(ends) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1])
+
+
+def _read_merged(target: Any, starts: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read ranges of ``target`` , merging ranges that touch or overlap into one read.
+
+    Returns:
+        The concatenated values that were read, and the position of each range within them
+    """
+    order = np.argsort(starts, kind='stable')
+    lo = starts[order]
+    hi = lo + lengths[order]
+    # a range starts a new read if it starts after every range before it has ended
+    new = np.ones(len(lo), dtype=bool)
+    new[1:] = lo[1:] > np.maximum.accumulate(hi)[:-1]
+    read_lo = lo[new]
+    read_hi = np.maximum.reduceat(hi, np.flatnonzero(new))
+    block = np.concatenate([np.asarray(target[a:b]) for a, b in zip(read_lo, read_hi)])
+
+    read_offsets = np.concatenate([[0], np.cumsum(read_hi - read_lo)[:-1]]).astype(np.int64)
+    read = np.cumsum(new) - 1
+    positions = np.empty(len(starts), dtype=np.int64)
+    positions[order] = read_offsets[read] + lo - read_lo[read]
+    return block, positions
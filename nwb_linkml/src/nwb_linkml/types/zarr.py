@@ -0,0 +1,365 @@
+"""
+Read-only views of NWB Zarr stores (as written by `hdmf-zarr <https://hdmf-zarr.readthedocs.io/en/latest/storage.html>`_ )
+that look like :mod:`h5py` files, so the maps in :mod:`nwb_linkml.maps.hdf5` can read them unchanged.
+
+The :class:`~nwb_linkml.types.hdf5.H5FilePool` opens paths and URLs to zarr stores (see :func:`.is_zarr` )
+with :func:`.open_zarr` , which gives a :class:`.ZarrFile` in place of an :class:`h5py.File` .
+
+The views handle the ways NWB Zarr differs from NWB HDF5:
+
+* **References** - Object references are stored as JSON objects with the ``path`` of the referenced object,
+  both in attributes (wrapped as ``{"zarr_dtype": "object", "value": {...}}`` ) and in datasets of references
+  (with the ``zarr_dtype`` attribute ``"object"`` ). Both are read as :class:`~nwb_linkml.types.hdf5.HDF5_Path` s,
+  like the maps get from dereferencing hdf5 references.
+* **Links** - Soft links are stored in the ``zarr_link`` attribute of the group that contains them,
+  and are followed like hdf5 soft links. Links to other files aren't supported.
+* **Scalars** - Scalar datasets are stored as arrays with a single item and the ``zarr_dtype`` attribute ``"scalar"`` ,
+  and are read with shape ``()`` .
+* **Strings** - Strings are read as ``bytes`` , like h5py reads variable-length strings.
+* **Compound datasets** - Compound datasets are stored as arrays of lists, with their fields listed in the ``zarr_dtype``
+  attribute, and are read as numpy structured arrays.
+
+Zarr has no hard links, so every object has exactly one path.
+
+`zarr <https://zarr.readthedocs.io>`_ (version 2) must be installed to read zarr stores.
+"""
+import posixpath
+import warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from nwb_linkml.types.hdf5 import HDF5_Path
+
+ZARR_ATTRS = ('zarr_dtype', 'zarr_link')
+"""Attributes used by hdmf-zarr to store things hdf5 has built in, which are hidden from the maps"""
+
+
+class ZarrNode:
+    """
+    A zarr group or array, with the parts of the :mod:`h5py` object interface used while reading
+    """
+
+    def __init__(self, obj: Any, file: Optional['ZarrFile'] = None):
+        self._obj = obj
+        self.file: 'ZarrFile' = file if file is not None else self
+        self._attrs: Optional[Dict[str, Any]] = None
+
+    @property
+    def name(self) -> str:
+        """Absolute path of the node within the store"""
+        return '/' + self._obj.path.strip('/')
+
+    @property
+    def attrs(self) -> Dict[str, Any]:
+        """Attributes, with references replaced by the paths they refer to and hdmf-zarr's own attributes hidden"""
+        if self._attrs is None:
+            self._attrs = {
+                k: _decode_attr(v) for k, v in self._obj.attrs.asdict().items() if k not in ZARR_ATTRS
+            }
+        return self._attrs
+
+    @property
+    def parent(self) -> 'ZarrGroup':
+        return self.file[posixpath.dirname(self.name)]
+
+    @property
+    def ref(self) -> str:
+        """
+        Zarr has no references of its own, so an object's reference is its path,
+        and ``obj.file[obj.ref]`` gets the object back like it does in h5py
+        """
+        return self.name
+
+    def __repr__(self) -> str:
+        return f'<{type(self).__name__} "{self.name}">'
+
+
+class ZarrDataset(ZarrNode):
+    """
+    A zarr array that looks like an :class:`h5py.Dataset`
+    """
+
+    @property
+    def zarr_dtype(self) -> Optional[Any]:
+        return self._obj.attrs.get('zarr_dtype', None)
+
+    @property
+    def is_scalar(self) -> bool:
+        return self.zarr_dtype == 'scalar' or self._obj.shape == ()
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return () if self.is_scalar else tuple(self._obj.shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        if isinstance(self.zarr_dtype, list):
+            return np.dtype([(field['name'], _field_dtype(field['dtype'])) for field in self.zarr_dtype])
+        return self._obj.dtype
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    @property
+    def chunks(self) -> Optional[Tuple[int, ...]]:
+        return None if self.is_scalar else tuple(self._obj.chunks)
+
+    @property
+    def compression(self) -> Optional[str]:
+        compressor = self._obj.compressor
+        return None if compressor is None else compressor.codec_id
+
+    @property
+    def compression_opts(self) -> Optional[dict]:
+        compressor = self._obj.compressor
+        if compressor is None:
+            return None
+        return {k: v for k, v in compressor.get_config().items() if k != 'id'}
+
+    def __len__(self) -> int:
+        if self.is_scalar:
+            raise TypeError('Attempt to take len() of scalar dataset')
+        return self.shape[0]
+
+    def __getitem__(self, key: Any) -> Any:
+        if self.is_scalar:
+            value = self._obj[0] if self._obj.shape != () else self._obj[()]
+            return _decode_value(value, self.zarr_dtype == 'object')
+        if isinstance(key, tuple) and key == ():
+            key = slice(None)
+        data = self._obj[key]
+        if isinstance(data, np.ndarray) and data.dtype.kind != 'O':
+            return data
+        if isinstance(self.zarr_dtype, list):
+            return _decode_compound(data, self.dtype)
+        return _decode_value(data, self.zarr_dtype == 'object')
+
+    def __array__(self, dtype: Optional[np.dtype] = None) -> np.ndarray:
+        return np.asarray(self[()], dtype=dtype)
+
+
+class ZarrGroup(ZarrNode):
+    """
+    A zarr group that looks like an :class:`h5py.Group` , with soft links from its ``zarr_link`` attribute
+    """
+
+    @property
+    def links(self) -> Dict[str, HDF5_Path]:
+        """Soft links in this group, from their names to the paths they point to"""
+        links = {}
+        for link in self._obj.attrs.get('zarr_link', []):
+            if link.get('source', '.') not in ('.', ''):
+                warnings.warn(f"Links to other files aren't supported, skipping {link['name']} in {self.name}")
+                continue
+            links[link['name']] = HDF5_Path(posixpath.normpath(posixpath.join(self.name, link['path'])))
+        return links
+
+    def members(self) -> Iterator[ZarrNode]:
+        """The groups and arrays in this group, not including links"""
+        for name in self._obj.keys():
+            yield self._wrap(self._obj[name])
+
+    def keys(self) -> List[str]:
+        return list(self._obj.keys()) + [k for k in self.links.keys() if k not in self._obj]
+
+    def values(self) -> List[ZarrNode]:
+        return [self[k] for k in self.keys()]
+
+    def items(self) -> List[Tuple[str, ZarrNode]]:
+        return [(k, self[k]) for k in self.keys()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: str) -> ZarrNode:
+        node = self.get(key)
+        if node is None:
+            raise KeyError(f'{key} not found in {self.name}')
+        return node
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get a child by relative or absolute path, following links
+        """
+        key = str(key)
+        if key.startswith('/'):
+            group, parts = self.file, [p for p in key.split('/') if p]
+        else:
+            group, parts = self, [p for p in key.split('/') if p]
+        node = group
+        for part in parts:
+            if not isinstance(node, ZarrGroup):
+                return default
+            node = node._child(part)
+            if node is None:
+                return default
+        return node
+
+    def visititems(self, func: Callable[[str, ZarrNode], Optional[Any]]) -> Optional[Any]:
+        """Like :meth:`h5py.Group.visititems` - call ``func(name, node)`` on everything below this group, not following links"""
+        stack = list(self.members())
+        while stack:
+            node = stack.pop(0)
+            result = func(node.name[len(self.name):].lstrip('/'), node)
+            if result is not None:
+                return result
+            if isinstance(node, ZarrGroup):
+                stack.extend(node.members())
+        return None
+
+    def _child(self, name: str) -> Optional[ZarrNode]:
+        if name in self._obj:
+            return self._wrap(self._obj[name])
+        target = self.links.get(name, None)
+        if target is not None:
+            return self.file.get(target)
+        return None
+
+    def _wrap(self, obj: Any) -> ZarrNode:
+        if hasattr(obj, 'shape'):
+            return ZarrDataset(obj, self.file)
+        return ZarrGroup(obj, self.file)
+
+
+class ZarrFile(ZarrGroup):
+    """
+    The root group of a zarr store, standing in for an :class:`h5py.File`
+    """
+
+    def __init__(self, obj: Any, filename: str):
+        super().__init__(obj)
+        self.filename = filename
+
+    @property
+    def name(self) -> str:
+        return '/'
+
+    def close(self):
+        """Zarr stores don't hold anything open"""
+        pass
+
+
+def open_zarr(location: Path | str) -> ZarrFile:
+    """
+    Open a zarr store read-only as a :class:`.ZarrFile` , using its consolidated metadata if it has any.
+
+    Args:
+        location (:class:`pathlib.Path` , str): Path or URL (with any protocol fsspec understands) to the store
+    """
+    try:
+        import zarr
+    except ImportError as e:
+        raise ImportError('zarr is needed to read NWB Zarr files, install it with `pip install "nwb-linkml[zarr]"`') from e
+    try:
+        root = zarr.open_consolidated(str(location), mode='r')
+    except KeyError:
+        # no consolidated metadata
+        root = zarr.open_group(str(location), mode='r')
+    return ZarrFile(root, str(location))
+
+
+def _is_reference(value: Any) -> bool:
+    return isinstance(value, dict) and 'path' in value and 'source' in value
+
+
+def _decode_reference(value: dict) -> Optional[HDF5_Path]:
+    if value.get('source', '.') not in ('.', ''):
+        warnings.warn(f"References to other files aren't supported, skipping reference to {value['path']}")
+        return None
+    return HDF5_Path('/' + value['path'].strip('/'))
+
+
+def _decode_attr(value: Any) -> Any:
+    if isinstance(value, dict) and value.get('zarr_dtype', None) == 'object':
+        value = value['value']
+        if isinstance(value, list):
+            return [_decode_reference(v) for v in value]
+        return _decode_reference(value)
+    if isinstance(value, list) and len(value) > 0 and all(isinstance(v, (int, float, bool)) for v in value):
+        return np.array(value)
+    return value
+
+
+def _field_dtype(dtype: str) -> np.dtype:
+    try:
+        dtype = np.dtype(dtype)
+    except TypeError:
+        # references, strings
+        return np.dtype('O')
+    return np.dtype('O') if dtype.kind in ('U', 'S') else dtype
+
+
+def _decode_compound(data: Any, dtype: np.dtype) -> Any:
+    """Rows of a compound dataset to a structured array (or a single row to a tuple), a field at a time"""
+    if not isinstance(data, np.ndarray):
+        return tuple(_decode_value(v, True) for v in data)
+    # rows of equal length may have been decoded as an extra dimension rather than as lists
+    if data.ndim > 1 and data.shape[-1] == len(dtype.names):
+        shape = data.shape[:-1]
+        rows = data.reshape(-1, len(dtype.names))
+    else:
+        shape = data.shape
+        try:
+            rows = np.array(data.ravel().tolist(), dtype=object)
+        except ValueError:
+            rows = None
+        if rows is None or rows.shape != (data.size, len(dtype.names)):
+            # fields that are sequences themselves, which numpy would make into more dimensions
+            rows = np.empty((data.size, len(dtype.names)), dtype=object)
+            for i, row in enumerate(data.ravel()):
+                for j, value in enumerate(row):
+                    rows[i, j] = value
+    decoded = np.empty(rows.shape[0], dtype=dtype)
+    for i, name in enumerate(dtype.names):
+        if dtype[name].kind == 'O':
+            decoded[name] = _decode_column(rows[:, i])
+        else:
+            decoded[name] = rows[:, i]
+    return decoded.reshape(shape)
+
+
+def _decode_column(column: np.ndarray) -> np.ndarray:
+    """
+    Decode an object field of a compound dataset in one pass over its values,
+    decoding each distinct reference once rather than once for every row that refers to it
+    """
+    references = {}
+
+    def _decode(value: Any) -> Any:
+        if not _is_reference(value):
+            return _decode_value(value, True)
+        key = (value['source'], value['path'])
+        if key not in references:
+            references[key] = _decode_reference(value)
+        return references[key]
+
+    return np.frompyfunc(_decode, 1, 1)(column)
+
+
+def _decode_value(value: Any, references: bool = False) -> Any:
+    """Turn references into :class:`.HDF5_Path` s and strings into ``bytes`` , like h5py reads them"""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind != 'O':
+            return value
+        decoded = np.empty(value.shape, dtype=object)
+        for index, item in np.ndenumerate(value):
+            decoded[index] = _decode_value(item, references)
+        return decoded
+    if references and _is_reference(value):
+        return _decode_reference(value)
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return value
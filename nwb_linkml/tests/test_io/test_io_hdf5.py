@@ -1,14 +1,21 @@
 import pdb
+import posixpath
+import subprocess
+import sys
+
 import h5py
 
 import pytest
 from pathlib import Path
+from typing import Any
 import numpy as np
+from pydantic import BaseModel
 
 from ..fixtures import tmp_output_dir, data_dir
 
 from nwb_linkml.io.hdf5 import HDF5IO
 from nwb_linkml.io.hdf5 import truncate_file
+from nwb_linkml.io.write import ModelWriter
 
 
 @pytest.mark.parametrize('dset', ['aibs.nwb'])
@@ -18,6 +25,206 @@ def test_hdf_read(data_dir, dset):
     # the test for now is just whether we can read it lol
     model = io.read()
 
+_READ_EXECUTORS = """
+import sys
+import numpy as np
+from nwb_linkml.io.hdf5 import HDF5IO
+
+io = HDF5IO(path=sys.argv[1])
+parallel = io.read(executor=sys.argv[2], workers=4)
+serial = io.read()
+
+assert type(parallel) is type(serial)
+assert parallel.acquisition.keys() == serial.acquisition.keys()
+assert parallel.intervals.keys() == serial.intervals.keys()
+assert parallel.processing.keys() == serial.processing.keys()
+assert np.array_equal(
+    parallel.acquisition['raw_running_wheel_rotation'].data.array[:],
+    serial.acquisition['raw_running_wheel_rotation'].data.array[:]
+)
+assert np.array_equal(parallel.units.spike_times[:], serial.units.spike_times[:])
+"""
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_hdf_read_executors(data_dir, executor):
+    """
+    Reading with parallel executors should give the same models as a serial read,
+    even when the parallel read is the first in a process and nothing has imported the models yet
+    """
+    res = subprocess.run(
+        [sys.executable, '-c', _READ_EXECUTORS, str(data_dir / 'aibs.nwb'), executor],
+        capture_output=True, text=True
+    )
+    assert res.returncode == 0, res.stderr
+
+def test_hdf_read_arrays(data_dir):
+    """
+    Reading with ``arrays='skip'`` should describe arrays without reading them,
+    and ``arrays='load'`` should load them into memory
+    """
+    from nwb_linkml.types.ndarray import NDArrayInfo, NDArrayProxy
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    proxied = io.read()
+    skipped = io.read(arrays='skip')
+    loaded = io.read(arrays='load')
+
+    assert type(skipped) is type(proxied)
+    assert skipped.acquisition.keys() == proxied.acquisition.keys()
+    assert skipped.file_create_date == proxied.file_create_date
+
+    proxy = proxied.acquisition['raw_running_wheel_rotation'].data.array
+    info = skipped.acquisition['raw_running_wheel_rotation'].data.array
+    array = loaded.acquisition['raw_running_wheel_rotation'].data.array
+    assert isinstance(proxy, NDArrayProxy)
+    assert isinstance(info, NDArrayInfo)
+    assert isinstance(array, np.ndarray)
+    assert info.shape == proxy.shape
+    assert info.dtype == proxy.dtype
+    assert info.chunks == proxy.chunks
+    assert info.compression == proxy.compression
+    assert np.array_equal(info.proxy()[:], array)
+
+    # dynamictable columns too
+    assert isinstance(skipped.units.spike_times, NDArrayInfo)
+    assert skipped.units.spike_times.shape == proxied.units.spike_times.shape
+    assert isinstance(loaded.units.spike_times, np.ndarray)
+    assert np.array_equal(loaded.units.spike_times, proxied.units.spike_times[:])
+
+    # or everything as dask arrays
+    from dask.array.core import Array as DaskArray
+    dasked = io.read(arrays='dask')
+    assert isinstance(dasked.acquisition['raw_running_wheel_rotation'].data.array, DaskArray)
+    assert isinstance(dasked.units.spike_times, DaskArray)
+    assert np.array_equal(dasked.acquisition['raw_running_wheel_rotation'].data.array.compute(), array, equal_nan=True)
+
+def test_hdf_read_lazy(data_dir):
+    """
+    Lazy reads should leave placeholders for models that are read when they are first used
+    """
+    from nwb_linkml.types.hdf5 import LazyModel
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    full = io.read()
+    lazy = io.read(lazy=True)
+
+    assert type(lazy) is type(full)
+    assert lazy.acquisition.keys() == full.acquisition.keys()
+
+    series = lazy.acquisition['running_wheel_signal_voltage']
+    full_series = full.acquisition['running_wheel_signal_voltage']
+    assert isinstance(series, LazyModel)
+    assert isinstance(series, type(full_series))
+    # known fields don't trigger a read
+    assert series.name == 'running_wheel_signal_voltage'
+    assert isinstance(series, LazyModel)
+
+    # but anything else does, and the placeholder becomes the real model
+    assert series.description == full_series.description
+    assert type(series) is type(full_series)
+    assert not isinstance(series, LazyModel)
+    # including data hardlinked from outside the group
+    assert np.array_equal(series.timestamps[:], full_series.timestamps[:])
+    assert np.array_equal(series.data.array[:], full_series.data.array[:], equal_nan=True)
+
+    # dynamictables too
+    assert isinstance(lazy.units, LazyModel)
+    assert np.array_equal(lazy.units.spike_times[:], full.units.spike_times[:])
+    assert type(lazy.units).__name__ == type(full.units).__name__
+
+@pytest.mark.parametrize('release', [True, False])
+def test_hdf_iter_read(data_dir, release):
+    """
+    Iterating reads should yield each model after the models it contains, ending with the same model as a full read
+    """
+    from nwb_linkml.types.hdf5 import LazyModel
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    full = io.read()
+
+    yielded = {}
+    for path, model in io.iter_read(release=release):
+        assert path not in yielded
+        yielded[path] = model
+
+    paths = list(yielded.keys())
+    assert paths[-1] == '/'
+    assert paths.index('/acquisition/running_wheel_signal_voltage') < paths.index('/')
+    assert paths.index('/processing/running/running_speed') < paths.index('/processing/running')
+
+    root = yielded['/']
+    assert type(root) is type(full)
+    series = root.acquisition['running_wheel_signal_voltage']
+    if release:
+        # the file holds placeholders that read the model again if it's used
+        assert isinstance(series, LazyModel)
+        assert series is not yielded['/acquisition/running_wheel_signal_voltage']
+    else:
+        assert series is yielded['/acquisition/running_wheel_signal_voltage']
+    assert np.array_equal(series.data.array[:], full.acquisition['running_wheel_signal_voltage'].data.array[:], equal_nan=True)
+
+def test_hdf_read_selection(data_dir):
+    """
+    Partial reads should only read the selected parts of the file
+    """
+    from nwb_linkml.maps.hdf5 import has_type
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    full = io.read()
+
+    model = io.read(include='/acquisition/running_wheel_signal_voltage')
+    assert list(model.acquisition.keys()) == ['running_wheel_signal_voltage']
+    assert len(model.processing) == 0
+    assert model.units is None
+    # hardlinked data from outside the selection should still be read
+    series = model.acquisition['running_wheel_signal_voltage']
+    full_series = full.acquisition['running_wheel_signal_voltage']
+    assert np.array_equal(series.timestamps[:], full_series.timestamps[:])
+
+    model = io.read(include=has_type('TimeIntervals'), exclude='/intervals/natural*')
+    assert sorted(model.intervals.keys()) == sorted([k for k in full.intervals.keys() if not k.startswith('natural')])
+    assert len(model.acquisition) == 0
+
+    model = io.read(include='/processing/*/pupil*/**')
+    assert sorted(model.processing.keys()) == ['eye_tracking', 'filtered_gaze_mapping', 'raw_gaze_mapping']
+    assert list(model.processing['eye_tracking'].children.keys()) == ['pupil_ellipse_fits']
+
+    # selections that match nothing give the file's own metadata and nothing else
+    for include in ('/nothing/here', has_type('ImageSeries')):
+        model = io.read(include=include)
+        assert model.identifier == full.identifier
+        assert model.session_start_time == full.session_start_time
+        assert len(model.acquisition) == 0
+        assert len(model.processing) == 0
+
+def test_hdf_read_validate(data_dir):
+    """
+    Reads with deferred validation should make the same models, and be validated when asked
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from nwb_linkml.maps.hdf5 import validate_model
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    eager = io.read()
+    deferred = io.read(validate='deferred')
+    off = io.read(validate='off')
+
+    for model in (deferred, off):
+        assert type(model) is type(eager)
+        assert model.session_start_time == eager.session_start_time
+        assert type(model.general) is type(eager.general)
+        series = model.acquisition['raw_running_wheel_rotation']
+        assert type(series.data) is type(eager.acquisition['raw_running_wheel_rotation'].data)
+        assert np.array_equal(series.data.array[:], eager.acquisition['raw_running_wheel_rotation'].data.array[:], equal_nan=True)
+
+    # values are only converted by validation
+    assert isinstance(deferred.file_create_date, list)
+    validated = validate_model(deferred)
+    assert validated is not deferred
+    assert np.array_equal(validated.file_create_date, eager.file_create_date)
+    with ThreadPoolExecutor() as executor:
+        assert np.array_equal(validate_model(deferred, executor=executor).result().file_create_date, eager.file_create_date)
+
+    # models that were validated or read without validation are left alone
+    assert validate_model(eager) is eager
+    assert validate_model(off) is off
+
+
 def test_truncate_file(tmp_output_dir):
     source = tmp_output_dir / 'truncate_source.hdf5'
 
@@ -87,3 +294,282 @@ def test_flatten_hdf():
     pdb.set_trace()
     raise NotImplementedError('Just a stub for local testing for now, finish me!')
 
+
+def test_hdf_read_opens_once(data_dir):
+    """
+    Reading a file should borrow handles from the pool rather than reopening the file for every node
+    """
+    from nwb_linkml.types.hdf5 import get_pool
+    NWBFILE = data_dir / 'aibs.nwb'
+    pool = get_pool()
+    pool.close(NWBFILE)
+    opened = pool.opened
+
+    io = HDF5IO(path=NWBFILE)
+    model = io.read()
+    # array proxies should use the same handle as the read
+    _ = model.acquisition['raw_running_wheel_rotation'].data.array[0:5]
+    assert pool.opened - opened == 1
+
+
+def test_make_provider_cached(data_dir, monkeypatch):
+    """
+    Files with the same embedded specifications should reuse the provider, within and between processes
+    """
+    import nwb_linkml.io.hdf5
+    from nwb_linkml.config import Config
+
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    provider = io.make_provider()
+    assert io.make_provider() is provider
+
+    # the specifications have been recorded as built
+    from nwb_linkml.types.hdf5 import get_pool
+    specs_hash = nwb_linkml.io.hdf5.hash_specs(get_pool().get(io.path)['specifications'])
+    assert (Config().specs_dir / f'{specs_hash}.json').exists()
+
+    # a new process shouldn't need to translate the specifications again
+    monkeypatch.setattr(nwb_linkml.io.hdf5, '_PROVIDERS', {})
+    def _fail(*args, **kwargs):
+        raise AssertionError('Specifications should not be read again')
+    monkeypatch.setattr(nwb_linkml.io.hdf5, 'read_specs_as_dicts', _fail)
+    cached = io.make_provider()
+    assert cached is not provider
+    assert cached.versions == provider.versions
+    assert cached.get_class('core', 'NWBFile') is provider.get_class('core', 'NWBFile')
+
+
+def test_hdf_write_roundtrip(data_dir, tmp_output_dir):
+    """
+    Models written with :meth:`.HDF5IO.write` should read back the same as they were read
+    """
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    model = io.read()
+    out = HDF5IO(path=tmp_output_dir / 'roundtrip.nwb')
+    out.write(model)
+    written = out.read()
+
+    assert type(written) is type(model)
+    assert written.acquisition.keys() == model.acquisition.keys()
+    assert written.processing.keys() == model.processing.keys()
+    assert written.file_create_date == model.file_create_date
+    for key, series in model.acquisition.items():
+        assert np.array_equal(written.acquisition[key].data.array[:], series.data.array[:], equal_nan=True)
+        assert written.acquisition[key].description == series.description
+    assert np.array_equal(written.units.spike_times[:], model.units.spike_times[:])
+
+    with h5py.File(tmp_output_dir / 'roundtrip.nwb', 'r') as h5f:
+        assert 'specifications' in h5f
+        assert h5f[h5f.attrs['.specloc']].name == '/specifications'
+
+
+def _h5_structure(group: h5py.Group, structure: dict = None) -> dict:
+    """
+    Every path below a group, including every hard and soft link, as ``'group'`` , ``'dataset'`` , or ``'attr'``
+    (attributes as ``path@name`` ), except the ``/specifications``
+    """
+    if structure is None:
+        structure = {f'/@{name}': 'attr' for name in group.attrs}
+    for name in group:
+        path = posixpath.join(group.name, name)
+        if path == '/specifications':
+            continue
+        obj = group.get(name)
+        if obj is None:
+            continue
+        structure[path] = 'group' if isinstance(obj, h5py.Group) else 'dataset'
+        structure.update({f'{path}@{attr}': 'attr' for attr in obj.attrs})
+        if isinstance(obj, h5py.Group) and isinstance(group.get(name, getlink=True), h5py.HardLink):
+            _h5_structure(obj, structure)
+    return structure
+
+
+def test_hdf_write_roundtrip_structure(data_dir, tmp_output_dir):
+    """
+    A file that was read and written again should store everything that was read the same way:
+    attributes as attributes, datasets as datasets, and the groups the schema requires even when they're empty.
+    """
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    model = io.read()
+    out_path = tmp_output_dir / 'roundtrip_structure.nwb'
+    HDF5IO(path=out_path).write(model)
+
+    with h5py.File(data_dir / 'aibs.nwb', 'r') as source, h5py.File(out_path, 'r') as written:
+        source_structure = _h5_structure(source)
+        written_structure = _h5_structure(written)
+
+        # nothing is written that wasn't in the file, or written as a different kind of thing
+        assert {
+            path: (source_structure.get(path, None), kind) for path, kind in written_structure.items()
+            if source_structure.get(path, None) != kind
+        } == {}
+
+        # scalars the schema says are datasets
+        for path in (
+            '/identifier', '/session_description', '/session_start_time', '/timestamps_reference_time',
+            '/general/subject/species', '/general/subject/genotype', '/general/subject/subject_id'
+        ):
+            assert written_structure[path] == 'dataset'
+            assert f'/@{path[1:]}' not in written_structure
+        # dataset attributes that are fixed by the schema
+        assert written['/acquisition/raw_running_wheel_rotation/timestamps'].attrs['unit'] == 'seconds'
+
+        # required groups, even though they're empty
+        for path in ('/analysis', '/stimulus/presentation', '/stimulus/templates'):
+            assert written_structure[path] == 'group'
+            assert len(written[path]) == 0
+
+        # reference columns, which are compound
+        for table in ('/intervals/flashes_presentations', '/processing/optotagging/optogenetic_stimulation'):
+            for column in ('timeseries', 'timeseries_index'):
+                assert written_structure[f'{table}/{column}'] == 'dataset'
+                assert written[f'{table}/{column}'].attrs['neurodata_type'] == \
+                       source[f'{table}/{column}'].attrs['neurodata_type']
+            assert 'timeseries' in [c.decode('utf-8') if isinstance(c, bytes) else c
+                                    for c in written[table].attrs['colnames']]
+            source_rows = source[f'{table}/timeseries'][:10]
+            written_rows = written[f'{table}/timeseries'][:10]
+            assert np.array_equal(written_rows['idx_start'], source_rows['idx_start'])
+            assert np.array_equal(written_rows['count'], source_rows['count'])
+            # the series are truncated out of the test file, so the references stay empty
+            assert [_ref_name(written, ref) for ref in written_rows['timeseries']] == \
+                   [_ref_name(source, ref) for ref in source_rows['timeseries']]
+
+
+def _ref_name(h5f: h5py.File, ref: h5py.Reference):
+    try:
+        return h5f[ref].name
+    except (KeyError, ValueError):
+        return None
+
+
+def test_hdf_write_compound_references(tmp_output_dir):
+    """
+    References in compound datasets copied from another file should point to the same objects in the new file
+    """
+    class Holder(BaseModel):
+        target: Any
+        compound: Any
+
+    source_path = tmp_output_dir / 'compound_source.h5'
+    out_path = tmp_output_dir / 'compound_written.h5'
+    compound_dtype = np.dtype([('idx', np.int32), ('ref', h5py.ref_dtype)])
+    with h5py.File(source_path, 'w') as h5f:
+        target = h5f.create_dataset('/target', data=np.arange(5))
+        h5f.create_dataset('/compound', data=np.array([(0, target.ref), (1, h5py.Reference())], dtype=compound_dtype))
+
+    with h5py.File(source_path, 'r') as source, h5py.File(out_path, 'w') as h5f:
+        ModelWriter(h5f).write(Holder(target=source['/target'], compound=source['/compound']))
+
+    with h5py.File(out_path, 'r') as h5f:
+        rows = h5f['/compound'][()]
+        assert rows['idx'].tolist() == [0, 1]
+        assert h5f[rows['ref'][0]].name == '/target'
+        assert np.array_equal(h5f[rows['ref'][0]][:], np.arange(5))
+        assert not rows['ref'][1]
+
+
+def test_hdf_write_streaming(data_dir, tmp_output_dir):
+    """
+    Large and iterated arrays should be written in chunk-aligned blocks, and the same array
+    written twice should be hardlinked rather than copied
+    """
+    import dask.array as da
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    series = io.read(include='/acquisition/raw_running_wheel_rotation').acquisition['raw_running_wheel_rotation']
+
+    big = da.arange(100_000, chunks=30_000, dtype=np.float64)
+    timestamps = np.arange(100_000, dtype=np.float64)
+    series = series.model_copy(update={
+        'data': series.data.model_copy(update={'array': big}),
+        'timestamps': timestamps,
+    })
+    out_path = tmp_output_dir / 'streaming.nwb'
+    HDF5IO(path=out_path).write(
+        series, path='/series', specifications=data_dir / 'aibs.nwb', chunks=(10_000,), block_size=80_000
+    )
+
+    with h5py.File(out_path, 'r') as h5f:
+        data = h5f['/series/data']
+        assert data.chunks == (10_000,)
+        assert data.compression == 'gzip'
+        assert np.array_equal(data[:], np.arange(100_000))
+        assert np.array_equal(h5f['/series/timestamps'][:], timestamps)
+        assert h5f['/series'].attrs['neurodata_type'] == 'TimeSeries'
+
+    # iterators of blocks are appended as they come
+    blocks = (np.full(1_000, i, dtype=np.int32) for i in range(5))
+    iterated = series.model_copy(update={
+        'data': series.data.model_copy(update={'array': blocks}),
+        'timestamps': timestamps,
+        'control': timestamps
+    })
+    HDF5IO(path=out_path).write(iterated, path='/series', specifications=data_dir / 'aibs.nwb')
+    with h5py.File(out_path, 'r') as h5f:
+        assert np.array_equal(h5f['/series/data'][:], np.repeat(np.arange(5, dtype=np.int32), 1_000))
+        assert h5f['/series/timestamps'].id == h5f['/series/control'].id
+
+
+def test_hdf_append_table(tmp_output_dir):
+    """
+    Appending rows to a table should extend its ids, columns, and indexes together,
+    writing whenever whole chunks are buffered
+    """
+    path = tmp_output_dir / 'append_table.h5'
+    with h5py.File(path, 'w') as h5f:
+        table = h5f.create_group('table')
+        table.attrs['neurodata_type'] = 'DynamicTable'
+        table.attrs['namespace'] = 'hdmf-common'
+        table.attrs['colnames'] = np.array([], dtype=h5py.string_dtype())
+    io = HDF5IO(path=path)
+
+    # an empty table gets its columns from the first rows
+    io.append_rows('/table', {'name': ['a', 'b'], 'times': [[0.1, 0.2], [0.3]]}, chunks=(4,))
+    with io.appender('/table', chunks=(4,), block_size=1) as table:
+        assert table.colnames == ['name', 'times']
+        assert list(table.indexes.keys()) == ['times']
+        table.append({'name': ['c'], 'times': [[0.4, 0.5, 0.6]]})
+        # not a whole chunk of ids yet
+        assert table.id.dset.shape == (2,)
+        table.append({'name': ['d', 'e', 'f'], 'times': [[], [0.7], [0.8]]})
+        assert table.id.dset.shape == (6,)
+        with pytest.raises(ValueError, match='missing'):
+            table.append({'name': ['g']})
+
+    with h5py.File(path, 'r') as h5f:
+        table = h5f['table']
+        assert list(table.attrs['colnames']) == ['name', 'times']
+        assert np.array_equal(table['id'][:], np.arange(6))
+        assert [n.decode('utf-8') for n in table['name'][:]] == ['a', 'b', 'c', 'd', 'e', 'f']
+        assert np.array_equal(table['times_index'][:], [2, 3, 6, 6, 7, 8])
+        assert np.allclose(table['times'][:], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8])
+        assert h5f[table['times_index'].attrs['target']] == table['times']
+        assert table['times'].attrs['neurodata_type'] == 'VectorData'
+        assert table['times_index'].attrs['neurodata_type'] == 'VectorIndex'
+
+
+def test_hdf_append_series(data_dir, tmp_output_dir):
+    """
+    Appending to a TimeSeries written with ``resizable=True`` should extend its data and timestamps
+    """
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    series = io.read(include='/acquisition/raw_running_wheel_rotation').acquisition['raw_running_wheel_rotation']
+    data = series.data.array[:]
+    path = tmp_output_dir / 'append_series.nwb'
+    out = HDF5IO(path=path)
+
+    out.write(series, specifications=data_dir / 'aibs.nwb')
+    with pytest.raises(ValueError, match='resizable'):
+        out.append_samples(series.hdf5_path, np.zeros(3), timestamps=np.arange(3))
+
+    out.write(series, specifications=data_dir / 'aibs.nwb', resizable=True)
+    with out.appender(series.hdf5_path) as appender:
+        for i in range(20):
+            appender.append(np.float32(i), timestamps=1000 + i)
+        with pytest.raises(ValueError, match='timestamps'):
+            appender.append(np.float32(0))
+
+    written = out.read(series.hdf5_path)
+    assert np.array_equal(written.data.array[:], np.concatenate([data, np.arange(20)]), equal_nan=True)
+    assert np.array_equal(written.timestamps[-20:], 1000 + np.arange(20))
+    assert written.timestamps.shape == (len(data) + 20,)
@@ -0,0 +1,186 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import h5py
+import numpy as np
+
+from nwb_linkml.config import Config
+from nwb_linkml.io.hdf5 import HDF5IO, find_references
+from nwb_linkml.io import index as index_module
+from nwb_linkml.io.index import FileIndex, ReferenceIndex, Referrer
+from nwb_linkml.maps.hdf5 import flatten_hdf
+from nwb_linkml.types.hdf5 import get_pool
+
+from ..fixtures import tmp_output_dir, tmp_output_dir_func, data_dir
+
+
+def _make_file(path, n=10):
+    with h5py.File(path, 'w') as h5f:
+        h5f.create_dataset('/group/data', data=np.arange(n))
+        h5f['/group/link'] = h5f['/group/data']
+        h5f.create_dataset('/other/data', data=np.arange(n))
+
+
+def test_index_cache(tmp_output_dir_func):
+    """
+    Indexes should match the walked file, and be cached until the file changes
+    """
+    config = Config(cache_dir=tmp_output_dir_func / 'cache')
+    source = tmp_output_dir_func / 'indexed.h5'
+    _make_file(source)
+
+    index = FileIndex.load(source, config=config)
+    index_path = FileIndex.index_path(source, config)
+    assert index_path.exists()
+    with h5py.File(source, 'r') as h5f:
+        assert index.items.keys() == flatten_hdf(h5f).keys()
+    # hard links share one canonical path
+    assert index.hardlinks[index.items['/group/data'].addr] == '/group/data'
+
+    # the cached index is used while the file is unchanged
+    mtime = index_path.stat().st_mtime_ns
+    cached = FileIndex.load(source, config=config)
+    assert cached.signature == index.signature
+    assert index_path.stat().st_mtime_ns == mtime
+
+    # but rebuilt when it changes
+    get_pool().close(source)
+    _make_file(source, n=20)
+    os.utime(source, ns=(index.signature.mtime_ns + 10**9, index.signature.mtime_ns + 10**9))
+    rebuilt = FileIndex.load(source, config=config)
+    assert rebuilt.signature != index.signature
+    assert rebuilt.items['/group/data'].shape == (20,)
+
+
+def test_index_version(tmp_output_dir_func, monkeypatch):
+    """
+    Indexes cached by another version of the index format should never be loaded
+    """
+    config = Config(cache_dir=tmp_output_dir_func / 'cache')
+    source = tmp_output_dir_func / 'indexed.h5'
+    _make_file(source)
+
+    FileIndex.load(source, config=config)
+    old_path = FileIndex.index_path(source, config)
+    assert f'-v{index_module.INDEX_VERSION}' in old_path.name
+
+    monkeypatch.setattr(index_module, 'INDEX_VERSION', index_module.INDEX_VERSION + 1)
+    new_path = FileIndex.index_path(source, config)
+    assert new_path != old_path
+    assert not new_path.exists()
+    FileIndex.load(source, config=config)
+    assert new_path.exists()
+
+    monkeypatch.setattr(index_module, '_package_version', lambda: '0.0.0-other')
+    assert FileIndex.index_path(source, config) != new_path
+
+
+def test_index_subtree(tmp_output_dir_func):
+    """
+    Subtrees should be copies of the items below a path
+    """
+    source = tmp_output_dir_func / 'indexed.h5'
+    _make_file(source)
+    index = FileIndex.build(source)
+
+    subtree = index.subtree('/group')
+    assert sorted(subtree.keys()) == ['/group', '/group/data']
+    subtree['/group'].partial = True
+    assert not index.items['/group'].partial
+    assert index.subtree().keys() == index.items.keys()
+
+
+def test_read_with_index(data_dir):
+    """
+    Reading from the index should give the same models as walking the file
+    """
+    io = HDF5IO(path=data_dir / 'aibs.nwb')
+    walked = io.read()
+    indexed = io.read(index=True)
+    assert indexed.acquisition.keys() == walked.acquisition.keys()
+    assert indexed.processing.keys() == walked.processing.keys()
+    assert np.array_equal(indexed.units.spike_times[:], walked.units.spike_times[:])
+
+
+@pytest.mark.parametrize('executor', [None, 'thread'])
+def test_reference_index(tmp_output_dir_func, executor):
+    """
+    References from attributes, reference datasets, and compound columns should all be indexed by their target
+    """
+    source = tmp_output_dir_func / 'refs.h5'
+    with h5py.File(source, 'w') as h5f:
+        target = h5f.create_dataset('/target', data=np.arange(10))
+        other = h5f.create_group('/other')
+        h5f['/other_link'] = other
+        h5f['/attr_ref'] = np.arange(3)
+        h5f['/attr_ref'].attrs['target'] = target.ref
+        h5f.create_dataset('/ref_dset', data=[target.ref, other.ref, target.ref, h5py.Reference()], dtype=h5py.ref_dtype)
+        compound_dtype = np.dtype([('idx', np.int32), ('ref', h5py.ref_dtype)])
+        h5f.create_dataset('/compound', data=np.array([(0, other.ref), (1, h5f['/other_link'].ref)], dtype=compound_dtype))
+
+    if executor == 'thread':
+        executor = ThreadPoolExecutor(max_workers=2)
+    index = ReferenceIndex.build(source, executor=executor)
+    if executor is not None:
+        executor.shutdown()
+
+    assert set(index.referrers('/target')) == {
+        Referrer(path='/attr_ref', kind='attr', name='target'),
+        Referrer(path='/ref_dset', kind='dataset'),
+    }
+    # hardlinks are the same object, so each referrer is only listed once
+    assert set(index.referrers('other')) == {
+        Referrer(path='/ref_dset', kind='dataset'),
+        Referrer(path='/compound', kind='compound', name='ref'),
+    }
+    assert len(index.referrers('other')) == 2
+    assert index.referrers('/attr_ref') == []
+    assert sorted(find_references(get_pool().get(source), '/target')) == ['/attr_ref', '/ref_dset']
+
+
+def test_reference_index_hardlinks(tmp_output_dir_func):
+    """
+    Referenced objects with several hard links should be indexed at the same canonical path as the file index,
+    not whichever name hdf5 finds for them
+    """
+    source = tmp_output_dir_func / 'refs.h5'
+    with h5py.File(source, 'w') as h5f:
+        # the children of skipped groups aren't flattened, so the canonical path is the link outside it
+        target = h5f.create_dataset('/a_specifications/data', data=np.arange(3))
+        h5f['/b/data'] = target
+        h5f['/ref'] = np.arange(2)
+        h5f['/ref'].attrs['target'] = target.ref
+        h5f['/b/referrer'] = h5f['/ref']
+
+    file_index = FileIndex.build(source)
+    addr = file_index.items['/b/data'].addr
+    assert file_index.hardlinks[addr] == '/b/data'
+    with h5py.File(source, 'r') as h5f:
+        oid = h5py.h5r.dereference(h5f['/ref'].attrs['target'], h5f.id)
+        assert h5py.h5i.get_name(oid).decode('utf-8') != '/b/data'
+
+    index = ReferenceIndex.build(source, hardlinks=file_index.hardlinks)
+    assert list(index.targets.keys()) == ['/b/data']
+    # referrers are canonical too
+    assert index.referrers('/b/data') == [Referrer(path='/b/referrer', kind='attr', name='target')]
+    # and the file index is used if none is given
+    assert ReferenceIndex.build(source).targets == index.targets
+
+
+@pytest.mark.parametrize('executor', ['serial', 'process'])
+def test_reference_index_file(data_dir, tmp_output_dir_func, monkeypatch, executor):
+    """
+    Reference indexes of a real file should be cached, and the same when built in parallel
+    """
+    monkeypatch.setenv('NWB_LINKML_CACHE_DIR', str(tmp_output_dir_func / 'cache'))
+    io = HDF5IO(data_dir / 'aibs.nwb')
+    index = io.references(executor=executor, workers=2)
+    # references in the truncated file mostly point nowhere, and those should be skipped
+    assert index.referrers('/general/extracellular_ephys/probeA') == [
+        Referrer(path='/general/extracellular_ephys/electrodes/group', kind='dataset')
+    ]
+    assert ReferenceIndex.index_path(io.path, Config()).exists()
+    assert io.references() == index
+    assert io.references(cache=False).targets == index.targets
@@ -0,0 +1,135 @@
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+
+import h5py
+import numpy as np
+import pytest
+
+fsspec = pytest.importorskip('fsspec')
+
+from nwb_linkml.io.hdf5 import HDF5IO
+from nwb_linkml.io.remote import BlockCache, chunk_ranges
+from nwb_linkml.types.hdf5 import get_pool
+from nwb_linkml.types.ndarray import NDArrayProxy
+
+from ..fixtures import tmp_output_dir, tmp_output_dir_func, data_dir
+
+
+@pytest.fixture()
+def memory_nwb(data_dir):
+    """aibs.nwb in an in-memory fsspec filesystem, standing in for a remote file"""
+    fs = fsspec.filesystem('memory')
+    fs.pipe('/aibs.nwb', (data_dir / 'aibs.nwb').read_bytes())
+    yield 'memory://aibs.nwb'
+    get_pool().close('memory://aibs.nwb')
+    fs.rm('/aibs.nwb')
+
+
+def test_remote_read(memory_nwb, data_dir, monkeypatch):
+    """
+    Remote files should read like local files, scanning metadata in a few requests
+    """
+    monkeypatch.setenv('NWB_LINKML_REMOTE_BLOCK_SIZE', str(256 * 1024))
+    io = HDF5IO(memory_nwb)
+    model = io.read(arrays='skip')
+    cache = get_pool().fileobj(memory_nwb)
+    assert isinstance(cache, BlockCache)
+    # the file is just under 1MB
+    assert cache.fetches <= 4
+
+    local = HDF5IO(data_dir / 'aibs.nwb').read()
+    remote = io.read()
+    assert remote.acquisition.keys() == local.acquisition.keys()
+    proxy = remote.acquisition['raw_running_wheel_rotation'].data.array
+    assert isinstance(proxy, NDArrayProxy)
+    assert proxy.h5f_file == memory_nwb
+    assert np.array_equal(proxy[:], local.acquisition['raw_running_wheel_rotation'].data.array[:], equal_nan=True)
+
+    # file-like objects too
+    with fsspec.open(memory_nwb, 'rb') as f:
+        from_file = HDF5IO(f).read(arrays='skip')
+    assert from_file.acquisition.keys() == local.acquisition.keys()
+
+
+def test_block_cache(tmp_output_dir_func):
+    """
+    Block caches should fetch runs of missing blocks together, prefetch the chunks a selection needs,
+    and reuse blocks cached on disk
+    """
+    path = tmp_output_dir_func / 'chunks.h5'
+    with h5py.File(path, 'w') as h5f:
+        h5f.create_dataset('data', data=np.arange(100_000, dtype=np.int64), chunks=(1000,))
+
+    fs = fsspec.filesystem('file')
+    cache = BlockCache(fs, str(path), block_size=4096, cache_dir=tmp_output_dir_func / 'blocks')
+    assert cache.read_range(0, 3 * 4096 + 10) == path.read_bytes()[:3 * 4096 + 10]
+    assert cache.fetches == 1
+    cache.read_range(0, 100)
+    assert cache.fetches == 1
+
+    with h5py.File(cache, 'r') as h5f:
+        dset = h5f['data']
+        ranges = chunk_ranges(dset, slice(5_500, 20_000))
+        assert len(ranges) == 15
+        assert all(end - start == 8000 for start, end in ranges)
+        fetches = cache.fetches
+        cache.prefetch(ranges)
+        # chunks are written next to each other, so they're fetched in one go
+        assert cache.fetches == fetches + 1
+        assert np.array_equal(dset[5_500:20_000], np.arange(5_500, 20_000))
+        assert cache.fetches == fetches + 1
+
+    # blocks on disk don't need to be fetched again
+    cached = BlockCache(fs, str(path), block_size=4096, cache_dir=tmp_output_dir_func / 'blocks')
+    assert cached.read_range(0, 3 * 4096) == path.read_bytes()[:3 * 4096]
+    assert cached.fetches == 0
+
+
+class _RangeHandler(SimpleHTTPRequestHandler):
+    """Serve files with support for range requests, like an object store, counting requests"""
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        range_header = self.headers.get('Range')
+        if range_header is None:
+            return super().do_GET()
+        path = self.translate_path(self.path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        start, end = range_header.split('=')[1].split('-')
+        start = int(start)
+        end = int(end) if end else len(data) - 1
+        body = data[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', f'bytes {start}-{start + len(body) - 1}/{len(data)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_remote_read_http(data_dir, monkeypatch):
+    """
+    A metadata-only read from an http server should take a handful of requests
+    """
+    pytest.importorskip('aiohttp')
+    monkeypatch.setenv('NWB_LINKML_REMOTE_BLOCK_SIZE', str(256 * 1024))
+    handler = partial(_RangeHandler, directory=str(data_dir))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/aibs.nwb'
+    try:
+        _RangeHandler.requests = 0
+        model = HDF5IO(url).read(arrays='skip')
+        assert 'raw_running_wheel_rotation' in model.acquisition
+        assert _RangeHandler.requests <= 10
+    finally:
+        get_pool().close(url)
+        server.shutdown()
@@ -0,0 +1,171 @@
+from pathlib import Path
+from typing import Optional
+
+import h5py
+import numpy as np
+import pytest
+
+zarr = pytest.importorskip('zarr')
+numcodecs = pytest.importorskip('numcodecs')
+
+from nwb_linkml.io.hdf5 import HDF5IO
+from nwb_linkml.maps.hdf5 import flatten_hdf
+from nwb_linkml.types.hdf5 import get_pool, is_zarr
+from nwb_linkml.types.ndarray import NDArrayProxy
+from nwb_linkml.types.zarr import ZarrFile
+
+from ..fixtures import tmp_output_dir_func, data_dir
+
+
+def _reference(h5f: h5py.File, ref: h5py.Reference) -> Optional[dict]:
+    try:
+        return {'source': '.', 'path': h5f[ref].name}
+    except (KeyError, ValueError):
+        # null references, or references to objects truncated out of the test file
+        return None
+
+
+def _attr(h5f: h5py.File, value):
+    if isinstance(value, h5py.Reference):
+        ref = _reference(h5f, value)
+        return None if ref is None else {'zarr_dtype': 'object', 'value': ref}
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if isinstance(value, np.ndarray):
+        return [_attr(h5f, v) for v in value.tolist()]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _copy_dataset(h5f: h5py.File, dset: h5py.Dataset, group, name: str):
+    """Copy a dataset the way hdmf-zarr stores it"""
+    if dset.dtype.names is not None:
+        fields = []
+        for field in dset.dtype.names:
+            is_ref = h5py.check_ref_dtype(dset.dtype[field]) is not None
+            fields.append({'name': field, 'dtype': 'object' if is_ref else str(dset.dtype[field])})
+        data = np.empty(dset.shape, dtype=object)
+        for i, row in enumerate(dset[()]):
+            data[i] = [
+                _reference(h5f, v) if isinstance(v, h5py.Reference) else v.item() for v in row
+            ]
+        arr = group.create_dataset(name, shape=dset.shape, dtype=object, object_codec=numcodecs.Pickle())
+        arr[:] = data
+        arr.attrs['zarr_dtype'] = fields
+    elif h5py.check_ref_dtype(dset.dtype) is not None:
+        data = np.empty(dset.shape, dtype=object)
+        for i, ref in enumerate(dset[()]):
+            data[i] = _reference(h5f, ref)
+        arr = group.create_dataset(name, shape=dset.shape, dtype=object, object_codec=numcodecs.JSON())
+        arr[:] = data
+        arr.attrs['zarr_dtype'] = 'object'
+    elif h5py.check_string_dtype(dset.dtype) is not None:
+        data = dset.asstr()[()]
+        if dset.shape == ():
+            arr = group.create_dataset(name, shape=(1,), dtype=object, object_codec=numcodecs.VLenUTF8())
+            arr[0] = data
+            arr.attrs['zarr_dtype'] = 'scalar'
+        else:
+            arr = group.create_dataset(name, shape=dset.shape, dtype=object, object_codec=numcodecs.VLenUTF8())
+            arr[:] = data
+    elif dset.shape == ():
+        arr = group.create_dataset(name, data=np.array([dset[()]]))
+        arr.attrs['zarr_dtype'] = 'scalar'
+    else:
+        group.create_dataset(name, data=dset[()], chunks=dset.chunks or True)
+
+
+def _copy_group(h5f: h5py.File, h5_group: h5py.Group, group):
+    links = []
+    for name in h5_group.keys():
+        link = h5_group.get(name, getlink=True)
+        if isinstance(link, h5py.SoftLink):
+            links.append({'name': name, 'source': '.', 'path': link.path})
+            continue
+        obj = h5_group[name]
+        if isinstance(obj, h5py.Group):
+            _copy_group(h5f, obj, group.create_group(name))
+        else:
+            _copy_dataset(h5f, obj, group, name)
+        group[name].attrs.update({k: _attr(h5f, v) for k, v in obj.attrs.items()})
+    if links:
+        group.attrs['zarr_link'] = links
+
+
+@pytest.fixture()
+def nwb_zarr(data_dir, tmp_output_dir_func) -> Path:
+    """aibs.nwb converted to an NWB Zarr store"""
+    store = tmp_output_dir_func / 'aibs.nwb.zarr'
+    root = zarr.open_group(str(store), mode='w')
+    with h5py.File(data_dir / 'aibs.nwb', 'r') as h5f:
+        _copy_group(h5f, h5f, root)
+        root.attrs.update({k: _attr(h5f, v) for k, v in h5f.attrs.items()})
+    zarr.consolidate_metadata(str(store))
+    yield store
+    get_pool().close(store)
+
+
+def test_flatten_zarr(nwb_zarr, data_dir):
+    """
+    Zarr stores should flatten to the same items as the hdf5 file they were converted from
+    """
+    assert is_zarr(nwb_zarr)
+    zarr_file = get_pool().get(nwb_zarr)
+    assert isinstance(zarr_file, ZarrFile)
+    zarr_items = flatten_hdf(zarr_file)
+    with h5py.File(data_dir / 'aibs.nwb', 'r') as h5f:
+        h5_items = flatten_hdf(h5f)
+        h5_rows = h5f['/intervals/flashes_presentations/timeseries'][()]
+
+    assert zarr_items.keys() == h5_items.keys()
+    for path, item in h5_items.items():
+        zarr_item = zarr_items[path]
+        assert zarr_item.h5_type == item.h5_type
+        assert zarr_item.neurodata_type == item.neurodata_type
+        assert zarr_item.shape == item.shape
+        assert sorted(zarr_item.children) == sorted(item.children)
+        assert zarr_item.links == item.links
+    assert zarr_items['/'].attrs['.specloc'] == '/specifications'
+    assert zarr_items['/intervals/flashes_presentations/timeseries'].dtype.names == ('idx_start', 'count', 'timeseries')
+
+    # compound datasets decode to the same rows as h5py reads
+    rows = zarr_file['/intervals/flashes_presentations/timeseries'][()]
+    assert rows.dtype.names == h5_rows.dtype.names
+    assert np.array_equal(rows['idx_start'], h5_rows['idx_start'])
+    assert np.array_equal(rows['count'], h5_rows['count'])
+    # references to objects truncated out of the test file are null
+    assert all(ref is None for ref in rows['timeseries'])
+
+
+def test_zarr_read(nwb_zarr, data_dir):
+    """
+    Zarr stores should read into the same models as hdf5 files
+    """
+    h5_model = HDF5IO(data_dir / 'aibs.nwb').read()
+    zarr_model = HDF5IO(nwb_zarr).read()
+
+    assert zarr_model.session_start_time == h5_model.session_start_time
+    assert zarr_model.file_create_date == h5_model.file_create_date
+    assert zarr_model.acquisition.keys() == h5_model.acquisition.keys()
+    assert zarr_model.intervals.keys() == h5_model.intervals.keys()
+
+    series = zarr_model.acquisition['raw_running_wheel_rotation']
+    proxy = series.data.array
+    assert isinstance(proxy, NDArrayProxy)
+    assert proxy.h5f_file == nwb_zarr
+    assert np.array_equal(
+        proxy[:],
+        h5_model.acquisition['raw_running_wheel_rotation'].data.array[:],
+        equal_nan=True
+    )
+    # soft links resolve to the linked object
+    assert zarr_model.acquisition['running_wheel_signal_voltage'].timestamps is series.timestamps
+
+    table = zarr_model.intervals['flashes_presentations']
+    h5_table = h5_model.intervals['flashes_presentations']
+    assert np.array_equal(table.start_time[:], h5_table.start_time[:])
+
+    # zarr stores can't be written
+    with pytest.raises(ValueError):
+        HDF5IO(nwb_zarr).write(zarr_model)
@@ -0,0 +1,428 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import h5py
+import numpy as np
+
+from nwb_linkml.io.hdf5 import HDF5IO
+from nwb_linkml.maps.hdf5 import ReadQueue, ReadPhases, H5ReadResult, H5SourceItem, DependencyGraph, flatten_hdf, has_type, Selection, ReadOptions, apply_maps, HDF5Map, get_dispatch, HardlinkMap
+from nwb_linkml.providers.schema import SchemaProvider
+from nwb_linkml.types.hdf5 import HDF5_Path
+
+from ..fixtures import tmp_output_dir, tmp_output_dir_func, data_dir
+
+
+@pytest.mark.parametrize('executor', [None, 'thread'])
+def test_construct_deep_hierarchy(tmp_output_dir_func, executor):
+    """
+    Hierarchies deeper than the old maximum number of passes should still be fully constructed,
+    including when constructing items in parallel
+    """
+    h5f_source = tmp_output_dir_func / 'deep.h5'
+    depth = 12
+    path = '/' + '/'.join([f'level_{i}' for i in range(depth)])
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset(path + '/data', data=np.arange(5))
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        queue = ReadQueue(h5f=h5f_source, queue=flatten_hdf(h5f), provider=SchemaProvider())
+
+    if executor == 'thread':
+        executor = ThreadPoolExecutor(max_workers=4)
+    for phase in ReadPhases:
+        queue.apply_phase(phase, executor=executor)
+    if executor is not None:
+        executor.shutdown()
+
+    assert len(queue.queue) == 0
+    res = queue.completed['/'].result
+    for i in range(depth):
+        res = res[f'level_{i}']
+    assert np.array_equal(res['data']['array'][:], np.arange(5))
+
+
+def test_iter_construct_release(tmp_output_dir_func):
+    """
+    Releasing results while constructing should only keep the results that are still needed
+    """
+    h5f_source = tmp_output_dir_func / 'release.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        for i in range(3):
+            h5f.create_dataset(f'/a/b_{i}/data', data=np.arange(5))
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        queue = ReadQueue(h5f=h5f_source, queue=flatten_hdf(h5f), provider=SchemaProvider())
+    queue.apply_phase(ReadPhases.plan)
+    queue.apply_phase(ReadPhases.read)
+
+    sizes = []
+    for _ in queue.iter_construct(release=True):
+        sizes.append(len(queue.completed))
+    # nothing here is a model
+    assert sizes == []
+    assert list(queue.completed.keys()) == ['/']
+    assert np.array_equal(queue.completed['/'].result['a']['b_2']['data']['array'][:], np.arange(5))
+    assert ReadPhases.construct in queue.phases_completed
+
+
+def test_dependency_graph_order():
+    """
+    Items should be visited once, after their dependencies
+    """
+    items = {
+        '/a': H5ReadResult.model_construct(path='/a', depends=['/b', '/c']),
+        '/b': H5ReadResult.model_construct(path='/b', depends=['/c']),
+        '/c': H5ReadResult.model_construct(path='/c', depends=['/d']),
+        '/e': H5ReadResult.model_construct(path='/e', depends=[]),
+    }
+    # /d is already completed
+    graph = DependencyGraph(items, completed=['/d'])
+    visited = []
+    while graph.is_active():
+        for path in graph.get_ready():
+            visited.append(path)
+            graph.done(path)
+
+    assert sorted(visited) == sorted(items.keys())
+    assert visited.index('/c') < visited.index('/b') < visited.index('/a')
+    assert not graph.blocked
+
+
+def test_construct_reports_cycles(tmp_output_dir_func):
+    """
+    Cycles should be reported, and leave the rest of the queue unaffected
+    """
+    h5f_source = tmp_output_dir_func / 'cycle.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_group('dummy')
+
+    def _group(path, depends):
+        source = H5SourceItem.model_construct(path=path, h5f_path=str(h5f_source), leaf=False, h5_type='group')
+        return H5ReadResult(
+            path=path,
+            source=source,
+            completed=True,
+            result={d.split('/')[-1]: HDF5_Path(d) for d in depends},
+            depends=depends,
+            applied=['ResolveContainerGroups']
+        )
+
+    queue = ReadQueue(
+        h5f=h5f_source,
+        provider=SchemaProvider(),
+        queue={
+            '/a': _group('/a', ['/b']),
+            '/b': _group('/b', ['/a']),
+            '/c': _group('/c', ['/a']),
+            '/d': _group('/d', [])
+        }
+    )
+    with pytest.warns(UserWarning, match='cycle'):
+        queue.apply_phase(ReadPhases.construct)
+
+    assert list(queue.completed.keys()) == ['/d']
+    assert sorted(queue.queue.keys()) == ['/a', '/b', '/c']
+
+
+def test_flatten_lazy(tmp_output_dir_func):
+    """
+    Lazy flattening should stop at typed groups, and only include hardlinked objects once
+    """
+    h5f_source = tmp_output_dir_func / 'lazy.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        typed = h5f.create_group('/container/typed')
+        typed.attrs['neurodata_type'] = 'TimeSeries'
+        typed.attrs['namespace'] = 'core'
+        typed.create_dataset('data', data=np.arange(5))
+        h5f.create_dataset('/container/untyped/data', data=np.arange(5))
+        h5f['/container/untyped/link'] = h5f['/container/untyped/data']
+        h5f['/container/soft'] = h5py.SoftLink('/container/untyped')
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        flat = flatten_hdf(h5f, lazy=True)
+        assert sorted(flat.keys()) == ['/', '/container', '/container/typed', '/container/untyped', '/container/untyped/data']
+        assert flat['/container/typed'].lazy
+        assert not flat['/container/untyped'].lazy
+
+        # the group being flattened isn't lazy itself
+        flat = flatten_hdf(h5f['/container/typed'], lazy=True)
+        assert sorted(flat.keys()) == ['/container/typed', '/container/typed/data']
+        assert not flat['/container/typed'].lazy
+
+
+@pytest.mark.parametrize(
+    'path,pattern,match,prefix',
+    [
+        ('/processing/ophys/Fluorescence', '/processing/*/Fluorescence/**', True, True),
+        ('/processing/ophys/Fluorescence/roi/data', '/processing/*/Fluorescence/**', True, True),
+        ('/processing/ophys', '/processing/*/Fluorescence/**', False, True),
+        ('/processing/ophys/ImageSegmentation', '/processing/*/Fluorescence/**', False, False),
+        ('/acquisition', '/processing/**', False, False),
+        ('/acquisition/a/b/c', '/**/c', True, True),
+    ]
+)
+def test_selection_globs(path, pattern, match, prefix):
+    """
+    Globs should match whole paths, or tell us if children could match
+    """
+    selection = Selection(include=pattern)
+    item = H5SourceItem.model_construct(path=path)
+    assert selection.includes(item) == match
+    assert selection.may_include_below(path) == prefix
+
+
+def test_flatten_selection(tmp_output_dir_func):
+    """
+    Selections should include selected items, their ancestors, and the ancestors' datasets
+    """
+    h5f_source = tmp_output_dir_func / 'select.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/timestamp', data=np.arange(5))
+        for module in ('ophys', 'ecephys'):
+            for child in ('Fluorescence', 'ImageSegmentation'):
+                group = h5f.create_group(f'/processing/{module}/{child}')
+                group.attrs['neurodata_type'] = child
+                group.create_dataset('data', data=np.arange(5))
+            h5f.create_dataset(f'/processing/{module}/description', data=np.arange(5))
+        h5f.create_dataset('/acquisition/series/data', data=np.arange(5))
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        flat = flatten_hdf(h5f, include='/processing/*/Fluorescence/**', exclude='/processing/ecephys')
+        assert sorted(flat.keys()) == [
+            '/',
+            '/processing',
+            '/processing/ophys',
+            '/processing/ophys/Fluorescence',
+            '/processing/ophys/Fluorescence/data',
+            '/processing/ophys/description',
+            '/timestamp',
+        ]
+        assert flat['/processing/ophys'].partial
+        assert flat['/'].partial
+        assert not flat['/processing/ophys/Fluorescence'].partial
+
+        flat = flatten_hdf(h5f, include=has_type('ImageSegmentation'))
+        assert '/processing/ecephys/ImageSegmentation/data' in flat
+        assert '/processing/ophys/ImageSegmentation/data' in flat
+        assert '/processing/ophys/Fluorescence' not in flat
+
+        # exclude alone reads everything else
+        flat = flatten_hdf(h5f, exclude=['/processing', '/timestamp'])
+        assert sorted(flat.keys()) == ['/', '/acquisition', '/acquisition/series', '/acquisition/series/data']
+
+        # selections that match nothing still keep the root and its datasets
+        flat = flatten_hdf(h5f, include='/nothing/here')
+        assert sorted(flat.keys()) == ['/', '/timestamp']
+        assert flat['/'].partial
+        flat = flatten_hdf(h5f['/processing'], include=has_type('ImageSeries'))
+        assert sorted(flat.keys()) == ['/processing']
+
+
+def test_flatten_structure(tmp_output_dir_func):
+    """
+    Flattening should capture the structure of each item so that maps don't need to reopen the file
+    """
+    h5f_source = tmp_output_dir_func / 'structure.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/group/array', data=np.zeros((10, 5), dtype=np.float32), chunks=(5, 5), compression='gzip')
+        h5f.create_dataset('/group/scalar', data=1)
+        h5f['/group/hardlink'] = h5f['/group/array']
+        h5f['/group/softlink'] = h5py.SoftLink('/group/scalar')
+        h5f['/group/relative'] = h5py.SoftLink('scalar')
+        h5f.create_group('/empty/also_empty')
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        flat = flatten_hdf(h5f)
+
+    array = flat['/group/array']
+    assert array.shape == (10, 5)
+    assert array.dtype == np.float32
+    assert array.chunks == (5, 5)
+    assert array.compression == 'gzip'
+    assert array.n_hardlinks == 2
+    assert flat['/group/scalar'].shape == ()
+    assert flat['/group/scalar'].n_hardlinks == 1
+
+    group = flat['/group']
+    assert sorted(group.children) == ['array', 'hardlink', 'relative', 'scalar', 'softlink']
+    assert group.links == {'softlink': '/group/scalar', 'relative': '/group/scalar'}
+    assert not group.empty
+    assert flat['/empty'].empty
+    assert flat['/empty/also_empty'].empty
+    assert flat['/'].empty_children == ('empty',)
+
+    # planning and dispatch happen without the file
+    flat = {k: v.model_copy(update={'h5f_path': str(tmp_output_dir_func / 'missing.h5')}) for k, v in flat.items()}
+    options = ReadOptions()
+    plan = apply_maps(list(flat.values()), ReadPhases.plan, SchemaProvider(), {}, options)
+    pruned = [res.path for res in plan if res is not None]
+    assert sorted(pruned) == ['/empty', '/empty/also_empty']
+
+    options = ReadOptions(arrays='skip')
+    res = apply_maps([flat['/group/array']], ReadPhases.read, SchemaProvider(), {}, options)[0]
+    assert res.applied == ['ResolveDatasetAsDict']
+    assert res.result['array'].shape == (10, 5)
+
+    # so do groups, which refer to their children by path, leaving out empty ones
+    res = apply_maps([flat['/']], ReadPhases.read, SchemaProvider(), {}, options)[0]
+    assert res.applied == ['ResolveContainerGroups']
+    assert res.result == {'group': '/group'}
+
+
+def test_resolve_groups_without_file(data_dir):
+    """
+    Typed groups should be resolved from their flattened items, without reopening the file
+    """
+    io = HDF5IO(data_dir / 'aibs.nwb')
+    provider = io.make_provider()
+    with h5py.File(data_dir / 'aibs.nwb', 'r') as h5f:
+        flat = flatten_hdf(h5f)
+    paths = ['/acquisition/raw_running_wheel_rotation', '/processing/eye_tracking']
+    items = [flat[path].model_copy(update={'h5f_path': str(data_dir / 'missing.nwb')}) for path in paths]
+    series, module = apply_maps(items, ReadPhases.read, provider, {}, ReadOptions())
+
+    assert series.applied == ['ResolveModelGroup']
+    assert series.result['data'] == '/acquisition/raw_running_wheel_rotation/data'
+    assert series.result['comments'] == flat[paths[0]].attrs['comments']
+    assert set(series.depends) >= {'/acquisition/raw_running_wheel_rotation/data'}
+    assert sorted(module.result['children'].keys()) == sorted(flat[paths[1]].children)
+
+
+def test_map_dispatch(data_dir):
+    """
+    The dispatch table should pick the same map for each item as checking every map in priority order
+    """
+    h5f_source = data_dir / 'aibs.nwb'
+    provider = HDF5IO(h5f_source).make_provider()
+    with h5py.File(h5f_source, 'r') as h5f:
+        queue = ReadQueue(h5f=h5f_source, queue=flatten_hdf(h5f), provider=provider)
+
+    options = ReadOptions()
+    for phase in ReadPhases:
+        dispatch = get_dispatch(phase, provider)
+        assert get_dispatch(phase, provider) is dispatch
+        all_maps = sorted([m for m in HDF5Map.__subclasses__() if m.phase == phase], key=lambda x: x.priority)
+        for item in queue.queue.values():
+            expected = next((m for m in all_maps if m.check(item, provider, queue.completed, options)), None)
+            got = next((m for m in dispatch.maps_for(item) if m.check(item, provider, queue.completed, options)), None)
+            assert got is expected
+        assert len(dispatch._table) < len(queue.queue)
+        if phase != ReadPhases.construct:
+            queue.apply_phase(phase)
+
+
+
+def test_slot_records(tmp_output_dir_func):
+    """
+    Source items and results should be compact, picklable records
+    """
+    import pickle
+    h5f_source = tmp_output_dir_func / 'records.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/a/data', data=np.arange(5)).attrs['unit'] = 'seconds'
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        items = flatten_hdf(h5f)
+    item = items['/a/data']
+    assert not hasattr(item, '__dict__')
+    assert item.attrs == {'unit': 'seconds'}
+    assert item.children == ()
+    assert pickle.loads(pickle.dumps(item)) == item
+
+    copied = item.model_copy(update={'lazy': True})
+    assert copied.lazy and not item.lazy
+    assert copied.attrs is item.attrs
+
+    with pytest.raises(TypeError):
+        H5ReadResult(path='/a/data')
+    res = H5ReadResult(path='/a/data', source=item)
+    assert res.depends == () and res.applied == ()
+    assert H5ReadResult.model_construct(path='/a').source is None
+
+
+def test_flatten_hardlinks(tmp_output_dir_func):
+    """
+    Objects hard linked at several paths should be flattened and read once, at their canonical path,
+    and shared by every group that contains them
+    """
+    h5f_source = tmp_output_dir_func / 'hardlinks.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/a/data', data=np.arange(5))
+        h5f['/b/data'] = h5f['/a/data']
+        h5f['/b/link'] = h5py.SoftLink('/b/data')
+        # a group with two paths, and a link below its other path
+        h5f['/c'] = h5f['/a']
+        h5f['/d/link'] = h5py.SoftLink('/c/data')
+
+    hardlinks = HardlinkMap()
+    with h5py.File(h5f_source, 'r') as h5f:
+        items = flatten_hdf(h5f, hardlinks=hardlinks)
+        addr = h5py.h5o.get_info(h5f['/b/data'].id).addr
+
+    assert sorted(items.keys()) == ['/', '/a', '/a/data', '/b', '/d']
+    assert hardlinks.paths[addr] == '/a/data'
+    assert hardlinks.aliases == {'/b/data': '/a/data', '/c': '/a'}
+    assert hardlinks.resolve('/c/data') == '/a/data'
+    assert hardlinks.resolve('/d/link') == '/d/link'
+    assert items['/b'].aliases == {'data': '/a/data'}
+    assert items['/'].aliases == {'c': '/a'}
+    assert items['/a'].aliases is None
+    assert items['/b'].links == {'link': '/a/data'}
+    assert items['/d'].links == {'link': '/a/data'}
+
+    queue = ReadQueue(h5f=h5f_source, queue=items, provider=SchemaProvider())
+    for phase in ReadPhases:
+        queue.apply_phase(phase)
+    res = queue.completed['/'].result
+    assert res['c'] is res['a']
+    assert res['b']['data'] is res['a']['data']
+    assert res['b']['link'] is res['a']['data']
+    assert res['d']['link'] is res['a']['data']
+    assert np.array_equal(res['b']['data']['array'][:], np.arange(5))
+
+    # selectors match objects at their aliases, and select them at their canonical path
+    with h5py.File(h5f_source, 'r') as h5f:
+        for include in ('/c/data', '/c/**', '/c'):
+            flat = flatten_hdf(h5f, include=include)
+            assert '/a/data' in flat
+            assert flat['/'].aliases == {'c': '/a'}
+        flat = flatten_hdf(h5f, include='/c/data')
+        assert sorted(flat.keys()) == ['/', '/a', '/a/data']
+        assert flat['/a'].partial
+        # objects are canonical at the first path the walk visits, which depends on what's selected
+        flat = flatten_hdf(h5f, include='/b')
+        assert sorted(flat.keys()) == ['/', '/b', '/b/data']
+        flat = flatten_hdf(h5f, include='/c/data', exclude='/c/data')
+        assert sorted(flat.keys()) == ['/']
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        queue = ReadQueue(h5f=h5f_source, queue=flatten_hdf(h5f, include='/c/data'), provider=SchemaProvider())
+    for phase in ReadPhases:
+        queue.apply_phase(phase)
+    res = queue.completed['/'].result
+    assert res['c'] is res['a']
+    assert np.array_equal(res['c']['data']['array'][:], np.arange(5))
+
+
+def test_read_block_size(tmp_output_dir_func, monkeypatch):
+    """
+    The configured block size should be read once per read and given to every dask array
+    """
+    monkeypatch.setenv('NWB_LINKML_ARRAY_BLOCK_SIZE', str(16 * 1024))
+    h5f_source = tmp_output_dir_func / 'blocks.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/a/data', data=np.arange(10_000, dtype=np.float64), chunks=(1000,))
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        items = flatten_hdf(h5f)
+    queue = ReadQueue(h5f=h5f_source, queue=items, provider=SchemaProvider(), options=ReadOptions(arrays='dask'))
+    assert queue.options.array_block_size == 16 * 1024
+    for phase in ReadPhases:
+        queue.apply_phase(phase)
+    assert queue.completed['/'].result['a']['data']['array'].chunks == ((2000,) * 5,)
+
+    queue = ReadQueue(
+        h5f=h5f_source, queue=items, provider=SchemaProvider(),
+        options=ReadOptions(arrays='dask', array_block_size=48 * 1024)
+    )
+    assert queue.options.array_block_size == 48 * 1024
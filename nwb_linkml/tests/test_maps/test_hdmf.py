@@ -1,11 +1,14 @@
 import pdb
+import pickle
 
 import pytest
 import h5py
 import time
 
-from nwb_linkml.maps.hdmf import model_from_dynamictable, dynamictable_to_model
-from ..fixtures import data_dir
+import numpy as np
+
+from nwb_linkml.maps.hdmf import model_from_dynamictable, dynamictable_to_model, dereference_reference_vector
+from ..fixtures import data_dir, tmp_output_dir_func
 
 NWBFILE = '/Users/jonny/Dropbox/lab/p2p_ld/data/nwb/sub-738651046_ses-760693773.nwb'
 
@@ -29,3 +32,74 @@ def test_make_dynamictable(data_dir, dataset):
     total_time = end_time - start_time
 
 
+def test_dereference_reference_vector(tmp_output_dir_func):
+    """
+    Reference vectors should dereference to the ranges of the objects they refer to
+    """
+    h5f_source = tmp_output_dir_func / 'references.h5'
+    dtype = np.dtype([('idx_start', '<i4'), ('count', '<i4'), ('timeseries', h5py.ref_dtype)])
+    n_rows = 1000
+    with h5py.File(h5f_source, 'w') as h5f:
+        series = [h5f.create_dataset(f'series_{i}', data=np.arange(100) + i * 1000, chunks=(10,)) for i in range(3)]
+        rows = np.empty(n_rows, dtype=dtype)
+        rows['idx_start'] = np.arange(n_rows) % 90
+        rows['count'] = np.arange(n_rows) % 7
+        rows['timeseries'] = [series[i % 3].ref for i in range(n_rows)]
+        # missing rows
+        rows['idx_start'][5] = -1
+        rows['count'][5] = -1
+        rows['timeseries'][6] = h5py.Reference()
+        h5f.create_dataset('timeseries', data=rows)
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        dset = h5f['timeseries']
+        rows = dset[()]
+        expected = [
+            h5f[ref][start:start + count] if ref and count > 0 else np.array([])
+            for start, count, ref in rows
+        ]
+        for ragged in (dereference_reference_vector(dset), dereference_reference_vector(dset, rows.tolist())):
+            assert len(ragged) == n_rows
+            assert len(ragged.data.targets) == 4
+            assert all(np.array_equal(got, want) for got, want in zip(ragged, expected))
+            assert np.array_equal(ragged[500], expected[500])
+
+
+
+def test_dynamictable_model_cache(tmp_output_dir_func):
+    """
+    Tables with the same columns should share a model, but each model should be named after its table
+    """
+    h5f_source = tmp_output_dir_func / 'tables.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        for name, dtype in (('a', np.float64), ('b', np.float64), ('c', np.int32)):
+            group = h5f.create_group(name)
+            group.attrs['colnames'] = ['x', 'y']
+            group.create_dataset('id', data=np.arange(3))
+            group.create_dataset('x', data=np.arange(3, dtype=dtype))
+            group.create_dataset('y', data=np.arange(6, dtype=dtype))
+            group.create_dataset('y_index', data=np.array([2, 4, 6]))
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        model = model_from_dynamictable(h5f['b'])
+        assert model_from_dynamictable(h5f['b']) is model
+        assert model.__name__ == 'b'
+        # same columns, different name: a different model with the same parent
+        model_a = model_from_dynamictable(h5f['a'])
+        assert model_a is not model
+        assert model_a.__name__ == 'a'
+        assert model_a.__base__ is model.__base__
+        assert model_a.model_fields.keys() == model.model_fields.keys()
+        assert model_from_dynamictable(h5f['c']).__base__ is not model.__base__
+        assert model_from_dynamictable(h5f['b'], cache=False) is not model
+
+        table = dynamictable_to_model(h5f['b'])
+        assert type(table) is model
+        assert table.name == 'b'
+        assert np.array_equal(table.ragged('y')[2], [4, 5])
+
+        # cached models can be pickled, eg. to send tables back from worker processes
+        unpickled = pickle.loads(pickle.dumps(table))
+        assert type(unpickled) is model
+        assert np.array_equal(unpickled.x[:], table.x[:])
+        assert pickle.loads(pickle.dumps(model.__base__)) is model.__base__
@@ -0,0 +1,123 @@
+import pickle
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import h5py
+import numpy as np
+from typing import Dict, Optional
+from pydantic import BaseModel
+
+from nwb_linkml.types.hdf5 import H5FilePool, ChunkCache, get_pool, LazyModel, lazy_model
+
+from ..fixtures import tmp_output_dir, tmp_output_dir_func
+
+
+def test_pool_reuses_handles(tmp_output_dir_func):
+    """
+    Handles should be opened once and shared, including between threads
+    """
+    h5f_source = tmp_output_dir_func / 'test.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/data', data=np.arange(10))
+
+    pool = H5FilePool()
+    handles = [pool.get(h5f_source) for _ in range(10)]
+    assert all([h is handles[0] for h in handles])
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sums = list(executor.map(lambda _: pool.get(h5f_source)['data'][:].sum(), range(20)))
+    assert all([s == 45 for s in sums])
+    assert pool.opened == 1
+
+    pool.close(h5f_source)
+    assert h5f_source not in pool
+    assert not handles[0].id.valid
+    _ = pool.get(h5f_source)
+    assert pool.opened == 2
+
+
+def test_pool_invalidates_changed_file(tmp_output_dir_func):
+    """
+    If the file is rewritten on disk, we shouldn't keep returning the stale handle
+    """
+    h5f_source = tmp_output_dir_func / 'test.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/data', data=np.arange(10))
+
+    pool = H5FilePool()
+    assert pool.get(h5f_source)['data'].shape == (10,)
+    opened = pool.opened
+
+    # replace the file while the pool still has it open
+    h5f_new = tmp_output_dir_func / 'new.h5'
+    with h5py.File(h5f_new, 'w') as h5f:
+        h5f.create_dataset('/data', data=np.arange(20))
+    os.replace(h5f_new, h5f_source)
+
+    assert pool.get(h5f_source)['data'].shape == (20,)
+    assert pool.opened == opened + 1
+
+
+def test_pool_pickle():
+    """
+    Pools can be sent to other processes, but the handles don't come with them
+    """
+    pool = get_pool()
+    assert get_pool() is pool
+    restored = pickle.loads(pickle.dumps(pool))
+    assert isinstance(restored, H5FilePool)
+    assert len(restored) == 0
+
+
+def test_chunk_cache():
+    """
+    Chunk caches should evict the least recently used chunks to stay within their budget
+    """
+    cache = ChunkCache(size=3 * 80)
+    for i in range(3):
+        cache.put(i, np.zeros(10))
+    assert cache.get(0) is not None
+    cache.put(3, np.zeros(10))
+    # 1 was used least recently
+    assert cache.get(1) is None
+    assert all(cache.get(i) is not None for i in (0, 2, 3))
+    assert cache.nbytes == 3 * 80
+
+    # chunks bigger than the whole cache aren't kept
+    cache.put(4, np.zeros(100))
+    assert cache.get(4) is None
+    assert len(cache) == 3
+
+
+def test_lazy_model():
+    """
+    Placeholders should validate as their model, and become it when used
+    """
+    class Child(BaseModel):
+        name: str
+        value: int = 0
+        other: Optional[int] = None
+
+    class Parent(BaseModel):
+        children: Dict[str, Child]
+        child: Child
+
+    loaded = []
+    def _load():
+        loaded.append(True)
+        return Child(name='child', value=5, other=2)
+
+    placeholder = lazy_model(Child).lazy_construct(_load, name='child')
+    assert lazy_model(Child) is type(placeholder)
+    parent = Parent(children={'child': placeholder}, child=placeholder)
+    assert parent.child.name == 'child'
+    assert not loaded
+
+    # defaults aren't used in place of loaded values
+    assert parent.children['child'].value == 5
+    assert loaded == [True]
+    assert type(parent.child) is Child
+    assert not isinstance(parent.child, LazyModel)
+    assert parent.child.other == 2
+    assert loaded == [True]
+    assert parent.model_dump()['child'] == {'name': 'child', 'value': 5, 'other': 2}
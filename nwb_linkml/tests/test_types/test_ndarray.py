@@ -1,4 +1,6 @@
 import pdb
+import os
+import pickle
 from typing import Union, Optional, Any
 import json
 
@@ -6,9 +8,12 @@ import pytest
 
 import numpy as np
 import h5py
+import dask
+from dask.array.core import Array as DaskArray
 
 from pydantic import BaseModel, ValidationError, Field
-from nwb_linkml.types.ndarray import NDArray, NDArrayProxy
+from nwb_linkml.types.ndarray import NDArray, NDArrayProxy, NDArrayInfo, lazy_array
+from nwb_linkml.types.hdf5 import get_pool, get_chunk_cache
 from nptyping import Shape, Number
 
 from ..fixtures import data_dir, tmp_output_dir, tmp_output_dir_func
@@ -117,3 +122,175 @@ def test_ndarray_proxy(tmp_output_dir_func):
         mod = Model(array=NDArrayProxy(h5f_file=h5f_source, path='/data_bad'))
 
 
+
+
+def test_ndarray_info(tmp_output_dir_func):
+    """
+    Array descriptions should validate like the arrays they describe, and serialize without reading data
+    """
+    h5f_source = tmp_output_dir_func / 'test.h5'
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/data', data=np.random.random((100, 10, 3)), chunks=(10, 10, 3), compression='gzip')
+        h5f.create_dataset('/data_bad', data=np.random.random((100, 10, 4)))
+
+    class Model(BaseModel):
+        array: NDArray[Shape["* x, * y, 3 z"], Number]
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        info = NDArrayInfo.from_dataset(h5f['data'])
+        info_bad = NDArrayInfo.from_dataset(h5f['data_bad'])
+
+    assert info.shape == (100, 10, 3)
+    assert info.chunks == (10, 10, 3)
+    assert info.compression == 'gzip'
+    assert len(info) == 100
+    assert info.nbytes == 100 * 10 * 3 * 8
+
+    mod = Model(array=info)
+    assert json.loads(mod.model_dump_json())['array'] == {
+        'hdf5_path': '/data',
+        'shape': [100, 10, 3],
+        'dtype': 'float64',
+        'chunks': [10, 10, 3],
+        'compression': 'gzip'
+    }
+    assert mod.array.proxy()[0:5].shape == (5, 10, 3)
+
+    with pytest.raises(ValidationError):
+        _ = Model(array=info_bad)
+
+
+def test_ndarray_proxy_cache(tmp_output_dir_func):
+    """
+    Proxies should keep their metadata, and read chunked arrays through the chunk cache,
+    giving the same results as h5py
+    """
+    h5f_source = tmp_output_dir_func / 'test.h5'
+    data = np.random.random((103, 17, 3))
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/data', data=data, chunks=(10, 5, 3), compression='gzip')
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        proxy = NDArrayProxy.from_dataset(h5f['data'])
+    pool = get_pool()
+    pool.close(h5f_source)
+    opened = pool.opened
+    assert proxy.shape == (103, 17, 3)
+    assert proxy.chunks == (10, 5, 3)
+    assert len(proxy) == 103
+    assert pool.opened == opened
+
+    cache = get_chunk_cache()
+    cache.clear()
+    keys = [
+        0, -1, (5, 3), (5, 3, 1), slice(None), slice(3, 50, 7), (Ellipsis, 1),
+        (slice(None), slice(2, 9), Ellipsis), (-3, slice(None, None, 4), 2), (), np.int64(4), [1, 2, 5]
+    ]
+    with h5py.File(h5f_source, 'r') as h5f:
+        for key in keys:
+            expected = h5f['data'][key]
+            got = proxy[key]
+            assert np.array_equal(got, expected)
+            assert type(got) == type(expected)
+
+    # repeated reads come from the cache, without reopening the file
+    misses = cache.misses
+    for i in range(100):
+        assert np.array_equal(proxy[i % 10:i % 10 + 5, 0], data[i % 10:i % 10 + 5, 0])
+    assert cache.misses == misses
+    assert pool.opened == opened + 1
+
+    # strided selections only read the chunks that hold selected elements,
+    # and ones that step over whole chunks are read directly without caching them
+    cache.clear()
+    misses = cache.misses
+    assert np.array_equal(proxy[0:30:3, 0], data[0:30:3, 0])
+    assert cache.misses == misses + 3
+    assert np.array_equal(proxy[1:60:7, 1:17:3], data[1:60:7, 1:17:3])
+    misses = cache.misses
+    assert np.array_equal(proxy[::20], data[::20])
+    assert np.array_equal(proxy[::20, ::6, 1], data[::20, ::6, 1])
+    assert cache.misses == misses
+    assert len(cache) == 6 * 4
+
+    # chunks from a file that is replaced while the pool has it open aren't reused
+    assert np.array_equal(proxy[0:5, 0], data[0:5, 0])
+    h5f_new = tmp_output_dir_func / 'new.h5'
+    changed = data.copy()
+    changed[0:5, 0] = 0
+    with h5py.File(h5f_new, 'w') as h5f:
+        h5f.create_dataset('/data', data=changed, chunks=(10, 5, 3), compression='gzip')
+    os.replace(h5f_new, h5f_source)
+    misses = cache.misses
+    opened = pool.opened
+    assert np.all(proxy[0:5, 0] == 0)
+    assert cache.misses == misses + 1
+    assert pool.opened == opened + 1
+
+
+def test_ndarray_proxy_numpy(tmp_output_dir_func, monkeypatch):
+    """
+    Proxies should work with numpy functions, ufuncs, and operators,
+    evaluated in blocks aligned to their chunks
+    """
+    monkeypatch.setenv('NWB_LINKML_ARRAY_BLOCK_SIZE', str(256 * 1024))
+    h5f_source = tmp_output_dir_func / 'test.h5'
+    data = np.random.random((50_000, 4))
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/data', data=data, chunks=(1000, 4), compression='gzip')
+        h5f.create_dataset('/strings', data=['a', 'bb', 'a'], dtype=h5py.string_dtype())
+
+    proxy = NDArrayProxy(h5f_file=h5f_source, path='/data')
+    blocks = proxy.to_dask()
+    assert len(blocks.chunks[0]) > 1
+    assert all(size % 1000 == 0 for size in blocks.chunks[0][:-1])
+    assert all(size * 4 * 8 <= 256 * 1024 for size in blocks.chunks[0])
+    # an explicit block size is used instead of the configured one
+    assert proxy.to_dask(block_size=64 * 1024).chunks[0][0] == 2000
+
+    # reductions are computed
+    mean = np.mean(proxy, axis=0)
+    assert isinstance(mean, np.ndarray)
+    assert np.allclose(mean, data.mean(axis=0))
+    assert np.allclose(np.add.reduce(proxy), data.sum(axis=0))
+    assert np.isclose(np.maximum.reduce(proxy, axis=None), data.max())
+    assert np.allclose(np.add.accumulate(proxy), np.add.accumulate(data))
+
+    # elementwise operations are lazy
+    scaled = proxy * 2 + 1
+    assert isinstance(scaled, DaskArray)
+    assert np.allclose(np.sum(scaled, axis=0).compute(), (data * 2 + 1).sum(axis=0))
+    assert isinstance(data - proxy, DaskArray)
+
+    assert np.array_equal(np.asarray(proxy), data)
+
+    # object arrays can't be chunked, so are loaded
+    strings = NDArrayProxy(h5f_file=h5f_source, path='/strings')
+    assert np.array_equal(np.unique(strings), [b'a', b'bb'])
+
+
+def test_lazy_array(tmp_output_dir_func):
+    """
+    Dask arrays should be aligned to the dataset's chunks, and picklable so they can use any scheduler
+    """
+    h5f_source = tmp_output_dir_func / 'test.h5'
+    data = np.arange(100_000, dtype=np.float64).reshape(-1, 4)
+    with h5py.File(h5f_source, 'w') as h5f:
+        h5f.create_dataset('/data', data=data, chunks=(1000, 4))
+        h5f.create_dataset('/strings', data=['a', 'bb'], dtype=h5py.string_dtype())
+        info = NDArrayInfo.from_dataset(h5f['data'])
+        string_info = NDArrayInfo.from_dataset(h5f['strings'])
+
+    assert lazy_array(info, 'skip') is info
+    assert isinstance(lazy_array(info, 'proxy'), NDArrayProxy)
+    assert np.array_equal(lazy_array(info, 'load'), data)
+    # dask can't chunk object arrays
+    assert isinstance(lazy_array(string_info, 'dask'), NDArrayProxy)
+
+    array = lazy_array(info, 'dask')
+    assert isinstance(array, DaskArray)
+    assert all(size % 1000 == 0 for size in array.chunks[0][:-1])
+    restored = pickle.loads(pickle.dumps(array))
+    assert np.array_equal(restored.compute(), data)
+    total, = dask.compute(array.sum(axis=0), scheduler='processes')
+    assert np.array_equal(total, data.sum(axis=0))
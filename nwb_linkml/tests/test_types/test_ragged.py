@@ -0,0 +1,134 @@
+import h5py
+import numpy as np
+import pytest
+
+from nwb_linkml.maps.hdmf import dynamictable_to_model
+from nwb_linkml.types.ragged import RaggedArray, ReferencedValues
+
+from ..fixtures import tmp_output_dir_func
+
+
+class _CountReads:
+    """Array that counts how many times it's read"""
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.reads = 0
+        self.shape = data.shape
+        self.dtype = data.dtype
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return self.data[key]
+
+
+@pytest.fixture()
+def rows():
+    rng = np.random.default_rng(0)
+    return [rng.random(n) for n in rng.integers(0, 20, size=1000)]
+
+
+def test_ragged_rows(rows):
+    """
+    Ragged arrays should give rows and batches of rows like a list of arrays,
+    reading the data once per access
+    """
+    data = _CountReads(np.concatenate(rows))
+    ragged = RaggedArray(data, np.cumsum([len(r) for r in rows]))
+    assert len(ragged) == 1000
+
+    assert np.array_equal(ragged[0], rows[0])
+    assert np.array_equal(ragged[-1], rows[-1])
+    # single rows of arrays in memory are views
+    assert np.shares_memory(ragged[5], data.data) or len(rows[5]) == 0
+    with pytest.raises(IndexError):
+        _ = ragged[1000]
+
+    selections = [
+        slice(None), slice(10, 20), slice(990, 2000), slice(5, 5), slice(1, 100, 3), slice(None, None, -1),
+        [3, 1, 4, 1, 5], np.arange(1000) % 3 == 0, np.array([], dtype=int)
+    ]
+    for selection in selections:
+        expected = [rows[i] for i in np.arange(1000)[selection]]
+        reads = data.reads
+        batch = ragged[selection]
+        assert data.reads == reads + 1
+        assert isinstance(batch, RaggedArray)
+        assert len(batch) == len(expected)
+        assert all(np.array_equal(got, want) for got, want in zip(batch, expected))
+
+    reads = data.reads
+    assert all(np.array_equal(got, want) for got, want in zip(ragged, rows))
+    assert data.reads == reads + 1
+
+
+def test_ragged_double_index():
+    """
+    Doubly-indexed columns should give rows that are lists of rows
+    """
+    # table rows -> lists of inner rows -> values
+    table = [[[1, 2], [3]], [], [[4, 5, 6]], [[7], [], [8, 9]]]
+    inner = [row for lists in table for row in lists]
+    data = np.array([v for row in inner for v in row])
+    index = np.cumsum([len(row) for row in inner])
+    index_index = np.cumsum([len(lists) for lists in table])
+    ragged = RaggedArray(RaggedArray(data, index), index_index)
+
+    assert ragged[0].tolist() == table[0]
+    assert ragged[1].tolist() == []
+    assert ragged[3].tolist() == table[3]
+    assert ragged[[3, 0]].tolist() == [table[3], table[0]]
+    assert ragged[1:].tolist() == table[1:]
+
+
+def test_dynamictable_ragged(tmp_output_dir_func):
+    """
+    DynamicTable models should split their ragged columns by their indexes
+    """
+    h5f_source = tmp_output_dir_func / 'table.h5'
+    spikes = [np.arange(n, dtype=np.float64) for n in (3, 0, 5, 2)]
+    with h5py.File(h5f_source, 'w') as h5f:
+        group = h5f.create_group('units')
+        group.attrs['colnames'] = ['spike_times', 'quality']
+        group.create_dataset('id', data=np.arange(4))
+        group.create_dataset('spike_times', data=np.concatenate(spikes), chunks=(2,))
+        group.create_dataset('spike_times_index', data=np.cumsum([len(s) for s in spikes]))
+        group.create_dataset('quality', data=np.arange(4) * 0.5)
+
+    with h5py.File(h5f_source, 'r') as h5f:
+        for arrays in ('proxy', 'load'):
+            table = dynamictable_to_model(h5f['units'], arrays=arrays)
+            ragged = table.ragged('spike_times')
+            assert table.ragged('spike_times') is ragged
+            assert np.array_equal(np.asarray(ragged[2]), spikes[2])
+            assert [np.asarray(row).tolist() for row in ragged[[0, 2]]] == [spikes[0].tolist(), spikes[2].tolist()]
+            with pytest.raises(KeyError):
+                table.ragged('quality')
+
+
+def test_referenced_values():
+    """
+    Referenced ranges should be read in one read per run of touching or overlapping ranges per target
+    """
+    targets = [_CountReads(np.arange(100)), None, _CountReads(np.arange(100, 200))]
+    # target, start, count
+    rows = np.array([
+        [0, 10, 5], [2, 0, 3], [0, 15, 5], [0, 12, 2], [1, 0, 4], [0, -1, -1], [2, 50, 10], [0, 90, 10]
+    ])
+    values = ReferencedValues([t for t in targets], rows[:, 0], rows[:, 1], rows[:, 2])
+    ragged = RaggedArray(values, values.index)
+    expected = [
+        np.arange(10, 15), np.arange(100, 103), np.arange(15, 20), np.arange(12, 14),
+        np.arange(0), np.arange(0), np.arange(150, 160), np.arange(90, 100)
+    ]
+    # nothing is read until asked for
+    assert targets[0].reads == 0 and targets[2].reads == 0
+
+    assert all(np.array_equal(got, want) for got, want in zip(ragged, expected))
+    # [10, 20) and [90, 100) from the first target, [0, 3) and [50, 60) from the second
+    assert targets[0].reads == 2
+    assert targets[2].reads == 2
+
+    assert np.array_equal(ragged[6], expected[6])
+    assert targets[0].reads == 2
+    assert [row.tolist() for row in ragged[[3, 0]]] == [expected[3].tolist(), expected[0].tolist()]
+    assert len(values) == sum(len(e) for e in expected)